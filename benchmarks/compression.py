@@ -0,0 +1,68 @@
+# Benchmark reading and writing compressed ELAN files
+#
+# Usage: python benchmarks/compression.py [annotations per tier] [speakers]
+#
+# For every codec and compression level, the synthetic file is written and
+# read back once. Throughput is given in MB of uncompressed XML per second.
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import elan
+from synthetic import make_elan_file
+
+# (label, file name extension, compression level)
+CONFIGURATIONS = [
+    ("plain", ".eaf", None),
+    ("gzip -1", ".eaf.gz", 1),
+    ("gzip -6", ".eaf.gz", 6),
+    ("gzip -9", ".eaf.gz", 9),
+    ("bz2 -1", ".eaf.bz2", 1),
+    ("bz2 -9", ".eaf.bz2", 9),
+    ("xz -0", ".eaf.xz", 0),
+    ("xz -6", ".eaf.xz", 6),
+]
+
+if elan.zstd is not None:
+    CONFIGURATIONS += [
+        ("zstd -3", ".eaf.zst", 3),
+        ("zstd -19", ".eaf.zst", 19),
+    ]
+
+
+def main(annotations_per_tier=20000, speakers=2):
+
+    elan_file = make_elan_file(speakers=speakers, annotations_per_tier=annotations_per_tier)
+    xml_size = len(elan_file.to_xml().encode("utf-8"))
+
+    print("Uncompressed size: %.1f MB" % (xml_size / 1e6))
+    print("%-10s %12s %8s %14s %14s" % ("codec", "size (MB)", "ratio", "write (MB/s)", "read (MB/s)"))
+
+    directory = tempfile.mkdtemp()
+
+    for label, extension, level in CONFIGURATIONS:
+
+        file_name = os.path.join(directory, "benchmark" + extension)
+
+        start = time.perf_counter()
+        elan_file.write_elan_file(file_name, compression_level=level)
+        write_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        elan.ELANFile.read_elan_file(file_name)
+        read_time = time.perf_counter() - start
+
+        size = os.path.getsize(file_name)
+        os.remove(file_name)
+
+        print("%-10s %12.2f %8.2f %14.1f %14.1f" % (label, size / 1e6, xml_size / float(size), xml_size / 1e6 / write_time, xml_size / 1e6 / read_time))
+
+    os.rmdir(directory)
+
+
+if __name__ == "__main__":
+    main(*[int(argument) for argument in sys.argv[1:3]])
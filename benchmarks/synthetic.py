@@ -0,0 +1,65 @@
+# Construct synthetic ELAN files for benchmarks
+
+import random
+
+from elan import ELANFile, ELANTimeSlot, ELANTier, ELANAlignableAnnotation, ELANRefAnnotation, ELANLinguisticType, ELANConstraint
+
+# Small vocabulary to draw annotation values from
+WORDS = ["the", "a", "house", "dog", "runs", "sleeps", "quickly", "under", "tree", "and", "she", "he", "sees", "big", "small"]
+
+
+# Construct an ELANFile object with the given number of speakers, each with
+# a words tier of annotations_per_tier annotations and a dependent
+# translation tier
+def make_elan_file(speakers=2, annotations_per_tier=1000, seed=0):
+
+    rng = random.Random(seed)
+
+    elan_file = ELANFile()
+    elan_file.set_url("synthetic.eaf")
+    elan_file.set_author("benchmark")
+    elan_file.set_date("2016-06-01T00:00:00+00:00")
+    elan_file.set_version("2.7")
+    elan_file.set_format("2.7")
+    elan_file.set_time_units("milliseconds")
+
+    elan_file.add_linguistic_type(ELANLinguisticType("words", elan_file, time_alignable="true"))
+    elan_file.add_linguistic_type(ELANLinguisticType("translation", elan_file, constraints="Symbolic_Association"))
+    elan_file.add_constraint(ELANConstraint("Symbolic_Association", "1-1 association with a parent annotation"))
+
+    time_slot_count = 0
+    annotation_count = 0
+
+    for speaker in range(speakers):
+
+        participant = "S" + str(speaker + 1)
+        words_tier = ELANTier(participant + "_words", "words", elan_file, participant=participant)
+        translation_tier = ELANTier(participant + "_translation", "translation", elan_file, participant=participant, parent_tier_ref=words_tier.get_tier_id())
+
+        time = rng.randint(0, 500)
+        for position in range(annotations_per_tier):
+
+            start = time
+            end = start + rng.randint(100, 1500)
+            time = end + rng.randint(-200, 800)
+
+            time_slot_count += 1
+            start_time_slot = ELANTimeSlot("ts" + str(time_slot_count), start)
+            time_slot_count += 1
+            end_time_slot = ELANTimeSlot("ts" + str(time_slot_count), end)
+            elan_file.add_time_slot(start_time_slot)
+            elan_file.add_time_slot(end_time_slot)
+
+            annotation_count += 1
+            value = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 6)))
+            words_tier.add_annotation(ELANAlignableAnnotation("a" + str(annotation_count), value, start_time_slot.get_id(), end_time_slot.get_id(), elan_file, words_tier))
+
+            annotation_count += 1
+            translation_tier.add_annotation(ELANRefAnnotation("a" + str(annotation_count), value.upper(), "a" + str(annotation_count - 1), elan_file, translation_tier))
+
+        elan_file.add_tier(words_tier)
+        elan_file.add_tier(translation_tier)
+
+    elan_file.set_property("lastUsedAnnotationId", str(annotation_count))
+
+    return elan_file
@@ -5,11 +5,53 @@
 
 # Import libraries for handling XML
 import xml.dom.minidom as dom
-from xml.sax.saxutils import escape
+import xml.parsers.expat as expat
+from xml.sax.saxutils import escape, unescape
 
 # Regular expressions
 import re
 
+# Shallow copies of the parts of ELAN documents
+import copy
+import weakref
+
+# Sorted sequences, queues and priority queues
+import heapq
+from collections import deque
+from bisect import bisect_left, bisect_right
+
+# File access and serialisation of tier indexes
+import os
+import mmap
+import json
+
+# Zip archives and parallel parsing of their members
+import zipfile
+import multiprocessing
+
+# Locks for allocating IDs from several threads
+import threading
+
+# Compression codecs for compressed ELAN files
+import gzip
+import bz2
+import lzma
+
+# Zstandard is only part of the standard library from Python 3.14 onwards
+try:
+    from compression import zstd
+except ImportError:
+    zstd = None
+
+# Typed arrays for collecting columns of annotation data
+from array import array
+
+# NumPy is optional and only needed for array exports
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 # Class to model a single ELAN time slot
 class ELANTimeSlot:
     
@@ -19,9 +61,13 @@ class ELANTimeSlot:
     # Time value of time slot (in milliseconds)
     time_value = None
     
+    # Reference to the time order containing the time slot
+    time_order = None
+    
     # Constructor
     def __init__(self, ID, time_value=None):
         self.ID = ID
+        self.time_order = None
 
         if not isinstance(time_value, int) and not time_value is None:
             time_value = int(time_value)
@@ -51,14 +97,18 @@ class ELANTimeSlot:
 
         return cls(time_slot_id, time_value)
 
-    # Method to produce an xml description from an ELANTimeSlot object
-    def to_xml(self, indent="    "):
+    # Method to produce an xml description from an ELANTimeSlot object.
+    # time_slot_ids optionally maps IDs to the IDs to be written instead.
+    def to_xml(self, indent="    ", time_slot_ids=None):
         
         # Construct a new xml node
         node = 2 * indent + "<TIME_SLOT "
         
         # Set TIME_SLOT_ID
-        node += "TIME_SLOT_ID=\"" + escape(self.get_id()) + "\""
+        if time_slot_ids is not None:
+            node += "TIME_SLOT_ID=\"" + escape(time_slot_ids[self.get_id()]) + "\""
+        else:
+            node += "TIME_SLOT_ID=\"" + escape(self.get_id()) + "\""
         
         # If the TIME_SLOT has a TIME_VALUE, output it too
         if self.has_time_value():
@@ -79,12 +129,35 @@ class ELANTimeSlot:
     
     def set_id(self, ID):
         self.ID = ID
+        self.mark_modified()
     
     def set_time_value(self, time_value):
         if not isinstance(time_value, int) and not time_value is None:
             time_value = int(time_value)
 
+        if self.time_order is not None:
+            self.time_order.release_clones()
+
+        if self.time_order is not None and self.time_order.has_journal() and self.time_order.time_slots_dict.get(self.ID) is self:
+            self.time_order.ELAN_file.journal.record(["set", "time_slot", self.ID, "time_value", self.time_value, time_value])
+
         self.time_value = time_value
+
+        if self.time_order is not None:
+            self.time_order.time_slots.invalidate_keys()
+
+        self.mark_modified()
+    
+    def set_time_order(self, time_order):
+        self.time_order = time_order
+    
+    def get_time_order(self):
+        return self.time_order
+    
+    # Notify the ELAN file containing the time slot of a modification
+    def mark_modified(self):
+        if self.time_order is not None and self.time_order.ELAN_file is not None:
+            self.time_order.ELAN_file.mark_modified()
         
     def has_time_value(self):
         if self.time_value is not None:
@@ -152,6 +225,466 @@ class ELANTimeSlot:
     def __hash__(self):
         return hash(self.ID + " " + str(self.time_value))
 
+# Class to model the sequence of time slots of a time order. The slots are
+# kept in blocks of at most 2 * BLOCK_SIZE slots together with their sort
+# keys: the time value of a time-aligned slot, or the key of the preceding
+# slot for an unaligned one. A slot is inserted in time position by binary
+# search over the last keys of the blocks and then within one block, so no
+# insertion has to move more than one block. Binary search needs the keys
+# in ascending order: time slots appended out of time order (e.g. from a
+# file whose TIME_ORDER is not sorted) are sorted once before the next
+# search (see refresh_keys).
+class ELANTimeSlotList:
+
+    # Target number of time slots per block
+    BLOCK_SIZE = 512
+
+    # Blocks of time slots, their sort keys and the last key of each block
+    blocks = None
+    keys = None
+    last_keys = None
+
+    # Number of time slots and (lazily computed) positions of the blocks
+    length = 0
+    offsets = None
+
+    # Whether time values have changed since the sort keys were computed
+    keys_stale = False
+
+    # Whether the time slots are in time order
+    ordered = True
+
+    # Sort keys by the identity of the time slots, to locate any time slot
+    # (including unaligned ones) by binary search
+    slot_keys = None
+
+    # Constructor
+    def __init__(self, time_slots=()):
+        self.build(time_slots)
+
+    # Fill the list with the given time slots in the given order, or in
+    # time order if they are not in time order (see sort)
+    def build(self, time_slots):
+
+        time_slots = list(time_slots)
+
+        # Compute all sort keys in one pass
+        keys = []
+        previous_key = float("-inf")
+        ordered = True
+        for time_slot in time_slots:
+            if time_slot.time_value is not None:
+                if time_slot.time_value < previous_key:
+                    ordered = False
+                previous_key = time_slot.time_value
+            keys.append(previous_key)
+
+        # A stable sort by these keys keeps every unaligned time slot
+        # right after its time-aligned predecessor
+        if not ordered:
+            order = sorted(range(len(time_slots)), key=keys.__getitem__)
+            time_slots = [time_slots[position] for position in order]
+            keys = [keys[position] for position in order]
+
+        self.slot_keys = dict((id(time_slot), key) for time_slot, key in zip(time_slots, keys))
+        self.blocks = [time_slots[start:start + self.BLOCK_SIZE] for start in range(0, len(time_slots), self.BLOCK_SIZE)]
+        self.keys = [keys[start:start + self.BLOCK_SIZE] for start in range(0, len(keys), self.BLOCK_SIZE)]
+        self.last_keys = [block_keys[-1] for block_keys in self.keys]
+        self.length = len(time_slots)
+        self.offsets = None
+        self.keys_stale = False
+        self.ordered = True
+
+    # The sort keys refer to the time slots by identity, which does not
+    # survive pickling, so they are computed anew
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["slot_keys"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.slot_keys = dict((id(time_slot), key) for block, keys in zip(self.blocks, self.keys) for time_slot, key in zip(block, keys))
+
+    # Note that time values have been changed in place
+    def invalidate_keys(self):
+        self.keys_stale = True
+
+    # Recompute the sort keys if time values have changed, and restore the
+    # time order if it has been lost
+    def refresh_keys(self):
+        if self.keys_stale or not self.ordered:
+            self.build(list(self))
+
+    # Return the sort key of a time slot following a slot with the given key
+    @staticmethod
+    def get_key(time_slot, previous_key):
+
+        if time_slot.time_value is not None:
+            return time_slot.time_value
+        elif previous_key is not None:
+            return previous_key
+        else:
+            return float("-inf")
+
+    # Append a time slot at the end
+    def append(self, time_slot):
+
+        if self.blocks and time_slot.time_value is not None and time_slot.time_value < self.last_keys[-1]:
+            self.ordered = False
+
+        if self.blocks and len(self.blocks[-1]) < 2 * self.BLOCK_SIZE:
+            key = self.get_key(time_slot, self.keys[-1][-1])
+            self.blocks[-1].append(time_slot)
+            self.keys[-1].append(key)
+            self.last_keys[-1] = key
+        else:
+            if self.keys:
+                key = self.get_key(time_slot, self.keys[-1][-1])
+            else:
+                key = self.get_key(time_slot, None)
+            self.blocks.append([time_slot])
+            self.keys.append([key])
+            self.last_keys.append(key)
+
+        self.slot_keys[id(time_slot)] = key
+        self.length += 1
+        self.offsets = None
+
+    # Insert a time slot into a block at a position with the given key
+    def insert_at(self, block_index, position, time_slot, key):
+
+        block = self.blocks[block_index]
+        keys = self.keys[block_index]
+
+        block.insert(position, time_slot)
+        keys.insert(position, key)
+        self.last_keys[block_index] = keys[-1]
+        self.slot_keys[id(time_slot)] = key
+
+        # Split blocks that have grown too large
+        if len(block) > 2 * self.BLOCK_SIZE:
+            self.blocks[block_index:block_index + 1] = [block[:self.BLOCK_SIZE], block[self.BLOCK_SIZE:]]
+            self.keys[block_index:block_index + 1] = [keys[:self.BLOCK_SIZE], keys[self.BLOCK_SIZE:]]
+            self.last_keys[block_index:block_index + 1] = [keys[self.BLOCK_SIZE - 1], keys[-1]]
+
+        self.length += 1
+        self.offsets = None
+
+    # Insert a time-aligned time slot after all slots with smaller or
+    # equal sort keys
+    def insert(self, time_slot):
+
+        if time_slot.time_value is None:
+            raise RuntimeError("Only time slots with a time value can be inserted in time position.")
+
+        self.refresh_keys()
+
+        if not self.blocks:
+            self.append(time_slot)
+            return
+
+        key = time_slot.time_value
+        block_index = min(bisect_right(self.last_keys, key), len(self.blocks) - 1)
+        position = bisect_right(self.keys[block_index], key)
+
+        self.insert_at(block_index, position, time_slot, key)
+
+    # Insert many time-aligned time slots. Small batches are inserted one by
+    # one; large ones are merged with the existing slots in a single pass.
+    def insert_many(self, time_slots):
+
+        time_slots = sorted(time_slots, key=lambda time_slot: time_slot.time_value)
+
+        for time_slot in time_slots:
+            if time_slot.time_value is None:
+                raise RuntimeError("Only time slots with a time value can be inserted in time position.")
+
+        self.refresh_keys()
+
+        if len(time_slots) * 16 < self.length:
+            for time_slot in time_slots:
+                self.insert(time_slot)
+            return
+
+        existing = ((key, time_slot) for block, keys in zip(self.blocks, self.keys) for time_slot, key in zip(block, keys))
+        new = ((time_slot.time_value, time_slot) for time_slot in time_slots)
+
+        # Existing time slots come first among equal keys, as with insert
+        self.build([time_slot for key, time_slot in heapq.merge(existing, new, key=lambda item: item[0])])
+
+    # Remove the given time slots in one pass
+    def remove_many(self, time_slots):
+
+        removed = set(id(time_slot) for time_slot in time_slots)
+        remaining = [time_slot for time_slot in self if id(time_slot) not in removed]
+
+        self.build(remaining)
+
+    # Return the block index and position of a time slot in the list by
+    # binary search for its sort key (only time slots with the same key
+    # are compared)
+    def locate(self, time_slot):
+
+        self.refresh_keys()
+
+        key = self.slot_keys.get(id(time_slot))
+
+        if key is not None:
+            for block_index in range(bisect_left(self.last_keys, key), len(self.blocks)):
+                block = self.blocks[block_index]
+                keys = self.keys[block_index]
+                position = bisect_left(keys, key)
+                while position < len(keys) and keys[position] == key:
+                    if block[position] is time_slot:
+                        return block_index, position
+                    position += 1
+                if position < len(keys):
+                    break
+
+        raise KeyError("Time slot " + str(time_slot.get_id()) + " is not part of the time order.")
+
+    # Return the time slot preceding a time slot (or None for the first one)
+    def get_previous(self, time_slot):
+
+        block_index, position = self.locate(time_slot)
+        if position > 0:
+            return self.blocks[block_index][position - 1]
+
+        while block_index > 0:
+            block_index -= 1
+            if self.blocks[block_index]:
+                return self.blocks[block_index][-1]
+
+        return None
+
+    # Insert a time slot directly after another one (e.g. an unaligned time
+    # slot between the time slots of a subdivided annotation)
+    def insert_after(self, reference_time_slot, time_slot):
+
+        block_index, position = self.locate(reference_time_slot)
+        key = self.get_key(time_slot, self.keys[block_index][position])
+
+        # A time-aligned time slot has to fit between the keys around it
+        if time_slot.time_value is not None:
+            next_key = self.get_next_aligned_key(block_index, position + 1)
+            if key < self.keys[block_index][position] or (next_key is not None and key > next_key):
+                raise RuntimeError("Time slot " + str(time_slot.get_id()) + " with time value " + str(key) + " cannot be inserted after time slot " +
+                                   str(reference_time_slot.get_id()) + " without breaking the time order.")
+
+        self.insert_at(block_index, position + 1, time_slot, key)
+
+        # Unaligned time slots following a new time-aligned one take over
+        # its key
+        if time_slot.time_value is not None:
+            position += 2
+            if position > len(self.blocks[block_index]):
+                position -= len(self.blocks[block_index])
+                block_index += 1
+            while block_index < len(self.blocks):
+                block = self.blocks[block_index]
+                keys = self.keys[block_index]
+                while position < len(block) and block[position].time_value is None:
+                    keys[position] = key
+                    self.slot_keys[id(block[position])] = key
+                    position += 1
+                self.last_keys[block_index] = keys[-1]
+                if position < len(block):
+                    break
+                block_index += 1
+                position = 0
+
+    # Return the key of the first time-aligned time slot from a position
+    # on (or None if there is none)
+    def get_next_aligned_key(self, block_index, position):
+
+        while block_index < len(self.blocks):
+            block = self.blocks[block_index]
+            while position < len(block):
+                if block[position].time_value is not None:
+                    return self.keys[block_index][position]
+                position += 1
+            block_index += 1
+            position = 0
+
+        return None
+
+    # Recompute the sort keys and restore the time order after time values
+    # have been changed in place. Unaligned time slots stay with the
+    # time-aligned slot preceding them.
+    def sort(self):
+        self.build(list(self))
+
+    # Useful hooks
+    def __iter__(self):
+        for block in self.blocks:
+            for time_slot in block:
+                yield time_slot
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, position):
+
+        if isinstance(position, slice):
+            return list(self)[position]
+
+        if position < 0:
+            position += self.length
+
+        if position < 0 or position >= self.length:
+            raise IndexError("Time slot position out of range.")
+
+        if self.offsets is None:
+            self.offsets = []
+            offset = 0
+            for block in self.blocks:
+                self.offsets.append(offset)
+                offset += len(block)
+
+        block_index = bisect_right(self.offsets, position) - 1
+
+        return self.blocks[block_index][position - self.offsets[block_index]]
+
+
+# Class to allocate unique IDs of the form <prefix><number> (such as a12 or
+# ts7) and unique tier IDs. The allocator keeps the highest number in use,
+# so a block of any size is reserved in constant time. All methods are
+# safe to call from several threads at the same time.
+class ELANIDAllocator:
+
+    # Prefix of the IDs
+    prefix = None
+
+    # Highest number in use (None until the allocator is initialised)
+    last_number = None
+
+    # Names handed out by allocate_name
+    reserved_names = None
+
+    # Lock guarding the allocator
+    lock = None
+
+    # Constructor
+    def __init__(self, prefix, last_number=None):
+        self.prefix = prefix
+        self.last_number = last_number
+        self.reserved_names = set()
+        self.lock = threading.RLock()
+
+    # Locks cannot be pickled (e.g. when ELAN files are sent between
+    # worker processes), so the lock is left out and created anew
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.RLock()
+
+    # Set the highest number in use from the IDs in use (and a number
+    # known to be in use, e.g. from the lastUsedAnnotationId property),
+    # unless the allocator has been initialised already
+    def initialise(self, IDs, last_number=None):
+
+        with self.lock:
+
+            if self.last_number is not None:
+                return
+
+            if last_number is None:
+                last_number = 0
+
+            prefix = self.prefix
+            length = len(prefix)
+            for ID in IDs:
+                if ID.startswith(prefix) and ID[length:].isdigit():
+                    number = int(ID[length:])
+                    if number > last_number:
+                        last_number = number
+
+            self.last_number = last_number
+
+    def is_initialised(self):
+        if self.last_number is not None:
+            return True
+        else:
+            return False
+
+    def get_last_number(self):
+        return self.last_number
+
+    # Set the highest number in use (e.g. after all IDs have been renumbered)
+    def set_last_number(self, last_number):
+        with self.lock:
+            self.last_number = last_number
+
+    # Take note of an ID in use (ignored until the allocator is initialised)
+    def register(self, ID):
+
+        prefix = self.prefix
+        if ID.startswith(prefix) and ID[len(prefix):].isdigit():
+            self.register_number(int(ID[len(prefix):]))
+
+    # Take note of a number in use
+    def register_number(self, number):
+
+        if self.last_number is None:
+            return
+
+        with self.lock:
+            if number > self.last_number:
+                self.last_number = number
+
+    # Reserve count consecutive numbers and return them as a range
+    def allocate_range(self, count):
+
+        with self.lock:
+
+            if self.last_number is None:
+                raise RuntimeError("ID allocator for " + self.prefix + "<number> has not been initialised.")
+
+            first = self.last_number + 1
+            self.last_number += count
+
+        return range(first, first + count)
+
+    # Reserve count IDs and return them as a list
+    def allocate(self, count):
+        prefix = self.prefix
+        return [prefix + str(number) for number in self.allocate_range(count)]
+
+    # Reserve a name that is not in used_ids and is not reserved already:
+    # name itself or name with the first free numeric suffix (name-2,
+    # name-3, ...). Without a name, <prefix><number> is used. The name
+    # stays reserved until it is released.
+    def allocate_name(self, used_ids, name=None):
+
+        with self.lock:
+
+            if name is None:
+                number = 1
+                while self.prefix + str(number) in used_ids or self.prefix + str(number) in self.reserved_names:
+                    number += 1
+                name = self.prefix + str(number)
+
+            elif name in used_ids or name in self.reserved_names:
+                number = 2
+                while name + "-" + str(number) in used_ids or name + "-" + str(number) in self.reserved_names:
+                    number += 1
+                name = name + "-" + str(number)
+
+            self.reserved_names.add(name)
+
+        return name
+
+    # Drop the reservation of a name (once it is in use or no longer needed)
+    def release_name(self, name):
+        with self.lock:
+            self.reserved_names.discard(name)
+
+
 # Class to model an ELAN time order
 class ELANTimeOrder:
     
@@ -163,12 +696,21 @@ class ELANTimeOrder:
     
     # Dictionary view from ids to ELANTimeSlot objects
     time_slots_dict = {}
+
+    # Whether time slots have been inserted in time position, so that the
+    # IDs have to be renumbered in time order when the file is written
+    renumber_on_save = False
+
+    # Allocator of IDs of the form ts<number>
+    time_slot_ids = None
     
     # Constructor
     def __init__(self, ELAN_file):
         self.ELAN_file = ELAN_file
-        self.time_slots = []
+        self.time_slots = ELANTimeSlotList()
         self.time_slots_dict = {}
+        self.renumber_on_save = False
+        self.time_slot_ids = ELANIDAllocator("ts")
     
     # Factory method to construct an ELANTimeOrder object
     # from a DOM xml node
@@ -198,11 +740,15 @@ class ELANTimeOrder:
             
             # Add the time slot to the time order
             time_order.add_time_slot(time_slot)
+
+        # Sort time slots not given in time order once
+        time_order.time_slots.refresh_keys()
         
         return time_order
 
-    # Method to produce an xml description from an ELANTimeOrder object
-    def to_xml(self, indent="    "):
+    # Method to produce an xml description from an ELANTimeOrder object.
+    # time_slot_ids optionally maps IDs to the IDs to be written instead.
+    def to_xml(self, indent="    ", time_slot_ids=None):
         
         # Construct a new xml node
         node = indent + "<TIME_ORDER>\n"
@@ -214,7 +760,7 @@ class ELANTimeOrder:
             for time_slot in self:
                 
                 # Add its xml node to the output
-                node += time_slot.to_xml(indent=indent)
+                node += time_slot.to_xml(indent=indent, time_slot_ids=time_slot_ids)
         
         # Construct the closing bracket
         node += indent + "</TIME_ORDER>\n"
@@ -254,11 +800,207 @@ class ELANTimeOrder:
                 raise KeyError("Cannot append time_slot. ID is already in use.")
             
             else:
+                self.release_clones()
                 self.time_slots.append(time_slot)
                 self.time_slots_dict[time_slot.get_id()] = time_slot
+                time_slot.set_time_order(self)
+                self.register_time_slot_id(time_slot.get_id())
+
+                if self.has_journal():
+                    self.ELAN_file.journal.record(["add_time_slots", [self.get_journal_record(time_slot)]])
+
+                if self.ELAN_file is not None:
+                    self.ELAN_file.mark_modified()
+
+                    if self.ELAN_file.active_transaction is not None:
+                        self.ELAN_file.active_transaction.add_time_slots([time_slot])
         
         else:
             raise TypeError("Can only append an ELANTimeSlot object to the time order.")
+
+    # Insert a time slot in time position in O(log n) (or directly after the
+    # time slot given as after, which is needed for unaligned time slots).
+    # IDs of existing time slots stay unchanged; instead all IDs are
+    # renumbered in time order when the file is written.
+    def insert_time_slot(self, time_slot, after=None):
+
+        if not isinstance(time_slot, ELANTimeSlot):
+            raise TypeError("Can only insert an ELANTimeSlot object into the time order.")
+
+        if time_slot in self:
+            raise KeyError("Cannot insert time_slot. ID is already in use.")
+
+        self.release_clones()
+
+        if after is not None:
+            if not isinstance(after, ELANTimeSlot):
+                after = self.get_time_slot_by_id(after)
+            self.time_slots.insert_after(after, time_slot)
+        elif time_slot.has_time_value():
+            self.time_slots.insert(time_slot)
+        else:
+            self.time_slots.append(time_slot)
+
+        self.time_slots_dict[time_slot.get_id()] = time_slot
+        time_slot.set_time_order(self)
+        self.register_time_slot_id(time_slot.get_id())
+        self.renumber_on_save = True
+
+        if self.has_journal():
+            self.ELAN_file.journal.record(["add_time_slots", [self.get_journal_record(time_slot)]])
+
+        if self.ELAN_file is not None:
+            self.ELAN_file.mark_modified()
+
+            if self.ELAN_file.active_transaction is not None:
+                self.ELAN_file.active_transaction.add_time_slots([time_slot])
+
+        return time_slot
+
+    # Insert many time-aligned time slots in time position at once
+    def insert_time_slots(self, time_slots):
+
+        time_slots = list(time_slots)
+        time_slot_ids = set()
+
+        time_slots_dict = self.time_slots_dict
+
+        for time_slot in time_slots:
+
+            if not isinstance(time_slot, ELANTimeSlot):
+                raise TypeError("Can only insert ELANTimeSlot objects into the time order.")
+
+            if time_slot.ID in time_slots_dict or time_slot.ID in time_slot_ids:
+                raise KeyError("Cannot insert time slot " + str(time_slot.ID) + ". ID is already in use.")
+
+            time_slot_ids.add(time_slot.ID)
+
+        self.release_clones()
+
+        self.time_slots.insert_many(time_slots)
+
+        for time_slot in time_slots:
+            time_slots_dict[time_slot.ID] = time_slot
+            time_slot.time_order = self
+
+        for time_slot_id in time_slot_ids:
+            self.register_time_slot_id(time_slot_id)
+
+        self.renumber_on_save = True
+
+        if self.has_journal() and time_slots:
+            self.ELAN_file.journal.record(["add_time_slots", [[time_slot.ID, time_slot.time_value, None] for time_slot in time_slots]])
+
+        if self.ELAN_file is not None:
+            self.ELAN_file.mark_modified()
+
+            if self.ELAN_file.active_transaction is not None:
+                self.ELAN_file.active_transaction.add_time_slots(time_slots)
+
+        return time_slots
+
+    # Remove time slots from the time order in one pass. Annotations
+    # referring to them are not changed.
+    def remove_time_slots(self, time_slots):
+
+        time_slots = [time_slot for time_slot in time_slots if self.time_slots_dict.get(time_slot.get_id()) is time_slot]
+
+        if not time_slots:
+            return
+
+        self.release_clones()
+
+        if self.has_journal():
+            self.ELAN_file.journal.record(["remove_time_slots", [self.get_journal_record(time_slot) for time_slot in time_slots]])
+
+        self.time_slots.remove_many(time_slots)
+
+        for time_slot in time_slots:
+            del self.time_slots_dict[time_slot.get_id()]
+            time_slot.set_time_order(None)
+
+        self.renumber_on_save = True
+
+        if self.ELAN_file is not None:
+            self.ELAN_file.mark_modified()
+
+    # Create a time slot with a new unique ID and insert it in time position
+    def new_time_slot(self, time_value=None, after=None):
+        return self.insert_time_slot(ELANTimeSlot(self.get_new_time_slot_id(), time_value), after)
+
+    # Return an unused ID of the form ts<number>
+    def get_new_time_slot_id(self):
+        return self.allocate_time_slot_ids(1)[0]
+
+    # Return count unused IDs of the form ts<number> (reserved in one step,
+    # also when called from several threads)
+    def allocate_time_slot_ids(self, count):
+
+        if not self.time_slot_ids.is_initialised():
+            self.time_slot_ids.initialise(list(self.time_slots_dict))
+
+        return self.time_slot_ids.allocate(count)
+
+    # Keep track of the highest number used in IDs
+    def register_time_slot_id(self, time_slot_id):
+        self.time_slot_ids.register(time_slot_id)
+
+    def get_time_slot_id_allocator(self):
+        return self.time_slot_ids
+
+    # Restore the time order after time values have been changed in place
+    # (see ELANTimeSlotList.sort)
+    def sort(self):
+
+        self.time_slots.sort()
+        self.renumber_on_save = True
+
+        if self.ELAN_file is not None:
+            self.ELAN_file.mark_modified()
+
+    # Return a dictionary from the IDs of the time slots to the IDs
+    # (ts1, ts2, ...) to be written, or None if the IDs are written as they are
+    def get_serialised_time_slot_ids(self):
+
+        if not self.renumber_on_save:
+            return None
+
+        time_slot_ids = {}
+        for number, time_slot in enumerate(self.time_slots):
+            time_slot_ids[time_slot.get_id()] = "ts" + str(number + 1)
+
+        return time_slot_ids
+
+    def needs_renumbering(self):
+        if self.renumber_on_save:
+            return True
+        else:
+            return False
+
+    def has_journal(self):
+        if self.ELAN_file is not None and self.ELAN_file.journal is not None:
+            return True
+        else:
+            return False
+
+    # Give clones of the ELAN file their own copies before a change
+    # (see ELANFile.release_clones)
+    def release_clones(self):
+        if self.ELAN_file is not None:
+            self.ELAN_file.release_clones()
+
+    # Return the record of a time slot used in journal operations: its ID,
+    # time value and, for unaligned time slots, the ID of the time slot
+    # preceding it
+    def get_journal_record(self, time_slot):
+
+        previous_time_slot_id = None
+        if time_slot.time_value is None:
+            previous_time_slot = self.time_slots.get_previous(time_slot)
+            if previous_time_slot is not None:
+                previous_time_slot_id = previous_time_slot.ID
+
+        return [time_slot.ID, time_slot.time_value, previous_time_slot_id]
     
     # Useful hooks
     
@@ -278,8 +1020,6 @@ class ELANTimeOrder:
     def __len__(self):
         return len(self.time_slots)
 
-    # TODO: Add methods to insert or delete time slots
-
 
 # Class to model a single ELAN media descriptor
 class ELANMediaDescriptor:
@@ -616,15 +1356,36 @@ class ELANAnnotation:
     
     def set_tier(self, tier):
         self.tier = tier
+        self.mark_modified()
     
     def set_annotation_id(self, annotation_id):
         self.annotation_id = annotation_id
+        self.mark_modified()
     
     def set_annotation_value(self, annotation_value):
+        self.record_change("annotation_value", annotation_value)
         self.annotation_value = annotation_value
+        self.mark_modified()
 
     def set_external_ref(self, external_ref):
+        self.record_change("external_ref", external_ref)
         self.external_ref = external_ref
+        self.mark_modified()
+    
+    # Record the change of an attribute in the journal of the ELAN file
+    # (if the annotation is part of a file with a journal). Clones of the
+    # file get their own copies before the change.
+    def record_change(self, attribute, value):
+        ELAN_file = self.ELAN_file
+        if ELAN_file is not None:
+            ELAN_file.release_clones()
+        if ELAN_file is not None and ELAN_file.journal is not None and ELAN_file.annotations_dict.get(self.annotation_id) is self:
+            ELAN_file.journal.record(["set", "annotation", self.annotation_id, attribute, getattr(self, attribute), value])
+
+    # Notify the ELAN file containing the annotation of a modification
+    def mark_modified(self):
+        if self.ELAN_file is not None:
+            self.ELAN_file.mark_modified()
     
     def has_external_ref(self):
         if self.external_ref is not None:
@@ -638,6 +1399,14 @@ class ELANAnnotation:
         else:
             return False
 
+    # Return the time span of the annotation, derived from its aligned
+    # ancestor for reference annotations (see ELANFile.get_effective_times)
+    def get_effective_start_time(self):
+        return self.ELAN_file.get_effective_times().get(self.annotation_id, (None, None))[0]
+
+    def get_effective_end_time(self):
+        return self.ELAN_file.get_effective_times().get(self.annotation_id, (None, None))[1]
+
 
 # Class to model a single ELAN alignable annotation
 class ELANAlignableAnnotation(ELANAnnotation):
@@ -664,6 +1433,7 @@ class ELANAlignableAnnotation(ELANAnnotation):
         self.ELAN_file = ELAN_file
         self.tier = tier
         self.svg_ref = svg_ref
+        self.external_ref = external_ref
 
     # Factory method to construct an ELANAlignableAnnotation object
     # from a DOM xml node
@@ -724,8 +1494,9 @@ class ELANAlignableAnnotation(ELANAnnotation):
         # Construct a new ELANAlignableAnnotation
         return cls(annotation_id, annotation_value, time_slot_ref1, time_slot_ref2, ELAN_file, tier, svg_ref, external_ref)
 
-    # Method to produce an xml description from an ELANAlignableAnnotation object
-    def to_xml(self, indent="    "):
+    # Method to produce an xml description from an ELANAlignableAnnotation object.
+    # time_slot_ids optionally maps time slot IDs to the IDs to be written instead.
+    def to_xml(self, indent="    ", time_slot_ids=None):
         
         # Construct a new xml node
         node = 2 * indent + "<ANNOTATION>\n"
@@ -736,11 +1507,18 @@ class ELANAlignableAnnotation(ELANAnnotation):
         # Set ANNOTATION_ID
         node += " ANNOTATION_ID=\"" + escape(self.get_annotation_id()) + "\""
         
+        if time_slot_ids is not None:
+            start_time_slot = time_slot_ids[self.get_start_time_slot()]
+            end_time_slot = time_slot_ids[self.get_end_time_slot()]
+        else:
+            start_time_slot = self.get_start_time_slot()
+            end_time_slot = self.get_end_time_slot()
+
         # Set TIME_SLOT_REF1
-        node += " TIME_SLOT_REF1=\"" + escape(self.get_start_time_slot()) + "\""
+        node += " TIME_SLOT_REF1=\"" + escape(start_time_slot) + "\""
 
         # Set TIME_SLOT_REF2
-        node += " TIME_SLOT_REF2=\"" + escape(self.get_end_time_slot()) + "\""
+        node += " TIME_SLOT_REF2=\"" + escape(end_time_slot) + "\""
         
         # Set the SVG_REF if there is one
         if self.has_svg_ref():
@@ -779,13 +1557,28 @@ class ELANAlignableAnnotation(ELANAnnotation):
         return self.svg_ref
     
     def set_start_time_slot(self, start_time_slot):
+        self.record_change("start_time_slot", start_time_slot)
+        self.move_time_slot_reference(self.start_time_slot, start_time_slot)
         self.start_time_slot = start_time_slot
+        self.mark_modified()
         
     def set_end_time_slot(self, end_time_slot):
+        self.record_change("end_time_slot", end_time_slot)
+        self.move_time_slot_reference(self.end_time_slot, end_time_slot)
         self.end_time_slot = end_time_slot
+        self.mark_modified()
+
+    # Keep the reference counts of time slots of the ELAN file up to date
+    # (if the annotation is part of the file)
+    def move_time_slot_reference(self, old_time_slot, new_time_slot):
+        ELAN_file = self.ELAN_file
+        if ELAN_file is not None and ELAN_file.annotations_dict.get(self.annotation_id) is self:
+            ELAN_file.move_time_slot_reference(old_time_slot, new_time_slot)
     
     def set_svg_ref(self, svg_ref):
+        self.record_change("svg_ref", svg_ref)
         self.svg_ref = svg_ref
+        self.mark_modified()
     
     def get_start_time(self):
         time_slot = self.ELAN_file.time_order.get_time_slot_by_id(self.start_time_slot)
@@ -949,7 +1742,8 @@ class ELANRefAnnotation(ELANAnnotation):
         return cls(annotation_id, annotation_value, annotation_ref, ELAN_file, tier, previous_annotation, external_ref)
 
     # Method to produce an xml description from an ELANRefAnnotation object
-    def to_xml(self, indent="    "):
+    # (time_slot_ids is accepted for symmetry with ELANAlignableAnnotation)
+    def to_xml(self, indent="    ", time_slot_ids=None):
         
         # Construct a new xml node
         node = 2 * indent + "<ANNOTATION>\n"
@@ -997,16 +1791,20 @@ class ELANRefAnnotation(ELANAnnotation):
         return self.previous_annotation
     
     def set_annotation_ref(self, annotation_ref):
+        self.record_change("annotation_ref", annotation_ref)
         self.annotation_ref = annotation_ref
+        self.mark_modified()
     
     def set_previous_annotation_ref(self, previous_annotation):
+        self.record_change("previous_annotation", previous_annotation)
         self.previous_annotation = previous_annotation
+        self.mark_modified()
 
     def get_parent_annotation(self):
         return self.ELAN_file.get_annotation_by_id(self.annotation_ref)
 
     def get_previous_annotation(self):
-        return self.ELAN_file.get_annotation_by_id(self.previous_annotation_ref)
+        return self.ELAN_file.get_annotation_by_id(self.previous_annotation)
     
     def has_previous_annotation(self):
         if self.previous_annotation is not None:
@@ -1135,8 +1933,9 @@ class ELANTier:
         # Return the complete ELANTier object
         return tier
 
-    # Method to produce an xml description from an ELANTier object
-    def to_xml(self, indent="    "):
+    # Method to produce an xml description from an ELANTier object.
+    # time_slot_ids optionally maps time slot IDs to the IDs to be written instead.
+    def to_xml(self, indent="    ", time_slot_ids=None):
 
         # Construct a new xml node
         node = indent + "<TIER"
@@ -1169,7 +1968,7 @@ class ELANTier:
         # Insert annotation values
         for annotation in self:
             
-            node += annotation.to_xml(indent=indent)
+            node += annotation.to_xml(indent=indent, time_slot_ids=time_slot_ids)
         
         # Close off the TIER node
         node += indent + "</TIER>\n"
@@ -1207,27 +2006,232 @@ class ELANTier:
     
     def set_tier_id(self, tier_id):
         self.tier_id = tier_id
+        self.mark_modified()
         
     def set_linguistic_type(self, linguistic_type):
+        self.record_change("linguistic_type", linguistic_type)
         self.linguistic_type = linguistic_type
+        self.mark_modified()
     
     def set_ELAN_file(self, ELAN_file):
         self.ELAN_file = ELAN_file
     
     def set_participant(self, participant):
+        self.record_change("participant", participant)
         self.participant = participant
+        self.mark_modified()
     
     def set_annotator(self, annotator):
-        self.annotator
+        self.record_change("annotator", annotator)
+        self.annotator = annotator
+        self.mark_modified()
     
     def set_default_locale(self, default_locale):
+        self.record_change("default_locale", default_locale)
         self.default_locale = default_locale
+        self.mark_modified()
     
     def set_parent_tier_ref(self, parent_tier_ref):
+        self.record_change("parent_tier_ref", parent_tier_ref)
         self.parent_tier_ref = parent_tier_ref
+        self.mark_modified()
     
+    # Add an annotation to the tier (and to the annotations of the
+    # ELAN file if the tier is already part of it). As before, IDs are not
+    # checked (files with duplicate IDs can still be read); the last
+    # annotation added with an ID is the one found by it.
     def add_annotation(self, annotation):
+
+        annotation_id = annotation.get_annotation_id()
+
+        # Tiers that are not part of the ELAN file yet (e.g. while being
+        # parsed) cannot be shared with its clones
+        in_file = self.ELAN_file is not None and self.ELAN_file.tiers_dict.get(self.tier_id) is self
+
+        if in_file:
+            self.ELAN_file.release_clones()
+
         self.annotations.append(annotation)
+        self.annotations_dict[annotation_id] = annotation
+
+        if in_file:
+
+            self.ELAN_file.annotations_dict[annotation_id] = annotation
+            self.ELAN_file.annotation_ids.register(annotation_id)
+            self.ELAN_file.count_time_slot_references([annotation], 1)
+
+            if self.ELAN_file.active_transaction is not None:
+                self.ELAN_file.active_transaction.add_annotations([annotation])
+
+            if self.ELAN_file.journal is not None:
+                self.ELAN_file.journal.record(["add_annotations", [ELANJournal.get_annotation_record(annotation, len(self.annotations) - 1)]])
+
+            self.mark_modified()
+
+    # Add time-aligned annotations given as (start time, end time, value)
+    # triples (times in milliseconds) in bulk. Time slots and annotation
+    # IDs are allocated for the whole batch, the time slots are inserted in
+    # time position in one go and the annotations are merged into those of
+    # the tier in order of time (start time, then end time; new annotations
+    # come after existing ones with the same times). All input is checked
+    # before anything is changed.
+    # Returns the new ELANAlignableAnnotation objects.
+    def add_annotations(self, annotations):
+
+        ELAN_file = self.ELAN_file
+
+        if ELAN_file is None or ELAN_file.tiers_dict.get(self.tier_id) is not self:
+            raise RuntimeError("Annotations can only be added in bulk to a tier that is part of an ELAN file.")
+
+        linguistic_type = ELAN_file.get_linguistic_type_by_id(self.linguistic_type)
+        if linguistic_type is not None and not linguistic_type.is_time_alignable():
+            raise RuntimeError("Cannot add time-aligned annotations to tier " + self.tier_id + " with symbolic linguistic type " + self.linguistic_type + ".")
+
+        items = []
+        for start, end, value in annotations:
+
+            if not isinstance(start, int):
+                start = int(start)
+
+            if not isinstance(end, int):
+                end = int(end)
+
+            if start < 0 or end < start:
+                raise RuntimeError("Illegal time interval " + str(start) + "-" + str(end) + " for annotation " + repr(value) + ".")
+
+            if value is None:
+                value = ""
+
+            items.append((start, end, value))
+
+        if not items:
+            return []
+
+        items.sort(key=lambda item: (item[0], item[1]))
+
+        # Allocate all IDs at once
+        annotation_ids = ELAN_file.allocate_annotation_ids(len(items))
+        time_slot_ids = ELAN_file.time_order.allocate_time_slot_ids(2 * len(items))
+
+        time_slots = []
+        new_annotations = []
+
+        for position, (start, end, value) in enumerate(items):
+
+            start_time_slot = ELANTimeSlot(time_slot_ids[2 * position], start)
+            end_time_slot = ELANTimeSlot(time_slot_ids[2 * position + 1], end)
+            time_slots.append(start_time_slot)
+            time_slots.append(end_time_slot)
+
+            new_annotations.append(ELANAlignableAnnotation(annotation_ids[position], value, start_time_slot.ID, end_time_slot.ID, ELAN_file, self))
+
+        # Times of the existing annotations, before any time slots are added
+        if self.annotations:
+            time_values = ELAN_file.get_time_slot_values()
+        else:
+            time_values = None
+
+        # Update the time order, the dictionaries and the tier once
+        ELAN_file.release_clones()
+
+        with ELAN_file.journal_group():
+
+            ELAN_file.time_order.insert_time_slots(time_slots)
+
+            for time_slot in time_slots:
+                ELAN_file.time_slots_dict[time_slot.ID] = time_slot
+
+            if self.annotations:
+                self.annotations[:] = self.merge_annotations(new_annotations, items, time_values)
+                new_ids = set(id(annotation) for annotation in new_annotations)
+                positions = [position for position, annotation in enumerate(self.annotations) if id(annotation) in new_ids]
+            else:
+                self.annotations.extend(new_annotations)
+                positions = range(len(new_annotations))
+
+            for annotation in new_annotations:
+                self.annotations_dict[annotation.annotation_id] = annotation
+                ELAN_file.annotations_dict[annotation.annotation_id] = annotation
+
+            ELAN_file.count_time_slot_references(new_annotations, 1)
+
+            if ELAN_file.active_transaction is not None:
+                ELAN_file.active_transaction.add_annotations(new_annotations)
+
+            if ELAN_file.journal is not None:
+                ELAN_file.journal.record(["add_annotations", [ELANJournal.get_annotation_record(annotation, position)
+                                                              for annotation, position in zip(new_annotations, positions)]])
+
+        self.mark_modified()
+
+        return new_annotations
+
+    # Merge new annotations, sorted by their (start, end) times given in
+    # items, with the annotations of the tier in one pass. Existing
+    # annotations are ordered by the times in time_values (see
+    # ELANFile.get_time_slot_values); those without times keep their place
+    # after the annotation before them.
+    def merge_annotations(self, new_annotations, items, time_values):
+
+        existing = []
+        previous_key = (float("-inf"), float("-inf"))
+        for annotation in self.annotations:
+            if isinstance(annotation, ELANAlignableAnnotation):
+                start = time_values.get(annotation.start_time_slot)
+                end = time_values.get(annotation.end_time_slot)
+                if start is not None:
+                    if end is None:
+                        end = start
+                    previous_key = (start, end)
+            existing.append((previous_key, annotation))
+
+        new = (((start, end), annotation) for (start, end, value), annotation in zip(items, new_annotations))
+
+        return [annotation for key, annotation in heapq.merge(existing, new, key=lambda item: item[0])]
+
+    # Remove the annotations at the given positions from the tier: one by
+    # one if they are few, otherwise in one pass over the tier. Only their
+    # entries are removed from the dictionary of annotations. Returns the
+    # removed annotations.
+    def remove_annotations_at(self, positions):
+
+        positions = sorted(set(positions), reverse=True)
+        removed = [self.annotations[position] for position in positions]
+
+        if len(positions) * 16 < len(self.annotations):
+            for position in positions:
+                del self.annotations[position]
+        else:
+            positions = set(positions)
+            self.annotations[:] = [annotation for position, annotation in enumerate(self.annotations) if position not in positions]
+
+        for annotation in removed:
+            if self.annotations_dict.get(annotation.annotation_id) is annotation:
+                del self.annotations_dict[annotation.annotation_id]
+
+        return removed
+    
+    # Record the change of an attribute in the journal of the ELAN file
+    # (if the tier is part of a file with a journal). Clones of the file
+    # get their own copies before the change.
+    def record_change(self, attribute, value):
+        ELAN_file = self.ELAN_file
+        if ELAN_file is not None:
+            ELAN_file.release_clones()
+        if ELAN_file is not None and ELAN_file.journal is not None and ELAN_file.tiers_dict.get(self.tier_id) is self:
+            ELAN_file.journal.record(["set", "tier", self.tier_id, attribute, getattr(self, attribute), value])
+
+    # Notify the ELAN file containing the tier of a modification
+    def mark_modified(self):
+        if self.ELAN_file is not None:
+            self.ELAN_file.mark_modified()
+
+    # Export the timings and values of the annotations as a NumPy
+    # structured array (see ELANFile.to_numpy). Returns the array and
+    # the codebook of annotation values.
+    def to_numpy(self, codebook=None):
+        result, codebook, tier_ids = self.ELAN_file.to_numpy([self], codebook)
+        return result, codebook
     
     def has_participant(self):
         if self.participant is not None:
@@ -1277,7 +2281,7 @@ class ELANTier:
     
     # in operator
     def __contains__(self, annotation):
-        if annotation.get_id() in self.annotations_dict:
+        if annotation.get_annotation_id() in self.annotations_dict:
             return True
         else:
             return False
@@ -1908,6 +2912,8 @@ class ELANControlledVocabulary:
         self.cv_id = cv_id
         self.description = description
         self.ext_ref = ext_ref
+        self.cv_entries = []
+        self.cv_entries_dict = {}
 
     # Factory method to construct an ELANControlledVocabulary object
     # from a DOM xml node
@@ -2553,504 +3559,1941 @@ class ELANLexiconReference:
     def __str__(self):
         return self.lex_ref_id
 
-    
-# Class to model a complete ELAN file
-class ELANFile:
-    
-    # File name
-    URL = None
-    
-    # Parsed xml tree of the file
-    xml_tree = None
-    
-    # Basic metadata
-    author = None       # required
-    date = None         # required
-    format = None       # optional
-    version = None      # required
-    
-    # Time units used (defaults to milliseconds)
-    time_units = None
-    
-    # List of linked media files
-    media_files = []
-    
-    # List of other linked files
-    linked_files = []
-    
-    # Key-value pairs
-    properties = {}
-    
-    # Time order (containing time slots as anchors for annotations)
-    time_order = None
-    
-    # List of tiers
-    tiers = []
-    
-    # List of linguistic types
-    linguistic_types = []
-    
-    # List of constraints
-    constraints = []
-    
-    # List of controlled vocabularies
-    controlled_vocabularies = []
-    
-    # Locales
-    locales = []
-    
-    # List of references to lexicons
-    lexicon_references = []
-    
-    # List of external references
-    external_references = []
 
-    # Dictionary views on relevant parts of the ELAN document
-    # Dictionary view on all media files
-    media_files_dict = {}
 
-    # Dictionary view on all linked files
-    linked_files_dict = {}
-    
-    # Dictionary view on all time slots
-    time_slots_dict = {}
-    
-    # Dictionary view on all tiers
-    tiers_dict = {}
-    
-    # Dictionary view on all annotations contained in all tiers
-    annotations_dict = {}
-    
-    # Dictionary view on all linguistic types
-    linguistic_types_dict = {}
-    
-    # Dictionary view on all constraints
-    constraints_dict = {}
-    
-    # Dictionary view on all controlled vocabularies
-    controlled_vocabularies_dict = {}
-    
-    # Dictionary view on all external references
-    external_references_dict = {}
+# Return percentiles (0 to 100) of the values counted in a histogram (a
+# dictionary from values to numbers of occurrences), linearly interpolated
+# between neighbouring ranks like numpy.percentile. Only needs one pass
+# over the distinct values, so it is cheap for millisecond durations.
+def get_histogram_percentiles(histogram, percentiles):
 
-    # Dictionary view on all lexicon references
-    lexicon_references_dict = {}
+    count = sum(histogram.values())
+
+    if count == 0:
+        return [None for percentile in percentiles]
+
+    # Ranks (0-based) of all requested order statistics
+    wanted = []
+    for percentile in percentiles:
+        position = (count - 1) * percentile / 100.0
+        wanted.append(int(position))
+        wanted.append(min(int(position) + 1, count - 1))
+
+    # Walk through the histogram once in order of values
+    values_at_rank = {}
+    pending = deque(sorted(set(wanted)))
+    seen = 0
+    for value in sorted(histogram):
+        seen += histogram[value]
+        while pending and pending[0] < seen:
+            values_at_rank[pending.popleft()] = value
+        if not pending:
+            break
+
+    results = []
+    for percentile in percentiles:
+        position = (count - 1) * percentile / 100.0
+        lower = values_at_rank[int(position)]
+        upper = values_at_rank[min(int(position) + 1, count - 1)]
+        results.append(lower + (upper - lower) * (position - int(position)))
+
+    return results
+
+
+# Class to model summary statistics of a group of annotations. Durations
+# are kept as a histogram (with one bin per millisecond), so groups can be
+# merged exactly and percentiles remain exact.
+class ELANAnnotationStatistics:
+
+    # Number of annotations, of time-aligned annotations and of empty ones
+    count = 0
+    aligned_count = 0
+    empty_count = 0
+
+    # Sum of the durations of the time-aligned annotations
+    total_duration = 0
+
+    # Histogram from durations to numbers of annotations
+    durations = None
+
+    # Set of distinct non-empty annotation values
+    vocabulary = None
 
     # Constructor
     def __init__(self):
-        
-        pass
+        self.count = 0
+        self.aligned_count = 0
+        self.empty_count = 0
+        self.total_duration = 0
+        self.durations = {}
+        self.vocabulary = set()
 
-    @classmethod
-    def read_elan_file(cls, file_name):
-        xml_tree = dom.parse(file_name)
-        return ELANFile.parse_xml(xml_tree, file_name)
+    # Add a single annotation (duration is None if it is not time-aligned)
+    def add(self, duration, value, is_empty):
 
-    # Method to convert an xml tree into the ELANFile object and its components
-    @classmethod
-    def parse_xml(cls, xml_tree, file_name):
-        
-        # TODO: (Re)initialize values in order to make sure
-        # that no contamination between different ELANFile objects occurs
-        
-        # Create a new ELANFile object
-        elan_file = cls()
-        elan_file.xml_tree = xml_tree
-        elan_file.url = file_name
-        
-        # Basic metadata
-        elan_file.author = None
-        elan_file.date = None
-        elan_file.format = None
-        elan_file.version = None
+        self.count += 1
 
-        # Time units used (defaults to milliseconds)
-        elan_file.time_units = None
-    
-        # List of linked media files
-        elan_file.media_files = []
-    
-        # List of other linked files
-        elan_file.linked_files = []
-    
-        # Key-value pairs
-        elan_file.properties = {}
-    
-        # Time order (containing time slots as anchors for annotations)
-        elan_file.time_order = None
-    
-        # List of tiers
-        elan_file.tiers = []
-    
-        # List of linguistic types
-        elan_file.linguistic_types = []
-    
-        # List of constraints
-        elan_file.constraints = []
-    
-        # List of controlled vocabularies
-        elan_file.controlled_vocabularies = []
-    
-        # Locales
-        elan_file.locales = []
-    
-        # List of references to lexicons
-        elan_file.lexicon_references = []
-    
-        # List of external references
-        elan_file.external_references = []
+        if duration is not None:
+            self.aligned_count += 1
+            self.total_duration += duration
+            self.durations[duration] = self.durations.get(duration, 0) + 1
 
-        # Dictionary views on relevant parts of the ELAN document
-        # Dictionary view on all media files
-        elan_file.media_files_dict = {}
+        if is_empty:
+            self.empty_count += 1
+        else:
+            self.vocabulary.add(value)
 
-        # Dictionary view on all linked files
-        elan_file.linked_files_dict = {}
-    
-        # Dictionary view on all time slots
-        elan_file.time_slots_dict = {}
-    
-        # Dictionary view on all tiers
-        elan_file.tiers_dict = {}
-    
-        # Dictionary view on all annotations contained in all tiers
-        elan_file.annotations_dict = {}
-    
-        # Dictionary view on all linguistic types
-        elan_file.linguistic_types_dict = {}
-    
-        # Dictionary view on all constraints
-        elan_file.constraints_dict = {}
-    
-        # Dictionary view on all controlled vocabularies
-        elan_file.controlled_vocabularies_dict = {}
-    
-        # Dictionary view on all external references
-        elan_file.external_references_dict = {}
+    # Add the rows of a structured array produced by ELANFile.to_numpy
+    def add_array(self, data, empty_values, codebook):
 
-        # Dictionary view on all lexicon references
-        elan_file.lexicon_references_dict = {}
+        self.count += len(data)
 
-        # Only look at the surrounding ANNOTATION_DOCUMENT element        
-        xml_tree = xml_tree.firstChild
-        
-        # Make sure the document node has the right type
-        if xml_tree.nodeName == "ANNOTATION_DOCUMENT":
-            
-            # Extract meta data from outer ANNOTATION_DOCUMENT node
-            # Extract information about the author
-            if xml_tree.hasAttribute("AUTHOR"):
-                elan_file.author = xml_tree.getAttribute("AUTHOR")
-            
-            # Extract information about the date
-            if xml_tree.hasAttribute("DATE"):
-                elan_file.date = xml_tree.getAttribute("DATE")
+        aligned_durations = data["duration"][data["aligned"]]
+        self.aligned_count += len(aligned_durations)
+        self.total_duration += int(aligned_durations.sum())
 
-            # Extract information about the format
-            if xml_tree.hasAttribute("FORMAT"):
-                elan_file.format = xml_tree.getAttribute("FORMAT")
+        durations, counts = numpy.unique(aligned_durations, return_counts=True)
+        for duration, count in zip(durations.tolist(), counts.tolist()):
+            self.durations[duration] = self.durations.get(duration, 0) + count
 
-            # Extract information about the version
-            if xml_tree.hasAttribute("VERSION"):
-                elan_file.version = xml_tree.getAttribute("VERSION")
+        is_empty = empty_values[data["value"]]
+        self.empty_count += int(is_empty.sum())
 
-            # Process child nodes of document node
-            for child_node in xml_tree.childNodes:
-                
-                # Skip non-element nodes
-                if child_node.nodeType != child_node.ELEMENT_NODE:
-                    continue
-                
-                # Determine type of node
-                if child_node.tagName == "HEADER":
-                    
-                    # Extract information from the header
-                    # Deprecated MEDIA_FILE attribute
-                    if child_node.hasAttribute("MEDIA_FILE"):
-                        elan_file.media_file = child_node.getAttribute("MEDIA_FILE")
+        for code in numpy.unique(data["value"][~is_empty]).tolist():
+            self.vocabulary.add(codebook[code])
 
-                    # Largely redundant TIME_UNITS attribute (should always be milliseconds)
-                    if child_node.hasAttribute("TIME_UNITS"):
-                        elan_file.media_file = child_node.getAttribute("TIME_UNITS")
-                    
-                    # Assume default value
-                    else:
-                        elan_file.time_units = "milliseconds"
-                    
-                    # Process parts of the header
-                    for header_child_node in child_node.childNodes:
-                        
-                        # Skip non-element nodes
-                        if header_child_node.nodeType != header_child_node.ELEMENT_NODE:
-                            continue
-                        
-                        if header_child_node.tagName == "MEDIA_DESCRIPTOR":
-                            
-                            # Construct a new ELANMediaDescriptor object
-                            media_descriptor = ELANMediaDescriptor.from_xml(header_child_node)
-                            
-                            # Append the ELANMediaDescriptor object to the list of media files
-                            elan_file.media_files.append(media_descriptor)
-                            
-                            # Also add it to the hash view on media files
-                            elan_file.media_files_dict[media_descriptor.get_media_url()] = media_descriptor
-                        
-                        elif header_child_node.tagName == "LINKED_FILE_DESCRIPTOR":
-                            
-                            # Construct a new ELANLinkedFileDescriptor
-                            linked_file_descriptor = ELANLinkedFileDescriptor.from_xml(header_child_node)
-                            
-                            # Append the ELANLinkedFileDescriptor object to the list of linked files
-                            elan_file.linked_files.append(linked_file_descriptor)
-                            
-                            # Also add it to the hash view on linked files
-                            elan_file.linked_files_dict[linked_file_descriptor.get_link_url()] = linked_file_descriptor
-                        
-                        elif header_child_node.tagName == "PROPERTY":
-                            
-                            # Name of the property is in the NAME attribute
-                            if header_child_node.hasAttribute("NAME"):
-                                name = header_child_node.getAttribute("NAME")
-                            else:
-                                raise RuntimeError("PROPERTY element is missing NAME attribute.")
+    # Add the statistics of another group to this one
+    def merge(self, other):
 
-                            # Get the value of the property
-                            if header_child_node.hasChildNodes():
-                                
-                                if header_child_node.firstChild.nodeType == header_child_node.TEXT_NODE:
+        self.count += other.count
+        self.aligned_count += other.aligned_count
+        self.empty_count += other.empty_count
+        self.total_duration += other.total_duration
 
-                                    value = header_child_node.firstChild.data
+        for duration, count in other.durations.items():
+            self.durations[duration] = self.durations.get(duration, 0) + count
 
-                                else:
-                                    
-                                    raise RuntimeError("PROPERTY is empty.")
+        self.vocabulary.update(other.vocabulary)
 
-                            else:
+    # Getter methods
+    def get_count(self):
+        return self.count
 
-                                raise RuntimeError("PROPERTY is empty.")
-                            
-                            # Add property to properties hash
-                            elan_file.properties[name] = value
-                            
-                        else:
-                            raise RuntimeError("Unknown ELAN header entry: " + header_child_node.tagName)
-                
-                elif child_node.tagName == "TIME_ORDER":
-                    
-                    # Construct a new time order from the xml_node
-                    elan_file.time_order = ELANTimeOrder.from_xml(child_node, elan_file)
-                    
-                    # Also construct a dictionary view on the time slots
-                    # in the time order
-                    for time_slot in elan_file.time_order:
-                        
-                        # Add current time slot to dictionary of time slots
-                        elan_file.time_slots_dict[time_slot.get_id()] = time_slot                    
-                
-                elif child_node.tagName == "TIER":
-                    
-                    # Construct a new tier from the xml node
-                    tier = ELANTier.from_xml(child_node, elan_file)
-                    
-                    # Add tier to the list of tiers
-                    elan_file.tiers.append(tier)
-                    
-                    # Add tier to the dictionary view on tiers
-                    elan_file.tiers_dict[tier.get_tier_id()] = tier
-                    
-                    # Go through all annotations on the tier
-                    # and add them to the dictionary view on annotations
-                    for annotation in tier:
-                        
-                        # Add annotation to the dictionary view on annotations
-                        elan_file.annotations_dict[annotation.get_annotation_id()] = annotation
-                
-                elif child_node.tagName == "LINGUISTIC_TYPE":
-                    
-                    # Construct a new linguistic type from the xml node
-                    linguistic_type = ELANLinguisticType.from_xml(child_node, elan_file)
-                    
-                    # Add linguistic type to the list of linguistic types
-                    elan_file.linguistic_types.append(linguistic_type)
-                    
-                    # Add linguistic type to the dictionary view on linguistic types
-                    elan_file.linguistic_types_dict[linguistic_type.get_linguistic_type_id()] = linguistic_type
-                                    
-                elif child_node.tagName == "CONSTRAINT":
-                    
-                    # Construct a new constraint from the xml node
-                    constraint = ELANConstraint.from_xml(child_node)
-                    
-                    # Add constraint to the list of constraints
-                    elan_file.constraints.append(constraint)
-                    
-                    # Add constraint to the dictionary view on constraints
-                    elan_file.constraints_dict[constraint.get_stereotype()] = constraint
-                
-                elif child_node.tagName == "CONTROLLED_VOCABULARY":
-                    
-                    # Construct a new controlled vocabulary
-                    controlled_vocabulary = ELANControlledVocabulary.from_xml(child_node)
-                    
-                    # Add controlled vocabulary to the list of controlled vocabularies
-                    elan_file.controlled_vocabularies.append(controlled_vocabulary)
-                    
-                    # Add controlled vocabulary to the dictionary view on controlled vocabularies
-                    elan_file.controlled_vocabularies_dict[controlled_vocabulary.get_cv_id()] = controlled_vocabulary
+    def get_aligned_count(self):
+        return self.aligned_count
 
-                elif child_node.tagName == "EXTERNAL_REF":
-                    
-                    # Construct a new external reference from xml node
-                    external_ref = ELANExternalReference.from_xml(child_node)
-                    
-                    # Add external reference to the list of external references
-                    elan_file.external_references.append(external_ref)
-                    
-                    # Add external reference to the dictionary view on external references
-                    elan_file.external_references_dict[external_ref.get_id()] = external_ref
-                
-                elif child_node.tagName == "LOCALE":
-                    
-                    # Construct a new locale from the xml node
-                    locale = ELANLocale.from_xml(child_node)
-                    
-                    # Add the locale to the list of locales
-                    elan_file.locales.append(locale)
-                
-                elif child_node.tagName == "LEXICON_REF":
-                    
-                    # Construct a new lexicon reference
-                    lexicon_ref = ELANLexiconReference.from_xml(child_node)
-                    
-                    # Add lexicon reference to the list of lexicon references
-                    elan_file.lexicon_references.append(lexicon_ref)
-                    
-                    # Add lexicon reference to the dictionary view on lexicon references
-                    elan_file.lexicon_references_dict[lexicon_ref.get_id()] = lexicon_ref
-                
-                else:
-                    raise RuntimeError("Unknown XML node: " + child_node.tagName)
-        
+    def get_empty_count(self):
+        return self.empty_count
+
+    def get_total_duration(self):
+        return self.total_duration
+
+    def get_mean_duration(self):
+        if self.aligned_count > 0:
+            return self.total_duration / float(self.aligned_count)
         else:
-            raise RuntimeError("XML document does not have the correct type ANNOTATION_DOCUMENT.")
+            return None
 
-        # Return the created ELANFile object
-        return elan_file
+    def get_min_duration(self):
+        if self.durations:
+            return min(self.durations)
+        else:
+            return None
 
-#    # Method to convert an xml tree into the ELANFile object and its components
-#    def parse_xml(self, xml_tree):
-#        
-#        # (Re)initialize values in order to make sure
-#        # that no contamination between different ELANFile objects occurs
-#        
-#        # Basic metadata
-#        self.author = None
-#        self.date = None
-#        self.format = None
-#        self.version = None
-#
-#        # Time units used (defaults to milliseconds)
-#        self.time_units = None
-#    
-#        # List of linked media files
-#        self.media_files = []
-#    
-#        # List of other linked files
-#        self.linked_files = []
-#    
-#        # Key-value pairs
-#        self.properties = {}
-#    
-#        # Time order (containing time slots as anchors for annotations)
-#        self.time_order = None
-#    
-#        # List of tiers
-#        self.tiers = []
-#    
-#        # List of linguistic types
-#        self.linguistic_types = []
-#    
-#        # List of constraints
-#        self.constraints = []
-#    
-#        # List of controlled vocabularies
-#        self.controlled_vocabularies = []
-#    
-#        # Locales
-#        self.locales = []
-#    
-#        # List of references to lexicons
-#        self.lexicon_references = []
-#    
-#        # List of external references
-#        self.external_references = []
-#
-#        # Dictionary views on relevant parts of the ELAN document
-#        # Dictionary view on all media files
-#        self.media_files_dict = {}
-#
-#        # Dictionary view on all linked files
-#        self.linked_files_dict = {}
-#    
-#        # Dictionary view on all time slots
-#        self.time_slots_dict = {}
-#    
-#        # Dictionary view on all tiers
-#        self.tiers_dict = {}
-#    
-#        # Dictionary view on all annotations contained in all tiers
-#        self.annotations_dict = {}
-#    
-#        # Dictionary view on all linguistic types
-#        self.linguistic_types_dict = {}
-#    
-#        # Dictionary view on all constraints
-#        self.constraints_dict = {}
-#    
-#        # Dictionary view on all controlled vocabularies
-#        self.controlled_vocabularies_dict = {}
-#    
-#        # Dictionary view on all external references
-#        self.external_references_dict = {}
-#
-#        # Dictionary view on all lexicon references
-#        self.lexicon_references_dict = {}
-#
-#        # Only look at the surrounding ANNOTATION_DOCUMENT element        
-#        xml_tree = xml_tree.firstChild
-#        
-#        # Make sure the document node has the right type
-#        if xml_tree.nodeName == "ANNOTATION_DOCUMENT":
-#            
-#            # Extract meta data from outer ANNOTATION_DOCUMENT node
-#            # Extract information about the author
-#            if xml_tree.hasAttribute("AUTHOR"):
-#                self.author = xml_tree.getAttribute("AUTHOR")
-#            
-#            # Extract information about the date
-#            if xml_tree.hasAttribute("DATE"):
-#                self.date = xml_tree.getAttribute("DATE")
-#
-#            # Extract information about the format
-#            if xml_tree.hasAttribute("FORMAT"):
-#                self.format = xml_tree.getAttribute("FORMAT")
+    def get_max_duration(self):
+        if self.durations:
+            return max(self.durations)
+        else:
+            return None
+
+    def get_vocabulary(self):
+        return self.vocabulary
+
+    def get_vocabulary_size(self):
+        return len(self.vocabulary)
+
+    # Return percentiles (0 to 100) of the durations, linearly interpolated
+    # between neighbouring ranks like numpy.percentile
+    def get_percentiles(self, percentiles=(50, 90, 95)):
+        return get_histogram_percentiles(self.durations, percentiles)
+
+    def get_percentile(self, percentile):
+        return self.get_percentiles([percentile])[0]
+
+    # Summarise the statistics in a dictionary
+    def to_dict(self, percentiles=(50, 90, 95)):
+
+        summary = {
+            "count": self.count,
+            "aligned_count": self.aligned_count,
+            "empty_count": self.empty_count,
+            "total_duration": self.total_duration,
+            "mean_duration": self.get_mean_duration(),
+            "min_duration": self.get_min_duration(),
+            "max_duration": self.get_max_duration(),
+            "vocabulary_size": self.get_vocabulary_size(),
+        }
+
+        for percentile, value in zip(percentiles, self.get_percentiles(percentiles)):
+            summary["p" + str(percentile)] = value
+
+        return summary
+
+
+# Class to model annotation statistics of one or more ELAN files,
+# broken down by tier ID and by participant
+class ELANStatistics:
+
+    # Statistics over all annotations
+    totals = None
+
+    # Dictionaries from tier IDs and participants to statistics
+    tiers = None
+    participants = None
+
+    # Number of files the statistics are based on
+    file_count = 0
+
+    # Constructor
+    def __init__(self, totals=None, tiers=None, participants=None, file_count=0):
+
+        if totals is None:
+            totals = ELANAnnotationStatistics()
+
+        if tiers is None:
+            tiers = {}
+
+        if participants is None:
+            participants = {}
+
+        self.totals = totals
+        self.tiers = tiers
+        self.participants = participants
+        self.file_count = file_count
+
+    # Add the statistics of another file or corpus to this one
+    # (tiers with the same ID are combined)
+    def merge(self, other):
+
+        self.totals.merge(other.totals)
+
+        for key, group in other.tiers.items():
+            if key not in self.tiers:
+                self.tiers[key] = ELANAnnotationStatistics()
+            self.tiers[key].merge(group)
+
+        for key, group in other.participants.items():
+            if key not in self.participants:
+                self.participants[key] = ELANAnnotationStatistics()
+            self.participants[key].merge(group)
+
+        self.file_count += other.file_count
+
+    # Combine the statistics of several files into corpus totals
+    # without modifying the (possibly cached) inputs
+    @classmethod
+    def combine(cls, statistics):
+
+        combined = cls()
+        for other in statistics:
+            combined.merge(other)
+
+        return combined
+
+    # Getter methods
+    def get_totals(self):
+        return self.totals
+
+    def get_tier_statistics(self, tier_id):
+        if tier_id in self.tiers:
+            return self.tiers[tier_id]
+        else:
+            return None
+
+    def get_participant_statistics(self, participant):
+        if participant in self.participants:
+            return self.participants[participant]
+        else:
+            return None
+
+    def get_tiers(self):
+        return self.tiers
+
+    def get_participants(self):
+        return self.participants
+
+    def get_file_count(self):
+        return self.file_count
+
+    # Summarise the statistics in a dictionary
+    def to_dict(self, percentiles=(50, 90, 95)):
+
+        return {
+            "file_count": self.file_count,
+            "totals": self.totals.to_dict(percentiles),
+            "tiers": dict((key, group.to_dict(percentiles)) for key, group in self.tiers.items()),
+            "participants": dict((key, group.to_dict(percentiles)) for key, group in self.participants.items()),
+        }
+
+
+# Class to model a transaction on an ELAN file. Annotations and time slots
+# added while the transaction is active are removed again if the with
+# block is left with an exception. Transactions can be nested; an inner
+# transaction that fails only rolls back its own additions. Annotation and
+# time slot IDs allocated in a failed transaction are not reused.
+class ELANTransaction:
+
+    # Reference to the ELAN file
+    ELAN_file = None
+
+    # Enclosing transaction (if nested)
+    parent = None
+
+    # Annotations and time slots added in the transaction
+    added_annotations = None
+    added_time_slots = None
+
+    # Constructor
+    def __init__(self, ELAN_file):
+        self.ELAN_file = ELAN_file
+        self.parent = None
+        self.added_annotations = []
+        self.added_time_slots = []
+
+    # Record additions
+    def add_annotations(self, annotations):
+        self.added_annotations.extend(annotations)
+
+    def add_time_slots(self, time_slots):
+        self.added_time_slots.extend(time_slots)
+
+    def get_added_annotations(self):
+        return self.added_annotations
+
+    def get_added_time_slots(self):
+        return self.added_time_slots
+
+    # Remove everything added in the transaction
+    def rollback(self):
+
+        ELAN_file = self.ELAN_file
+
+        with ELAN_file.journal_group():
+
+            ELAN_file.discard_annotations(self.added_annotations)
+
+            time_slots = []
+            for time_slot in self.added_time_slots:
+                if ELAN_file.time_slots_dict.get(time_slot.ID) is time_slot:
+                    del ELAN_file.time_slots_dict[time_slot.ID]
+                    time_slots.append(time_slot)
+
+            ELAN_file.time_order.remove_time_slots(time_slots)
+
+        self.added_annotations = []
+        self.added_time_slots = []
+
+        ELAN_file.mark_modified()
+
+    # Context manager hooks
+    def __enter__(self):
+        self.parent = self.ELAN_file.active_transaction
+        self.ELAN_file.active_transaction = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.ELAN_file.active_transaction = self.parent
+
+        if exc_type is not None:
+            self.rollback()
+
+        elif self.parent is not None:
+            self.parent.add_annotations(self.added_annotations)
+            self.parent.add_time_slots(self.added_time_slots)
+
+        return False
+
+
+# Class to model a journal of the changes made to an ELAN file. Every
+# change made through the setters and editing methods is recorded as an
+# operation, i.e. a JSON-serialisable list:
 #
-#            # Extract information about the version
-#            if xml_tree.hasAttribute("VERSION"):
-#                self.version = xml_tree.getAttribute("VERSION")
+#   ["set", kind, ID, attribute, old value, new value]
+#       with kind "annotation", "time_slot" or "tier"
+#   ["add_time_slots", [[ID, time value, ID of preceding slot], ...]]
+#   ["remove_time_slots", [[ID, time value, ID of preceding slot], ...]]
+#   ["add_annotations", [annotation record, ...]]
+#   ["remove_annotations", [annotation record, ...]]
+#   ["add_tier", position, [tier ID, linguistic type, participant,
+#                           annotator, default locale, parent tier ID]]
+#   ["remove_tier", position, [...]]
+#   ["set_time_values", [ID, ...], [old value, ...], [new value, ...]]
+#   ["compact", merge_equal_time_slots]
 #
-#            # Process child nodes of document node
-#            for child_node in xml_tree.childNodes:
-#                
-#                # Skip non-element nodes
-#                if child_node.nodeType != child_node.ELEMENT_NODE:
-#                    continue
-#                
-#                # Determine type of node
-#                if child_node.tagName == "HEADER":
-#                    
-#                    # Extract information from the header
-#                    # Deprecated MEDIA_FILE attribute
+# Operations caused by one call (e.g. a cascading removal) form one step,
+# which is undone and redone as a whole. Each operation carries what is
+# needed to invert it, so undoing and redoing a step costs no more than
+# the step itself. Compaction renumbers all IDs and cannot be undone; it
+# clears the undo history. If a log file is given, every step, undo and
+# redo is appended to it as a line of JSON as soon as it is complete, so
+# the edits can be replayed onto the original file after a crash (see
+# ELANJournal.replay). Changes of IDs, linguistic types, vocabularies and
+# header data are not recorded.
+class ELANJournal:
+
+    # Reference to the ELAN file
+    ELAN_file = None
+
+    # Steps (lists of operations) that can be undone and redone
+    undo_steps = None
+    redo_steps = None
+
+    # Operations of the step being recorded and the nesting depth of groups
+    current_step = None
+    group_depth = 0
+
+    # Whether operations are being applied by the journal itself
+    applying = False
+
+    # Append-only log
+    log_file_name = None
+    log_file = None
+
+    # Constructor
+    def __init__(self, ELAN_file, log_file_name=None):
+        self.ELAN_file = ELAN_file
+        self.undo_steps = []
+        self.redo_steps = []
+        self.current_step = None
+        self.group_depth = 0
+        self.applying = False
+        self.log_file_name = log_file_name
+        self.log_file = None
+
+        if log_file_name is not None:
+            self.log_file = open(log_file_name, "a", encoding="utf-8")
+
+    # Record an operation (as part of the current group, if any)
+    def record(self, operation):
+
+        if self.applying:
+            return
+
+        if self.current_step is not None:
+            self.current_step.append(operation)
+        else:
+            self.add_step([operation])
+
+    # Add a completed step
+    def add_step(self, operations):
+
+        if not operations:
+            return
+
+        if any(operation[0] == "compact" for operation in operations):
+            self.undo_steps = []
+        else:
+            self.undo_steps.append(operations)
+
+        self.redo_steps = []
+        self.write_log({"step": operations})
+
+    # Collect the operations recorded until the matching end_group in one step
+    def begin_group(self):
+
+        if self.group_depth == 0:
+            self.current_step = []
+
+        self.group_depth += 1
+
+    def end_group(self):
+
+        self.group_depth -= 1
+
+        if self.group_depth == 0:
+            operations = self.current_step
+            self.current_step = None
+            self.add_step(operations)
+
+    # Undo the last step. Returns False if there is nothing to undo.
+    def undo(self):
+
+        if not self.undo_steps:
+            return False
+
+        operations = self.undo_steps.pop()
+        self.apply_operations([self.invert(operation) for operation in reversed(operations)])
+        self.redo_steps.append(operations)
+        self.write_log({"undo": 1})
+
+        return True
+
+    # Redo the last undone step. Returns False if there is nothing to redo.
+    def redo(self):
+
+        if not self.redo_steps:
+            return False
+
+        operations = self.redo_steps.pop()
+        self.apply_operations(operations)
+        self.undo_steps.append(operations)
+        self.write_log({"redo": 1})
+
+        return True
+
+    def can_undo(self):
+        if self.undo_steps:
+            return True
+        else:
+            return False
+
+    def can_redo(self):
+        if self.redo_steps:
+            return True
+        else:
+            return False
+
+    def get_undo_steps(self):
+        return self.undo_steps
+
+    def get_redo_steps(self):
+        return self.redo_steps
+
+    # Return the operation undoing an operation
+    @staticmethod
+    def invert(operation):
+
+        kind = operation[0]
+
+        if kind == "set":
+            return ["set", operation[1], operation[2], operation[3], operation[5], operation[4]]
+        elif kind == "set_time_values":
+            return ["set_time_values", operation[1], operation[3], operation[2]]
+        elif kind == "add_time_slots":
+            return ["remove_time_slots", operation[1]]
+        elif kind == "remove_time_slots":
+            return ["add_time_slots", operation[1]]
+        elif kind == "add_annotations":
+            return ["remove_annotations", operation[1]]
+        elif kind == "remove_annotations":
+            return ["add_annotations", operation[1]]
+        elif kind == "add_tier":
+            return ["remove_tier", operation[1], operation[2]]
+        elif kind == "remove_tier":
+            return ["add_tier", operation[1], operation[2]]
+        else:
+            raise RuntimeError("Journal operation " + str(kind) + " cannot be undone.")
+
+    # Apply operations to the ELAN file without recording them
+    def apply_operations(self, operations):
+
+        self.ELAN_file.release_clones()
+
+        self.applying = True
+        try:
+            for operation in operations:
+                self.apply(operation)
+        finally:
+            self.applying = False
+
+    # Apply a single operation to the ELAN file
+    def apply(self, operation):
+
+        ELAN_file = self.ELAN_file
+        kind = operation[0]
+
+        if kind == "set":
+
+            if operation[1] == "annotation":
+                if operation[3] in ["start_time_slot", "end_time_slot"]:
+                    ELAN_file.move_time_slot_reference(operation[4], operation[5])
+                setattr(ELAN_file.annotations_dict[operation[2]], operation[3], operation[5])
+            elif operation[1] == "tier":
+                setattr(ELAN_file.tiers_dict[operation[2]], operation[3], operation[5])
+            elif operation[1] == "time_slot":
+                ELAN_file.time_slots_dict[operation[2]].set_time_value(operation[5])
+            else:
+                raise RuntimeError("Unknown kind of object in journal: " + str(operation[1]))
+
+            ELAN_file.mark_modified()
+
+        elif kind == "set_time_values":
+            time_slots = [ELAN_file.time_slots_dict[time_slot_id] for time_slot_id in operation[1]]
+            ELAN_file.write_time_values(time_slots, operation[3])
+
+        elif kind == "add_time_slots":
+
+            aligned_time_slots = []
+            unaligned_time_slots = []
+            for time_slot_id, time_value, previous_time_slot_id in operation[1]:
+                if time_value is None:
+                    unaligned_time_slots.append((ELANTimeSlot(time_slot_id), previous_time_slot_id))
+                else:
+                    aligned_time_slots.append(ELANTimeSlot(time_slot_id, time_value))
+
+            ELAN_file.time_order.insert_time_slots(aligned_time_slots)
+            for time_slot in aligned_time_slots:
+                ELAN_file.time_slots_dict[time_slot.ID] = time_slot
+
+            for time_slot, previous_time_slot_id in unaligned_time_slots:
+                ELAN_file.insert_time_slot(time_slot, ELAN_file.time_slots_dict.get(previous_time_slot_id))
+
+        elif kind == "remove_time_slots":
+
+            time_slots = []
+            for time_slot_id, time_value, previous_time_slot_id in operation[1]:
+                time_slot = ELAN_file.time_slots_dict.pop(time_slot_id, None)
+                if time_slot is not None:
+                    time_slots.append(time_slot)
+
+            ELAN_file.time_order.remove_time_slots(time_slots)
+
+        elif kind == "add_annotations":
+
+            for record in operation[1]:
+
+                tier = ELAN_file.tiers_dict[record[1]]
+
+                if record[0] == "A":
+                    annotation = ELANAlignableAnnotation(record[2], record[3], record[4], record[5], ELAN_file, tier, record[6], record[7])
+                else:
+                    annotation = ELANRefAnnotation(record[2], record[3], record[4], ELAN_file, tier, record[5], record[6])
+
+                # Annotations are restored in ascending order of position
+                if record[-1] is None:
+                    tier.annotations.append(annotation)
+                else:
+                    tier.annotations.insert(record[-1], annotation)
+
+                tier.annotations_dict[annotation.annotation_id] = annotation
+                ELAN_file.annotations_dict[annotation.annotation_id] = annotation
+
+            ELAN_file.count_time_slot_references([ELAN_file.annotations_dict[record[2]] for record in operation[1]], 1)
+
+            # Keep the lastUsedAnnotationId property up to date
+            numbers = [int(record[2][1:]) for record in operation[1] if record[2].startswith("a") and record[2][1:].isdigit()]
+            last_used = ELAN_file.get_property("lastUsedAnnotationId")
+            if numbers and (last_used is None or not last_used.isdigit() or max(numbers) > int(last_used)):
+                ELAN_file.set_property("lastUsedAnnotationId", str(max(numbers)))
+            for record in operation[1]:
+                ELAN_file.annotation_ids.register(record[2])
+
+            ELAN_file.mark_modified()
+
+        elif kind == "remove_annotations":
+
+            # Remove annotations at their recorded positions; those not
+            # found there (or recorded without position) are looked up
+            positions_by_tier = {}
+            unplaced = []
+            for record in operation[1]:
+                tier = ELAN_file.tiers_dict[record[1]]
+                annotation = ELAN_file.annotations_dict[record[2]]
+                position = record[-1]
+                if position is not None and position < len(tier.annotations) and tier.annotations[position] is annotation:
+                    positions_by_tier.setdefault(record[1], []).append(position)
+                else:
+                    unplaced.append(annotation)
+
+            removed = []
+            for tier_id, positions in positions_by_tier.items():
+                removed.extend(ELAN_file.tiers_dict[tier_id].remove_annotations_at(positions))
+
+            for annotation in removed:
+                if ELAN_file.annotations_dict.get(annotation.annotation_id) is annotation:
+                    del ELAN_file.annotations_dict[annotation.annotation_id]
+
+            ELAN_file.count_time_slot_references(removed, -1)
+
+            if unplaced:
+                ELAN_file.discard_annotations(unplaced, release_time_slots=False)
+
+            ELAN_file.mark_modified()
+
+        elif kind == "add_tier":
+            tier_id, linguistic_type, participant, annotator, default_locale, parent_tier_ref = operation[2]
+            tier = ELANTier(tier_id, linguistic_type, ELAN_file, participant, annotator, default_locale, parent_tier_ref)
+            ELAN_file.tiers.insert(operation[1], tier)
+            ELAN_file.tiers_dict[tier_id] = tier
+            ELAN_file.mark_modified()
+
+        elif kind == "remove_tier":
+            tier = ELAN_file.tiers_dict.pop(operation[2][0])
+            ELAN_file.tiers = [other_tier for other_tier in ELAN_file.tiers if other_tier is not tier]
+            ELAN_file.tier_ids.release_name(tier.tier_id)
+
+            # Keep the tier from being loaded again from the source file
+            if ELAN_file.tier_index_dict.pop(tier.tier_id, None) is not None:
+                ELAN_file.tier_index = [entry for entry in ELAN_file.tier_index if entry[0] != tier.tier_id]
+
+            ELAN_file.mark_modified()
+
+        elif kind == "compact":
+            ELAN_file.compact(operation[1])
+
+        else:
+            raise RuntimeError("Unknown journal operation: " + str(kind))
+
+    # Append an entry to the log
+    def write_log(self, entry):
+
+        if self.log_file is None:
+            return
+
+        self.log_file.write(json.dumps(entry) + "\n")
+        self.log_file.flush()
+
+    # Stop writing the log
+    def close(self):
+
+        if self.log_file is not None:
+            self.log_file.close()
+            self.log_file = None
+
+    # Replay a log onto an ELAN file (usually the file as it was when the
+    # log was started) and return a journal holding the replayed undo and
+    # redo history. An incomplete last line, as left behind by a crash, is
+    # ignored. With log_file_name, the returned journal appends further
+    # steps to that log.
+    @classmethod
+    def replay(cls, ELAN_file, replay_file_name, log_file_name=None):
+
+        journal = cls(ELAN_file)
+
+        with open(replay_file_name, encoding="utf-8") as replay_file:
+            lines = replay_file.readlines()
+
+        for line_number, line in enumerate(lines):
+
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                if line_number == len(lines) - 1:
+                    break
+                raise RuntimeError("Line " + str(line_number + 1) + " of journal log " + replay_file_name + " is corrupt.")
+
+            if "step" in entry:
+                journal.apply_operations(entry["step"])
+                journal.add_step(entry["step"])
+            elif "undo" in entry:
+                journal.undo()
+            elif "redo" in entry:
+                journal.redo()
+
+        if log_file_name is not None:
+            journal.log_file_name = log_file_name
+            journal.log_file = open(log_file_name, "a", encoding="utf-8")
+
+        return journal
+
+    # Return the records of annotations (with their position in the tier,
+    # None for the end) and tiers used in operations
+    @staticmethod
+    def get_annotation_record(annotation, position=None):
+
+        if isinstance(annotation, ELANAlignableAnnotation):
+            return ["A", annotation.tier.tier_id, annotation.annotation_id, annotation.annotation_value, annotation.start_time_slot,
+                    annotation.end_time_slot, annotation.svg_ref, annotation.external_ref, position]
+        else:
+            return ["R", annotation.tier.tier_id, annotation.annotation_id, annotation.annotation_value, annotation.annotation_ref,
+                    annotation.previous_annotation, annotation.external_ref, position]
+
+    @staticmethod
+    def get_tier_record(tier):
+        return [tier.tier_id, tier.linguistic_type, tier.participant, tier.annotator, tier.default_locale, tier.parent_tier_ref]
+
+
+# Class to group the operations recorded by a journal into one step
+# (used in a with statement, does nothing without a journal)
+class ELANJournalGroup:
+
+    # Journal (or None)
+    journal = None
+
+    # Constructor
+    def __init__(self, journal):
+        self.journal = journal
+
+    # Context manager hooks
+    def __enter__(self):
+        if self.journal is not None:
+            self.journal.begin_group()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.journal is not None:
+            self.journal.end_group()
+        return False
+
+
+# Compression formats recognised by their file name extension
+COMPRESSION_EXTENSIONS = {
+    ".gz": "gzip",
+    ".bz2": "bz2",
+    ".xz": "xz",
+    ".lzma": "xz",
+    ".zst": "zstd",
+}
+
+# Compression formats recognised by the first bytes of a stream
+COMPRESSION_MAGIC_NUMBERS = [
+    (b"\x1f\x8b", "gzip"),
+    (b"BZh", "bz2"),
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"\x28\xb5\x2f\xfd", "zstd"),
+]
+
+
+# Determine the compression format of a file name or a binary file object.
+# Returns None for uncompressed input.
+def detect_compression(source):
+
+    # Rely on the extension of file names
+    if isinstance(source, str):
+        extension = os.path.splitext(source)[1].lower()
+        if extension in COMPRESSION_EXTENSIONS:
+            return COMPRESSION_EXTENSIONS[extension]
+
+        # Look at the contents of existing files without a known extension
+        if not os.path.isfile(source):
+            return None
+
+        with open(source, "rb") as input_file:
+            head = input_file.read(8)
+
+    # Peek into buffered streams without consuming any data
+    elif hasattr(source, "peek"):
+        head = source.peek(8)[:8]
+
+    # Read and rewind seekable streams
+    elif hasattr(source, "seekable") and source.seekable():
+        position = source.tell()
+        head = source.read(8)
+        source.seek(position)
+
+    else:
+        return None
+
+    # Text streams cannot be compressed
+    if not isinstance(head, bytes):
+        return None
+
+    for magic_number, compression in COMPRESSION_MAGIC_NUMBERS:
+        if head.startswith(magic_number):
+            return compression
+
+    return None
+
+
+# Open a decompressing or compressing stream on a file name or a binary
+# file object. Data is passed through the codec in chunks and never
+# held in memory as a whole.
+def open_compressed(source, compression, mode="rb", compression_level=None):
+
+    if compression == "gzip":
+        if compression_level is None:
+            compression_level = 9
+        if isinstance(source, str):
+            return gzip.open(source, mode, compresslevel=compression_level)
+        return gzip.GzipFile(fileobj=source, mode=mode, compresslevel=compression_level)
+
+    elif compression == "bz2":
+        if compression_level is None:
+            compression_level = 9
+        return bz2.BZ2File(source, mode, compresslevel=compression_level)
+
+    elif compression == "xz":
+        if "w" in mode:
+            return lzma.LZMAFile(source, mode, preset=compression_level)
+        return lzma.LZMAFile(source, mode)
+
+    elif compression == "zstd":
+        if zstd is None:
+            raise RuntimeError("Zstandard compression requires the compression.zstd module (Python 3.14 or later).")
+        if "w" in mode:
+            return zstd.ZstdFile(source, mode, level=compression_level)
+        return zstd.ZstdFile(source, mode)
+
+    else:
+        raise RuntimeError("Unknown compression format: " + str(compression))
+
+
+
+# Fields of the structured arrays produced by ELANFile.to_numpy: start and
+# end time, duration (all in milliseconds, 0 for annotations without time
+# values), index of the tier, code of the annotation value in the codebook
+# and whether the annotation has time values
+NUMPY_ANNOTATION_FIELDS = [
+    ("start", "i8"),
+    ("end", "i8"),
+    ("duration", "i8"),
+    ("tier", "i4"),
+    ("value", "i4"),
+    ("aligned", "?"),
+]
+
+# Annotation IDs of the form a<number> in the raw contents of an ELAN file
+ANNOTATION_ID_PATTERN = re.compile(rb"\bANNOTATION_ID\s*=\s*[\"']a([0-9]+)[\"']")
+
+
+# Split a path running through a zip archive (corpus.zip/session/file.eaf)
+# into the path of the archive and the name of the member. Returns None if
+# no component of the path is a zip archive.
+def split_archive_path(file_name):
+
+    parts = file_name.replace(os.sep, "/").split("/")
+
+    for position in range(len(parts) - 1, 0, -1):
+        archive_name = "/".join(parts[:position])
+
+        if os.path.isfile(archive_name):
+            if zipfile.is_zipfile(archive_name):
+                return archive_name, "/".join(parts[position:])
+            else:
+                return None
+
+    return None
+
+
+# Check whether the name of an archive member looks like an ELAN file
+# (possibly compressed)
+def is_elan_file_name(file_name):
+
+    root, extension = os.path.splitext(file_name.lower())
+    if extension in COMPRESSION_EXTENSIONS:
+        root, extension = os.path.splitext(root)
+
+    if extension == ".eaf":
+        return True
+    else:
+        return False
+
+
+# Archive handle of a worker process reading from a zip archive
+_worker_archive = None
+
+
+# Initializer of worker processes: every worker opens its own handle
+def _open_worker_archive(archive_name):
+    global _worker_archive
+    _worker_archive = zipfile.ZipFile(archive_name)
+
+
+# Parse one archive member and apply an optional function to it
+def _read_archive_member(archive, member, function):
+
+    with archive.open(member) as input_stream:
+        elan_file = ELANFile.read_elan_file(input_stream)
+
+    elan_file.set_url(archive.filename + "/" + member)
+
+    if function is not None:
+        return member, function(elan_file)
+
+    # The DOM tree is not needed any more and cannot be sent
+    # back from worker processes efficiently
+    elan_file.set_xml_tree(None)
+
+    return member, elan_file
+
+
+# Task of worker processes reading from a zip archive
+def _read_worker_archive_member(task):
+    member, function = task
+    return _read_archive_member(_worker_archive, member, function)
+
+    
+# Class to model a complete ELAN file
+class ELANFile:
+    
+    # File name
+    URL = None
+    
+    # Parsed xml tree of the file
+    xml_tree = None
+    
+    # Basic metadata
+    author = None       # required
+    date = None         # required
+    format = None       # optional
+    version = None      # required
+    
+    # Time units used (defaults to milliseconds)
+    time_units = None
+    
+    # List of linked media files
+    media_files = []
+    
+    # List of other linked files
+    linked_files = []
+    
+    # Key-value pairs
+    properties = {}
+    
+    # Time order (containing time slots as anchors for annotations)
+    time_order = None
+    
+    # List of tiers
+    tiers = []
+    
+    # List of linguistic types
+    linguistic_types = []
+    
+    # List of constraints
+    constraints = []
+    
+    # List of controlled vocabularies
+    controlled_vocabularies = []
+    
+    # Locales
+    locales = []
+    
+    # List of references to lexicons
+    lexicon_references = []
+    
+    # List of external references
+    external_references = []
+
+    # Dictionary views on relevant parts of the ELAN document
+    # Dictionary view on all media files
+    media_files_dict = {}
+
+    # Dictionary view on all linked files
+    linked_files_dict = {}
+    
+    # Dictionary view on all time slots
+    time_slots_dict = {}
+    
+    # Dictionary view on all tiers
+    tiers_dict = {}
+    
+    # Dictionary view on all annotations contained in all tiers
+    annotations_dict = {}
+    
+    # Dictionary view on all linguistic types
+    linguistic_types_dict = {}
+    
+    # Dictionary view on all constraints
+    constraints_dict = {}
+    
+    # Dictionary view on all controlled vocabularies
+    controlled_vocabularies_dict = {}
+    
+    # Dictionary view on all external references
+    external_references_dict = {}
+
+    # Dictionary view on all lexicon references
+    lexicon_references_dict = {}
+
+    # Byte offsets of the TIER elements in the source file,
+    # as a list of (tier ID, start offset, end offset) tuples
+    tier_index = []
+
+    # Dictionary view on the tier index
+    tier_index_dict = {}
+
+    # Size and modification time of the indexed source file
+    tier_index_stat = None
+
+    # Encoding declared by the indexed source file (None for UTF-8 without
+    # declaration), needed to parse single tiers
+    tier_index_encoding = None
+
+    # Number of modifications made so far (used to invalidate caches)
+    revision = 0
+
+    # Transaction currently active (see ELANFile.transaction)
+    active_transaction = None
+
+    # Allocators of annotation IDs of the form a<number> and of tier IDs
+    annotation_ids = None
+    tier_ids = None
+
+    # ELAN file this file was cloned from (see ELANFile.clone), the tiers
+    # still shared with it and whether the time order and the controlled
+    # vocabularies are still shared with it
+    clone_source = None
+    shared_tiers = {}
+    shared_time_order = False
+    shared_controlled_vocabularies = False
+
+    # Weak references to the clones of this file that may still share
+    # parts of it
+    clones = []
+
+    # Dictionary from time slot IDs to the number of time-aligned
+    # annotations referring to them (None until it is first needed)
+    time_slot_references = None
+
+    # Journal of changes (see ELANFile.start_journal)
+    journal = None
+
+    # Cached statistics and the revision they were computed for
+    statistics_cache = None
+    statistics_revision = None
+
+    # Cached effective times and the revision they were computed for
+    effective_times_cache = None
+    effective_times_revision = None
+
+    # Cached index of child annotations and the revision it was built for
+    children_index_cache = None
+    children_index_revision = None
+
+    # Constructor
+    def __init__(self):
+        
+        # Initialize values in order to make sure that no
+        # contamination between different ELANFile objects occurs
+        self.url = None
+        self.xml_tree = None
+
+        # Basic metadata
+        self.author = None
+        self.date = None
+        self.format = None
+        self.version = None
+
+        # Deprecated media file attribute and time units
+        self.media_file = None
+        self.time_units = None
+
+        # Lists of the parts of the ELAN document
+        self.media_files = []
+        self.linked_files = []
+        self.properties = {}
+        self.time_order = ELANTimeOrder(self)
+        self.tiers = []
+        self.linguistic_types = []
+        self.constraints = []
+        self.controlled_vocabularies = []
+        self.locales = []
+        self.lexicon_references = []
+        self.external_references = []
+
+        # Dictionary views on relevant parts of the ELAN document
+        self.media_files_dict = {}
+        self.linked_files_dict = {}
+        self.time_slots_dict = {}
+        self.tiers_dict = {}
+        self.annotations_dict = {}
+        self.linguistic_types_dict = {}
+        self.constraints_dict = {}
+        self.controlled_vocabularies_dict = {}
+        self.external_references_dict = {}
+        self.lexicon_references_dict = {}
+
+        # Byte offsets of the tiers in the source file
+        self.tier_index = []
+        self.tier_index_dict = {}
+        self.tier_index_stat = None
+        self.tier_index_encoding = None
+
+        # Modification counter and caches depending on it
+        self.revision = 0
+        self.active_transaction = None
+        self.annotation_ids = ELANIDAllocator("a")
+        self.tier_ids = ELANIDAllocator("tier")
+        self.clone_source = None
+        self.shared_tiers = {}
+        self.shared_time_order = False
+        self.shared_controlled_vocabularies = False
+        self.clones = []
+        self.time_slot_references = None
+        self.journal = None
+        self.statistics_cache = None
+        self.statistics_revision = None
+        self.effective_times_cache = None
+        self.effective_times_revision = None
+        self.children_index_cache = None
+        self.children_index_revision = None
+
+    # Weak references to clones cannot be pickled (and the clones share
+    # nothing with a copy), so they are left out
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["clones"] = []
+        return state
+
+    # Read an ELAN file. For files on disk, the byte offsets of all TIER
+    # elements are recorded so that single tiers can be re-read later on.
+    # With lazy_tiers=True, the tiers themselves are not parsed until they
+    # are requested with load_tier. If tier_index_file_name is given and the
+    # sidecar index there is up to date, the file is not scanned for tiers.
+    # Compressed files (gzip, bz2, xz and zstd) are decompressed on the fly,
+    # both when given as file names and as binary file objects. Members of
+    # zip archives can be read as zipfile.Path objects or with paths
+    # running through the archive (corpus.zip/session/file.eaf).
+    @classmethod
+    def read_elan_file(cls, file_name, lazy_tiers=False, tier_index_file_name=None):
+
+        # Determine whether the file is a member of a zip archive
+        archive_member = None
+        if isinstance(file_name, zipfile.Path):
+            archive_member = (file_name.root.filename, file_name.at)
+        elif isinstance(file_name, str) and not os.path.exists(file_name):
+            archive_member = split_archive_path(file_name)
+
+        if archive_member is not None:
+
+            if lazy_tiers:
+                raise RuntimeError("Lazy loading of tiers is not possible for ELAN files in zip archives.")
+
+            with zipfile.ZipFile(archive_member[0]) as archive:
+                return _read_archive_member(archive, archive_member[1], None)[1]
+
+        compression = detect_compression(file_name)
+
+        # Byte offsets in compressed files cannot be used for seeking
+        if compression is not None:
+
+            if lazy_tiers:
+                raise RuntimeError("Lazy loading of tiers is not possible for compressed ELAN files.")
+
+            with open_compressed(file_name, compression) as input_stream:
+                xml_tree = dom.parse(input_stream)
+
+            return ELANFile.parse_xml(xml_tree, file_name)
+
+        # File objects and other sources cannot be indexed
+        if not isinstance(file_name, str):
+            xml_tree = dom.parse(file_name)
+            return ELANFile.parse_xml(xml_tree, file_name)
+
+        tier_index = None
+        if tier_index_file_name is not None:
+            tier_index = cls.read_tier_index(file_name, tier_index_file_name)
+
+        with open(file_name, "rb") as input_file:
+
+            file_stat = os.fstat(input_file.fileno())
+
+            # Empty files cannot be mapped (and are no valid ELAN files)
+            if file_stat.st_size == 0:
+                raise RuntimeError("ELAN file " + file_name + " is empty.")
+
+            data = mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+            try:
+
+                if tier_index is None:
+                    tier_index = cls.build_tier_index(data)
+
+                if lazy_tiers:
+
+                    # Parse the document with all TIER elements cut out,
+                    # keeping track of the highest annotation ID of the
+                    # form a<number> in the tiers left unparsed
+                    parts = []
+                    position = 0
+                    last_annotation_number = 0
+                    for tier_id, start, end in tier_index:
+                        parts.append(data[position:start])
+                        position = end
+                        for match in ANNOTATION_ID_PATTERN.finditer(data, start, end):
+                            last_annotation_number = max(last_annotation_number, int(match.group(1)))
+                    parts.append(data[position:])
+
+                    xml_tree = dom.parseString(b"".join(parts))
+
+                else:
+                    xml_tree = dom.parseString(data)
+
+            finally:
+                data.close()
+
+        elan_file = ELANFile.parse_xml(xml_tree, file_name)
+
+        # New annotation IDs must not clash with those of unloaded tiers
+        if lazy_tiers:
+            elan_file.annotation_ids.register_number(last_annotation_number)
+
+        elan_file.tier_index = tier_index
+        elan_file.tier_index_dict = {}
+        for tier_id, start, end in tier_index:
+            elan_file.tier_index_dict[tier_id] = (start, end)
+        elan_file.tier_index_stat = (file_stat.st_size, file_stat.st_mtime_ns)
+        elan_file.tier_index_encoding = xml_tree.encoding
+
+        return elan_file
+
+    # Read the ELAN files contained in a zip archive without extracting
+    # them. Members (by default all .eaf files, compressed or not) are
+    # parsed in a pool of worker processes, each with its own handle on the
+    # archive. Yields (member name, ELANFile object) pairs in the order of
+    # the members. If a function is given, it is applied to every ELANFile
+    # object inside the workers and its result is yielded instead, which
+    # avoids sending whole ELANFile objects between processes.
+    # With processes=1, all members are parsed in the current process.
+    @classmethod
+    def read_elan_archive(cls, archive_name, members=None, processes=None, function=None, chunksize=1):
+
+        if members is None:
+            with zipfile.ZipFile(archive_name) as archive:
+                members = [member for member in archive.namelist() if is_elan_file_name(member)]
+
+        if processes == 1:
+
+            with zipfile.ZipFile(archive_name) as archive:
+                for member in members:
+                    yield _read_archive_member(archive, member, function)
+
+            return
+
+        pool = multiprocessing.Pool(processes, initializer=_open_worker_archive, initargs=(archive_name,))
+
+        try:
+            for result in pool.imap(_read_worker_archive_member, [(member, function) for member in members], chunksize):
+                yield result
+
+        finally:
+            pool.terminate()
+            pool.join()
+
+    # Determine the byte offsets of all TIER elements in the raw
+    # contents of an ELAN file (bytes, bytearray or mmap object) in one
+    # pass of an expat parser, so comments, CDATA sections and any
+    # declared encoding are handled as by the full parse
+    @staticmethod
+    def build_tier_index(data):
+
+        tier_index = []
+        parser = expat.ParserCreate()
+
+        # Depth of the current element and the tier being read
+        state = {"depth": 0, "tier": None, "pending": None}
+
+        # The end of an empty TIER element (<TIER .../>) is only known when
+        # the parser reports the next event
+        def resolve_pending():
+            if state["pending"] is not None:
+                tier_id, start = state["pending"]
+                tier_index.append((tier_id, start, parser.CurrentByteIndex))
+                state["pending"] = None
+
+        def start_element(name, attributes):
+            resolve_pending()
+            state["depth"] += 1
+            if name == "TIER" and state["depth"] == 2:
+                if "TIER_ID" not in attributes:
+                    raise RuntimeError("TIER is missing TIER_ID attribute.")
+                state["tier"] = (attributes["TIER_ID"], parser.CurrentByteIndex)
+
+        def end_element(name):
+            resolve_pending()
+            if name == "TIER" and state["depth"] == 2:
+                tier_id, start = state["tier"]
+                end = parser.CurrentByteIndex
+                if end == start:
+                    state["pending"] = state["tier"]
+                else:
+                    tier_index.append((tier_id, start, data.find(b">", end) + 1))
+                state["tier"] = None
+            state["depth"] -= 1
+
+        def other_event(*arguments):
+            resolve_pending()
+
+        parser.StartElementHandler = start_element
+        parser.EndElementHandler = end_element
+        parser.CharacterDataHandler = other_event
+        parser.CommentHandler = other_event
+        parser.ProcessingInstructionHandler = other_event
+
+        if isinstance(data, mmap.mmap):
+            data.seek(0)
+            parser.ParseFile(data)
+            data.seek(0)
+        else:
+            parser.Parse(bytes(data), True)
+
+        return tier_index
+
+    # Read a sidecar tier index. Returns None if the index does not
+    # exist or if the ELAN file has changed since it was written.
+    @staticmethod
+    def read_tier_index(file_name, tier_index_file_name):
+
+        if not os.path.exists(tier_index_file_name):
+            return None
+
+        with open(tier_index_file_name, "r") as index_file:
+            index = json.load(index_file)
+
+        file_stat = os.stat(file_name)
+        if index.get("size") != file_stat.st_size or index.get("mtime_ns") != file_stat.st_mtime_ns:
+            return None
+
+        return [(tier_id, start, end) for tier_id, start, end in index["tiers"]]
+
+    # Write the tier index of the source file to a sidecar file
+    def write_tier_index(self, tier_index_file_name=None):
+
+        if not self.has_tier_index():
+            raise RuntimeError("ELANFile object has no tier index.")
+
+        if any(start is None for tier_id, start, end in self.tier_index):
+            raise RuntimeError("Tier index refers to tiers that are not part of the indexed file.")
+
+        if tier_index_file_name is None:
+            tier_index_file_name = self.url + ".tierindex"
+
+        index = {
+            "size": self.tier_index_stat[0],
+            "mtime_ns": self.tier_index_stat[1],
+            "tiers": [list(entry) for entry in self.tier_index],
+        }
+
+        with open(tier_index_file_name, "w") as index_file:
+            json.dump(index, index_file)
+
+        return tier_index_file_name
+
+    # Parse a single tier from its byte range in the source file and add
+    # it to the ELANFile object (in its original position among the tiers)
+    def load_tier(self, tier_id):
+
+        # Tier has already been loaded
+        if tier_id in self.tiers_dict:
+            return self.tiers_dict[tier_id]
+
+        if tier_id not in self.tier_index_dict:
+            raise KeyError("No tier with the ID " + str(tier_id) + " in the tier index.")
+
+        # Tiers shared with the ELAN file this file was cloned from are copied
+        if tier_id in self.shared_tiers:
+            tier = self.copy_shared_tier(tier_id)
+
+        else:
+
+            start, end = self.tier_index_dict[tier_id]
+
+            with open(self.url, "rb") as input_file:
+
+                # Make sure that the offsets are still valid
+                file_stat = os.fstat(input_file.fileno())
+                if (file_stat.st_size, file_stat.st_mtime_ns) != self.tier_index_stat:
+                    raise RuntimeError("ELAN file " + self.url + " has changed since it was indexed.")
+
+                input_file.seek(start)
+                fragment = input_file.read(end - start)
+
+            # Fragments are parsed with the encoding declared by the file
+            if self.tier_index_encoding is not None:
+                declaration = "<?xml version=\"1.0\" encoding=\"" + self.tier_index_encoding + "\"?>\n"
+                fragment = declaration.encode(self.tier_index_encoding) + fragment
+
+            tier = ELANTier.from_xml(dom.parseString(fragment).documentElement, self)
+
+        # Keep the tiers in document order
+        positions = {}
+        for position, (indexed_tier_id, indexed_start, indexed_end) in enumerate(self.tier_index):
+            positions[indexed_tier_id] = position
+
+        insert_at = len(self.tiers)
+        for position, other_tier in enumerate(self.tiers):
+            if positions.get(other_tier.get_tier_id(), len(positions)) > positions[tier_id]:
+                insert_at = position
+                break
+
+        self.tiers.insert(insert_at, tier)
+        self.tiers_dict[tier_id] = tier
+
+        for annotation in tier:
+            self.annotations_dict[annotation.get_annotation_id()] = annotation
+            self.annotation_ids.register(annotation.get_annotation_id())
+
+        self.count_time_slot_references(tier.annotations, 1)
+
+        # Invalidate caches, but leave the parts shared with clones alone:
+        # loading a tier does not change the file
+        self.revision += 1
+
+        return tier
+
+    # Load all tiers that have not been parsed yet
+    def load_all_tiers(self):
+
+        self.copy_shared_time_order()
+
+        for tier_id, start, end in self.tier_index:
+            if tier_id not in self.tiers_dict:
+                self.load_tier(tier_id)
+
+    # Load the tiers still shared with the ELAN file this file was cloned from
+    def load_shared_tiers(self):
+        for tier_id in list(self.shared_tiers):
+            self.load_tier(tier_id)
+
+    # Return all tiers in document order for reading only. Tiers that have
+    # not been parsed yet are loaded, but tiers still shared with the ELAN
+    # file this file was cloned from are returned as they are instead of
+    # being copied, so the tiers and their annotations must not be changed.
+    def get_tiers_to_read(self):
+
+        for tier_id, start, end in self.tier_index:
+            if tier_id not in self.tiers_dict and tier_id not in self.shared_tiers:
+                self.load_tier(tier_id)
+
+        if not self.shared_tiers:
+            return self.tiers
+
+        positions = {}
+        for position, (tier_id, start, end) in enumerate(self.tier_index):
+            positions[tier_id] = position
+
+        tiers = self.tiers + list(self.shared_tiers.values())
+        tiers.sort(key=lambda tier: positions.get(tier.get_tier_id(), len(positions)))
+
+        return tiers
+
+    # Return a tier (given as object or as tier ID) for reading only
+    # (see get_tiers_to_read)
+    def resolve_tier_to_read(self, tier):
+
+        if isinstance(tier, ELANTier):
+            return tier
+
+        if tier in self.shared_tiers:
+            return self.shared_tiers[tier]
+
+        if tier in self.tiers_dict:
+            return self.tiers_dict[tier]
+        elif tier in self.tier_index_dict:
+            return self.load_tier(tier)
+        else:
+            raise KeyError("Unknown tier ID: " + str(tier))
+
+    def get_tier_index(self):
+        return self.tier_index
+
+    def get_tier_offsets(self, tier_id):
+        if tier_id in self.tier_index_dict:
+            return self.tier_index_dict[tier_id]
+        else:
+            return None
+
+    def has_tier_index(self):
+        if self.tier_index_stat is not None:
+            return True
+        else:
+            return False
+
+    def is_tier_loaded(self, tier_id):
+        if tier_id in self.tiers_dict:
+            return True
+        else:
+            return False
+
+    # Method to convert an xml tree into the ELANFile object and its components
+    @classmethod
+    def parse_xml(cls, xml_tree, file_name):
+        
+        # TODO: (Re)initialize values in order to make sure
+        # that no contamination between different ELANFile objects occurs
+        
+        # Create a new ELANFile object
+        elan_file = cls()
+        elan_file.xml_tree = xml_tree
+        elan_file.url = file_name
+        
+        # Basic metadata
+        elan_file.author = None
+        elan_file.date = None
+        elan_file.format = None
+        elan_file.version = None
+
+        # Time units used (defaults to milliseconds)
+        elan_file.time_units = None
+    
+        # List of linked media files
+        elan_file.media_files = []
+    
+        # List of other linked files
+        elan_file.linked_files = []
+    
+        # Key-value pairs
+        elan_file.properties = {}
+    
+        # Time order (containing time slots as anchors for annotations)
+        elan_file.time_order = None
+    
+        # List of tiers
+        elan_file.tiers = []
+    
+        # List of linguistic types
+        elan_file.linguistic_types = []
+    
+        # List of constraints
+        elan_file.constraints = []
+    
+        # List of controlled vocabularies
+        elan_file.controlled_vocabularies = []
+    
+        # Locales
+        elan_file.locales = []
+    
+        # List of references to lexicons
+        elan_file.lexicon_references = []
+    
+        # List of external references
+        elan_file.external_references = []
+
+        # Dictionary views on relevant parts of the ELAN document
+        # Dictionary view on all media files
+        elan_file.media_files_dict = {}
+
+        # Dictionary view on all linked files
+        elan_file.linked_files_dict = {}
+    
+        # Dictionary view on all time slots
+        elan_file.time_slots_dict = {}
+    
+        # Dictionary view on all tiers
+        elan_file.tiers_dict = {}
+    
+        # Dictionary view on all annotations contained in all tiers
+        elan_file.annotations_dict = {}
+    
+        # Dictionary view on all linguistic types
+        elan_file.linguistic_types_dict = {}
+    
+        # Dictionary view on all constraints
+        elan_file.constraints_dict = {}
+    
+        # Dictionary view on all controlled vocabularies
+        elan_file.controlled_vocabularies_dict = {}
+    
+        # Dictionary view on all external references
+        elan_file.external_references_dict = {}
+
+        # Dictionary view on all lexicon references
+        elan_file.lexicon_references_dict = {}
+
+        # Only look at the surrounding ANNOTATION_DOCUMENT element        
+        xml_tree = xml_tree.firstChild
+        
+        # Make sure the document node has the right type
+        if xml_tree.nodeName == "ANNOTATION_DOCUMENT":
+            
+            # Extract meta data from outer ANNOTATION_DOCUMENT node
+            # Extract information about the author
+            if xml_tree.hasAttribute("AUTHOR"):
+                elan_file.author = xml_tree.getAttribute("AUTHOR")
+            
+            # Extract information about the date
+            if xml_tree.hasAttribute("DATE"):
+                elan_file.date = xml_tree.getAttribute("DATE")
+
+            # Extract information about the format
+            if xml_tree.hasAttribute("FORMAT"):
+                elan_file.format = xml_tree.getAttribute("FORMAT")
+
+            # Extract information about the version
+            if xml_tree.hasAttribute("VERSION"):
+                elan_file.version = xml_tree.getAttribute("VERSION")
+
+            # Process child nodes of document node
+            for child_node in xml_tree.childNodes:
+                
+                # Skip non-element nodes
+                if child_node.nodeType != child_node.ELEMENT_NODE:
+                    continue
+                
+                # Determine type of node
+                if child_node.tagName == "HEADER":
+                    
+                    # Extract information from the header
+                    # Deprecated MEDIA_FILE attribute
+                    if child_node.hasAttribute("MEDIA_FILE"):
+                        elan_file.media_file = child_node.getAttribute("MEDIA_FILE")
+
+                    # Largely redundant TIME_UNITS attribute (should always be milliseconds)
+                    if child_node.hasAttribute("TIME_UNITS"):
+                        elan_file.media_file = child_node.getAttribute("TIME_UNITS")
+                    
+                    # Assume default value
+                    else:
+                        elan_file.time_units = "milliseconds"
+                    
+                    # Process parts of the header
+                    for header_child_node in child_node.childNodes:
+                        
+                        # Skip non-element nodes
+                        if header_child_node.nodeType != header_child_node.ELEMENT_NODE:
+                            continue
+                        
+                        if header_child_node.tagName == "MEDIA_DESCRIPTOR":
+                            
+                            # Construct a new ELANMediaDescriptor object
+                            media_descriptor = ELANMediaDescriptor.from_xml(header_child_node)
+                            
+                            # Append the ELANMediaDescriptor object to the list of media files
+                            elan_file.media_files.append(media_descriptor)
+                            
+                            # Also add it to the hash view on media files
+                            elan_file.media_files_dict[media_descriptor.get_media_url()] = media_descriptor
+                        
+                        elif header_child_node.tagName == "LINKED_FILE_DESCRIPTOR":
+                            
+                            # Construct a new ELANLinkedFileDescriptor
+                            linked_file_descriptor = ELANLinkedFileDescriptor.from_xml(header_child_node)
+                            
+                            # Append the ELANLinkedFileDescriptor object to the list of linked files
+                            elan_file.linked_files.append(linked_file_descriptor)
+                            
+                            # Also add it to the hash view on linked files
+                            elan_file.linked_files_dict[linked_file_descriptor.get_link_url()] = linked_file_descriptor
+                        
+                        elif header_child_node.tagName == "PROPERTY":
+                            
+                            # Name of the property is in the NAME attribute
+                            if header_child_node.hasAttribute("NAME"):
+                                name = header_child_node.getAttribute("NAME")
+                            else:
+                                raise RuntimeError("PROPERTY element is missing NAME attribute.")
+
+                            # Get the value of the property
+                            if header_child_node.hasChildNodes():
+                                
+                                if header_child_node.firstChild.nodeType == header_child_node.TEXT_NODE:
+
+                                    value = header_child_node.firstChild.data
+
+                                else:
+                                    
+                                    raise RuntimeError("PROPERTY is empty.")
+
+                            else:
+
+                                raise RuntimeError("PROPERTY is empty.")
+                            
+                            # Add property to properties hash
+                            elan_file.properties[name] = value
+                            
+                        else:
+                            raise RuntimeError("Unknown ELAN header entry: " + header_child_node.tagName)
+                
+                elif child_node.tagName == "TIME_ORDER":
+                    
+                    # Construct a new time order from the xml_node
+                    elan_file.time_order = ELANTimeOrder.from_xml(child_node, elan_file)
+                    
+                    # Also construct a dictionary view on the time slots
+                    # in the time order
+                    for time_slot in elan_file.time_order:
+                        
+                        # Add current time slot to dictionary of time slots
+                        elan_file.time_slots_dict[time_slot.get_id()] = time_slot                    
+                
+                elif child_node.tagName == "TIER":
+                    
+                    # Construct a new tier from the xml node
+                    tier = ELANTier.from_xml(child_node, elan_file)
+                    
+                    # Add tier to the list of tiers
+                    elan_file.tiers.append(tier)
+                    
+                    # Add tier to the dictionary view on tiers
+                    elan_file.tiers_dict[tier.get_tier_id()] = tier
+                    
+                    # Go through all annotations on the tier
+                    # and add them to the dictionary view on annotations
+                    for annotation in tier:
+                        
+                        # Add annotation to the dictionary view on annotations
+                        elan_file.annotations_dict[annotation.get_annotation_id()] = annotation
+                
+                elif child_node.tagName == "LINGUISTIC_TYPE":
+                    
+                    # Construct a new linguistic type from the xml node
+                    linguistic_type = ELANLinguisticType.from_xml(child_node, elan_file)
+                    
+                    # Add linguistic type to the list of linguistic types
+                    elan_file.linguistic_types.append(linguistic_type)
+                    
+                    # Add linguistic type to the dictionary view on linguistic types
+                    elan_file.linguistic_types_dict[linguistic_type.get_linguistic_type_id()] = linguistic_type
+                                    
+                elif child_node.tagName == "CONSTRAINT":
+                    
+                    # Construct a new constraint from the xml node
+                    constraint = ELANConstraint.from_xml(child_node)
+                    
+                    # Add constraint to the list of constraints
+                    elan_file.constraints.append(constraint)
+                    
+                    # Add constraint to the dictionary view on constraints
+                    elan_file.constraints_dict[constraint.get_stereotype()] = constraint
+                
+                elif child_node.tagName == "CONTROLLED_VOCABULARY":
+                    
+                    # Construct a new controlled vocabulary
+                    controlled_vocabulary = ELANControlledVocabulary.from_xml(child_node)
+                    
+                    # Add controlled vocabulary to the list of controlled vocabularies
+                    elan_file.controlled_vocabularies.append(controlled_vocabulary)
+                    
+                    # Add controlled vocabulary to the dictionary view on controlled vocabularies
+                    elan_file.controlled_vocabularies_dict[controlled_vocabulary.get_cv_id()] = controlled_vocabulary
+
+                elif child_node.tagName == "EXTERNAL_REF":
+                    
+                    # Construct a new external reference from xml node
+                    external_ref = ELANExternalReference.from_xml(child_node)
+                    
+                    # Add external reference to the list of external references
+                    elan_file.external_references.append(external_ref)
+                    
+                    # Add external reference to the dictionary view on external references
+                    elan_file.external_references_dict[external_ref.get_id()] = external_ref
+                
+                elif child_node.tagName == "LOCALE":
+                    
+                    # Construct a new locale from the xml node
+                    locale = ELANLocale.from_xml(child_node)
+                    
+                    # Add the locale to the list of locales
+                    elan_file.locales.append(locale)
+                
+                elif child_node.tagName == "LEXICON_REF":
+                    
+                    # Construct a new lexicon reference
+                    lexicon_ref = ELANLexiconReference.from_xml(child_node)
+                    
+                    # Add lexicon reference to the list of lexicon references
+                    elan_file.lexicon_references.append(lexicon_ref)
+                    
+                    # Add lexicon reference to the dictionary view on lexicon references
+                    elan_file.lexicon_references_dict[lexicon_ref.get_id()] = lexicon_ref
+                
+                else:
+                    raise RuntimeError("Unknown XML node: " + child_node.tagName)
+        
+        else:
+            raise RuntimeError("XML document does not have the correct type ANNOTATION_DOCUMENT.")
+
+        # Set up the allocators of new IDs
+        elan_file.initialise_id_allocators()
+
+        # Return the created ELANFile object
+        return elan_file
+
+#    # Method to convert an xml tree into the ELANFile object and its components
+#    def parse_xml(self, xml_tree):
+#        
+#        # (Re)initialize values in order to make sure
+#        # that no contamination between different ELANFile objects occurs
+#        
+#        # Basic metadata
+#        self.author = None
+#        self.date = None
+#        self.format = None
+#        self.version = None
+#
+#        # Time units used (defaults to milliseconds)
+#        self.time_units = None
+#    
+#        # List of linked media files
+#        self.media_files = []
+#    
+#        # List of other linked files
+#        self.linked_files = []
+#    
+#        # Key-value pairs
+#        self.properties = {}
+#    
+#        # Time order (containing time slots as anchors for annotations)
+#        self.time_order = None
+#    
+#        # List of tiers
+#        self.tiers = []
+#    
+#        # List of linguistic types
+#        self.linguistic_types = []
+#    
+#        # List of constraints
+#        self.constraints = []
+#    
+#        # List of controlled vocabularies
+#        self.controlled_vocabularies = []
+#    
+#        # Locales
+#        self.locales = []
+#    
+#        # List of references to lexicons
+#        self.lexicon_references = []
+#    
+#        # List of external references
+#        self.external_references = []
+#
+#        # Dictionary views on relevant parts of the ELAN document
+#        # Dictionary view on all media files
+#        self.media_files_dict = {}
+#
+#        # Dictionary view on all linked files
+#        self.linked_files_dict = {}
+#    
+#        # Dictionary view on all time slots
+#        self.time_slots_dict = {}
+#    
+#        # Dictionary view on all tiers
+#        self.tiers_dict = {}
+#    
+#        # Dictionary view on all annotations contained in all tiers
+#        self.annotations_dict = {}
+#    
+#        # Dictionary view on all linguistic types
+#        self.linguistic_types_dict = {}
+#    
+#        # Dictionary view on all constraints
+#        self.constraints_dict = {}
+#    
+#        # Dictionary view on all controlled vocabularies
+#        self.controlled_vocabularies_dict = {}
+#    
+#        # Dictionary view on all external references
+#        self.external_references_dict = {}
+#
+#        # Dictionary view on all lexicon references
+#        self.lexicon_references_dict = {}
+#
+#        # Only look at the surrounding ANNOTATION_DOCUMENT element        
+#        xml_tree = xml_tree.firstChild
+#        
+#        # Make sure the document node has the right type
+#        if xml_tree.nodeName == "ANNOTATION_DOCUMENT":
+#            
+#            # Extract meta data from outer ANNOTATION_DOCUMENT node
+#            # Extract information about the author
+#            if xml_tree.hasAttribute("AUTHOR"):
+#                self.author = xml_tree.getAttribute("AUTHOR")
+#            
+#            # Extract information about the date
+#            if xml_tree.hasAttribute("DATE"):
+#                self.date = xml_tree.getAttribute("DATE")
+#
+#            # Extract information about the format
+#            if xml_tree.hasAttribute("FORMAT"):
+#                self.format = xml_tree.getAttribute("FORMAT")
+#
+#            # Extract information about the version
+#            if xml_tree.hasAttribute("VERSION"):
+#                self.version = xml_tree.getAttribute("VERSION")
+#
+#            # Process child nodes of document node
+#            for child_node in xml_tree.childNodes:
+#                
+#                # Skip non-element nodes
+#                if child_node.nodeType != child_node.ELEMENT_NODE:
+#                    continue
+#                
+#                # Determine type of node
+#                if child_node.tagName == "HEADER":
+#                    
+#                    # Extract information from the header
+#                    # Deprecated MEDIA_FILE attribute
 #                    if child_node.hasAttribute("MEDIA_FILE"):
 #                        self.media_file = child_node.getAttribute("MEDIA_FILE")
 #
@@ -3219,477 +5662,2007 @@ class ELANFile:
 #        else:
 #            raise RuntimeError("XML document does not have the correct type ANNOTATION_DOCUMENT.")
 
-    # Method to produce an xml description from an ELANFile object
-    def to_xml(self, indent="    "):
+    # Method to produce an xml description from an ELANFile object
+    # piece by piece, so that large files can be written as a stream
+    def iter_xml(self, indent="    "):
+
+        # Make sure that lazily indexed tiers are part of the output
+        # (without copying tiers shared with a clone source)
+        tiers = self.get_tiers_to_read()
+
+        # Construct a new xml node
+        node = ""
+        
+        # Add XML header
+        node += "<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n"
+        
+        # Add root element
+        node += "<ANNOTATION_DOCUMENT"
+        
+        # Add DATE
+        node += " DATE=\"" + escape(self.get_date()) + "\""
+        
+        # Add AUTHOR
+        node += " AUTHOR=\"" + escape(self.get_author()) + "\""
+        
+        # Add VERSION
+        node += " VERSION=\"" + escape(self.get_version()) + "\""
+        
+        # Add FORMAT attribute
+        if self.has_format():
+            node += " FORMAT=\"" + escape(self.get_format()) + "\""
+            
+        # Assume default
+        else:
+            node += " FORMAT=\"2.7\""
+
+        # Close ANNOTATION_DOCUMENT start tag
+        node += ">\n"
+        
+        # Add HEADER node
+        node += indent + "<HEADER"
+
+        # Output deprecated MEDIA_FILE attribute with empty value
+        node += " MEDIA_FILE=\"\""
+        
+        # Output TIME_UNITS attribute if there is one
+        if self.has_time_units():
+            node += " TIME_UNITS=\"" + escape(self.get_time_units()) + "\""
+        
+        # Output default
+        else:
+            node += " TIME_UNITS=\"milliseconds\""
+        
+        # Close HEADER start tag
+        node += ">\n"
+        
+        # Add media descriptors
+        for media_descriptor in self.get_media_files():
+            
+            node += media_descriptor.to_xml(indent=indent)
+        
+        # Add linked file descriptors
+        for linked_file_descriptor in self.get_linked_files():
+            
+            node += linked_file_descriptor.to_xml(indent=indent)
+        
+        # Add properties
+        for prop in self.properties:
+            
+            # Add NAME
+            node += 2 * indent + "<PROPERTY NAME=\"" + escape(prop) + "\">"
+
+            # Add value
+            node += escape(self.get_property(prop))
+            
+            # Add PROPERTY end tag
+            node += "</PROPERTY>\n"
+        
+        # Add HEADER end tag
+        node += indent + "</HEADER>\n"
+        
+        yield node
+
+        # Renumber the time slots if they have been inserted in time position
+        time_slot_ids = self.get_time_order_to_read().get_serialised_time_slot_ids()
+
+        # ADD TIME_ORDER
+        yield self.get_time_order_to_read().to_xml(indent=indent, time_slot_ids=time_slot_ids)
+        
+        # Add tiers
+        for tier in tiers:
+            
+            yield tier.to_xml(indent=indent, time_slot_ids=time_slot_ids)
+        
+        # Construct the remaining parts of the document
+        node = ""
+
+        # Add linguistic types
+        for linguistic_type in self.get_linguistic_types():
+            
+            node += linguistic_type.to_xml(indent=indent)
+
+        # Add locales
+        for locale in self.get_locales():
+            
+            node += locale.to_xml(indent=indent)
+        
+        # Add constraints
+        for constraint in self.get_constraints():
+            
+            node += constraint.to_xml(indent=indent)
+
+        # Add controlled vocabularies
+        for controlled_vocabulary in self.controlled_vocabularies:
+            
+            node += controlled_vocabulary.to_xml(indent=indent)
+
+        # Add lexicon references
+        for lexicon_reference in self.get_lexicon_references():
+            
+            node += lexicon_reference.to_xml(indent=indent)
+        
+        # Add external references
+        for external_reference in self.get_external_references():
+            
+            node += external_reference.to_xml(indent=indent)
+        
+        # Close ANNOTATION_DOCUMENT node
+        node += "</ANNOTATION_DOCUMENT>\n"
+
+        yield node
+
+    # Write the ELANFile object to a file name or a binary file object.
+    # By default, the compression format is inferred from the extension
+    # of the file name; use compression=None to write plain XML. As with
+    # to_xml, the XML is checked to be well-formed while it is written.
+    def write_elan_file(self, file_name, indent="    ", compression="infer", compression_level=None):
+
+        # The XML is written as UTF-8 bytes, which text file objects reject
+        if not isinstance(file_name, str) and hasattr(file_name, "encoding"):
+            raise TypeError("ELAN files can only be written to binary file objects.")
+
+        if compression == "infer":
+            if isinstance(file_name, str):
+                compression = COMPRESSION_EXTENSIONS.get(os.path.splitext(file_name)[1].lower())
+            else:
+                compression = None
+
+        if compression is not None:
+            output_stream = open_compressed(file_name, compression, "wb", compression_level)
+        elif isinstance(file_name, str):
+            output_stream = open(file_name, "wb")
+        else:
+            output_stream = None
+
+        parser = expat.ParserCreate()
+
+        try:
+
+            for part in self.iter_xml(indent=indent):
+
+                data = part.encode("utf-8")
+
+                # Make sure that the xml can be parsed
+                parser.Parse(data, False)
+                
+                if output_stream is not None:
+                    output_stream.write(data)
+                else:
+                    file_name.write(data)
+
+            parser.Parse(b"", True)
+
+        except expat.ExpatError:
+
+            raise RuntimeError("Could not produce well-formed XML from ELANFile object.")
+
+        finally:
+
+            if output_stream is not None:
+                output_stream.close()
+
+    # Method to produce an xml description from an ELANFile object
+    def to_xml(self, indent="    "):
+
+        node = "".join(self.iter_xml(indent=indent))
+        
+        # Make sure that the xml can be parsed
+        try:
+
+            dom.parseString(node)
+            
+        except:
+
+            raise RuntimeError("Could not produce well-formed XML from ELANFile object.")
+        
+        # Return the string representation of the XML node
+        return node
+
+    # Getter and setter methods
+    def get_url(self):
+        return self.url
+    
+    def get_xml_tree(self):
+        return self.xml_tree
+    
+    def get_author(self):
+        return self.author
+    
+    def get_date(self):
+        return self.date
+    
+    def get_format(self):
+        return self.format
+    
+    def get_version(self):
+        return self.version
+    
+    # Warning: deprecated attribute
+    def get_media_file(self):
+        return self.media_file
+    
+    def get_time_units(self):
+        return self.time_units
+    
+    def get_media_files(self):
+        return self.media_files
+    
+    def get_media_files_dict(self):
+        return self.media_files_dict
+    
+    def get_linked_files(self):
+        return self.linked_files
+    
+    def get_linked_files_dict(self):
+        return self.linked_files_dict
+    
+    def get_properties(self):
+        return self.properties
+    
+    def get_property(self, key):
+        if key in self.properties:
+            return self.properties[key]
+        else:
+            return None
+    
+    def get_time_order(self):
+        self.copy_shared_time_order()
+        return self.time_order
+    
+    def get_tiers(self):
+        if self.shared_tiers:
+            self.load_shared_tiers()
+        return self.tiers
+    
+    def get_linguistic_types(self):
+        return self.linguistic_types
+    
+    def get_linguistic_types_dict(self):
+        return self.linguistic_types_dict
+    
+    def get_constraints(self):
+        return self.constraints
+    
+    def get_constraints_dict(self):
+        return self.constraints_dict
+    
+    def get_controlled_vocabularies(self):
+        self.unshare_controlled_vocabularies()
+        return self.controlled_vocabularies
+
+    def get_controlled_vocabularies_dict(self):
+        self.unshare_controlled_vocabularies()
+        return self.controlled_vocabularies_dict
+    
+    def get_locales(self):
+        return self.locales
+    
+    def get_lexicon_references(self):
+        return self.lexicon_references
+    
+    def get_lexicon_references_dict(self):
+        return self.lexicon_references_dict
+    
+    def get_external_references(self):
+        return self.external_references
+    
+    def get_external_references_dict(self):
+        return self.external_references_dict
+    
+    def get_time_slots_dict(self):
+        self.copy_shared_time_order()
+        return self.time_slots_dict
+
+    # The time order and time slots for reading only: unlike
+    # get_time_order and get_time_slots_dict, these do not copy a time
+    # order shared with the ELAN file this file was cloned from, so the
+    # time slots must not be changed
+    def get_time_order_to_read(self):
+        return self.time_order
+
+    def get_time_slots_dict_to_read(self):
+        return self.time_slots_dict
+    
+    def get_annotations_dict(self):
+        if self.shared_tiers:
+            self.load_shared_tiers()
+        return self.annotations_dict
+    
+    # TODO: Implement type checking for setter methods
+    def set_url(self, url):
+        self.url = url
+    
+    def set_xml_tree(self, xml_tree):
+        self.xml_tree = xml_tree
+    
+    def set_author(self, author):
+        self.author = author
+        
+    def set_date(self, date):
+        self.date = date
+
+    def set_format(self, elan_format):
+        self.format = elan_format
+    
+    def set_version(self, version):
+        self.version = version
+    
+    # Warning: Deprecated attribute
+    def set_media_file(self, media_file):
+        self.media_file = media_file
+    
+    # Warning: Should always be milliseconds
+    def set_time_units(self, time_units):
+        self.time_units = time_units
+    
+    def set_media_files(self, media_files):
+        self.media_files = media_files
+    
+    def set_media_files_dict(self, media_files_dict):
+        self.media_files_dict = media_files_dict
+    
+    def set_linked_files(self, linked_files):
+        self.linked_files = linked_files
+    
+    def set_linked_files_dict(self, linked_files_dict):
+        self.linked_files_dict = linked_files_dict
+    
+    def set_properties(self, properties):
+        self.properties = properties
+    
+    def set_property(self, prop, value):
+        self.properties[prop] = value
+    
+    def set_time_order(self, time_order):
+        self.time_order = time_order
+        self.mark_modified()
+    
+    def set_tiers(self, tiers):
+        self.tiers = tiers
+        self.time_slot_references = None
+        self.mark_modified()
+    
+    def set_tiers_dict(self, tiers_dict):
+        self.tiers_dict = tiers_dict
+    
+    def set_linguistic_types(self, linguistic_types):
+        self.linguistic_types = linguistic_types
+    
+    def set_linguistic_types_dict(self, linguistic_types_dict):
+        self.linguistic_types_dict = linguistic_types_dict
+    
+    def set_constraints(self, constraints):
+        self.constraints = constraints
+    
+    def set_constraints_dict(self, constraints_dict):
+        self.constraints_dict = constraints_dict
+    
+    def set_controlled_vocabularies(self, controlled_vocabularies):
+        self.unshare_controlled_vocabularies()
+        self.controlled_vocabularies = controlled_vocabularies
+    
+    def set_controlled_vocabularies_dict(self, controlled_vocabularies_dict):
+        self.unshare_controlled_vocabularies()
+        self.controlled_vocabularies_dict = controlled_vocabularies_dict
+    
+    def set_locales(self, locales):
+        self.locales = locales
+    
+    def set_lexicon_references(self, lexicon_references):
+        self.lexicon_references = lexicon_references
+    
+    def set_lexicon_references_dict(self, lexicon_references_dict):
+        self.lexicon_references_dict = lexicon_references_dict
+    
+    def set_external_references(self, external_references):
+        self.external_references
+    
+    def set_external_references_dict(self, external_references_dict):
+        self.external_references_dict = external_references_dict
+
+    def set_time_slots_dict(self, time_slots_dict):
+        self.time_slots_dict = time_slots_dict
+    
+    def set_annotations_dict(self, annotations_dict):
+        self.annotations_dict = annotations_dict
+        self.time_slot_references = None
+    
+    def has_url(self):
+        if self.URL is not None:
+            return True
+        else:
+            return False
+    
+    def has_xml_tree(self):
+        if self.xml_tree is not None:
+            return True
+        else:
+            return False
 
-        # Construct a new xml node
-        node = ""
-        
-        # Add XML header
-        node += "<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n"
-        
-        # Add root element
-        node += "<ANNOTATION_DOCUMENT"
-        
-        # Add DATE
-        node += " DATE=\"" + escape(self.get_date()) + "\""
-        
-        # Add AUTHOR
-        node += " AUTHOR=\"" + escape(self.get_author()) + "\""
-        
-        # Add VERSION
-        node += " VERSION=\"" + escape(self.get_version()) + "\""
-        
-        # Add FORMAT attribute
-        if self.has_format():
-            node += " FORMAT=\"" + escape(self.get_format()) + "\""
-            
-        # Assume default
+    def has_author(self):
+        if self.author is not None:
+            return True
         else:
-            node += " FORMAT=\"2.7\""
+            return False
 
-        # Close ANNOTATION_DOCUMENT start tag
-        node += ">\n"
-        
-        # Add HEADER node
-        node += indent + "<HEADER"
+    def has_date(self):
+        if self.date is not None:
+            return True
+        else:
+            return False
 
-        # Output deprecated MEDIA_FILE attribute with empty value
-        node += " MEDIA_FILE=\"\""
-        
-        # Output TIME_UNITS attribute if there is one
-        if self.has_time_units():
-            node += " TIME_UNITS=\"" + escape(self.get_time_units()) + "\""
-        
-        # Output default
+    def has_format(self):
+        if self.format is not None:
+            return True
         else:
-            node += " TIME_UNITS=\"milliseconds\""
-        
-        # Close HEADER start tag
-        node += ">\n"
+            return False
+
+    def has_version(self):
+        if self.version is not None:
+            return True
+        else:
+            return False
+    
+    def has_media_file(self):
+        if self.media_file is not None:
+            return True
+        else:
+            return False
+    
+    def has_time_units(self):
+        if self.time_units is not None:
+            return True
+        else:
+            return False
+
+    def has_media_files(self):
+        if len(self.media_files) > 0:
+            return True
+        else:
+            return False
+
+    def has_linked_files(self):
+        if len(self.linked_files) > 0:
+            return True
+        else:
+            return False
+
+    def has_properties(self):
+        if len(self.properties) > 0:
+            return True
+        else:
+            return False
+
+    def has_time_order(self):
+        if self.time_order is not None:
+            return True
+        else:
+            return False
+    
+    def has_tiers(self):
+        if len(self.tiers) > 0 or len(self.shared_tiers) > 0:
+            return True
+        else:
+            return False
+   
+    def has_linguistic_types(self):
+        if len(self.linguistic_types) > 0:
+            return True
+        else:
+            return False
+    
+    def has_constraints(self):
+        if len(self.constraints) > 0:
+            return True
+        else:
+            return False
+    
+    def has_controlled_vocabularies(self):
+        if len(self.controlled_vocabularies) > 0:
+            return True
+        else:
+            return False
+    
+    def has_locales(self):
+        if len(self.locales) > 0:
+            return True
+        else:
+            return False
         
-        # Add media descriptors
-        for media_descriptor in self.get_media_files():
-            
-            node += media_descriptor.to_xml(indent=indent)
+    def has_lexicon_references(self):
+        if len(self.lexicon_references) > 0:
+            return True
+        else:
+            return False
+
+    def has_external_references(self):
+        if len(self.external_references) > 0:
+            return True
+        else:
+            return False
+
+    def has_time_slots(self):
+        if len(self.time_slots_dict) > 0:
+            return True
+        else:
+            return False
+
+    def has_annotations(self):
+        if len(self.annotations_dict) > 0 or any(len(tier.annotations) > 0 for tier in self.shared_tiers.values()):
+            return True
+        else:
+            return False
+
+    # Register a modification of the ELAN file or one of its parts.
+    # Caches computed from the file are invalidated by this.
+    def mark_modified(self):
+        self.release_clones()
+        self.revision += 1
+
+    def get_revision(self):
+        return self.revision
+
+    # Return a transaction for use in a with statement (see ELANTransaction)
+    def transaction(self):
+        return ELANTransaction(self)
+
+    def in_transaction(self):
+        if self.active_transaction is not None:
+            return True
+        else:
+            return False
+
+    # Start recording changes in a journal (see ELANJournal), optionally
+    # appending them to a log file, and return the journal
+    def start_journal(self, log_file_name=None):
+
+        if self.journal is not None:
+            raise RuntimeError("ELAN file already has a journal.")
+
+        self.journal = ELANJournal(self, log_file_name)
+        return self.journal
+
+    # Replay a journal log onto the file and continue recording changes in
+    # the returned journal (appending them to log_file_name, if given)
+    def replay_journal(self, replay_file_name, log_file_name=None):
+
+        if self.journal is not None:
+            raise RuntimeError("ELAN file already has a journal.")
+
+        self.journal = ELANJournal.replay(self, replay_file_name, log_file_name)
+        return self.journal
+
+    # Stop recording changes
+    def stop_journal(self):
+
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+    def get_journal(self):
+        return self.journal
+
+    def has_journal(self):
+        if self.journal is not None:
+            return True
+        else:
+            return False
+
+    # Return a context manager collecting the changes made within it into
+    # one step of the journal (if any)
+    def journal_group(self):
+        return ELANJournalGroup(self.journal)
+
+    # Undo and redo the last step recorded in the journal
+    def undo(self):
+        if self.journal is None:
+            raise RuntimeError("ELAN file has no journal.")
+        return self.journal.undo()
+
+    def redo(self):
+        if self.journal is None:
+            raise RuntimeError("ELAN file has no journal.")
+        return self.journal.redo()
+
+    # Set up the ID allocators from the IDs in use (done once by parse_xml;
+    # files built otherwise are set up on first use)
+    def initialise_id_allocators(self):
+
+        last_used = self.get_property("lastUsedAnnotationId")
+        if last_used is not None and last_used.isdigit():
+            last_used = int(last_used)
+        else:
+            last_used = None
+
+        self.annotation_ids.initialise(list(self.annotations_dict), last_used)
+        self.time_order.time_slot_ids.initialise(list(self.time_order.time_slots_dict))
+
+    # Return count unused annotation IDs of the form a<number> and record
+    # the last one in the lastUsedAnnotationId property. The IDs are
+    # reserved in one step, also when called from several threads.
+    def allocate_annotation_ids(self, count):
+
+        if not self.annotation_ids.is_initialised():
+            self.initialise_id_allocators()
+
+        with self.annotation_ids.lock:
+            numbers = self.annotation_ids.allocate_range(count)
+            last_used = self.get_property("lastUsedAnnotationId")
+            if last_used is None or not last_used.isdigit() or int(last_used) < self.annotation_ids.get_last_number():
+                self.set_property("lastUsedAnnotationId", str(self.annotation_ids.get_last_number()))
+
+        return ["a" + str(number) for number in numbers]
+
+    # Return an unused tier ID: base itself or base with a numeric suffix
+    # (base-2, base-3, ...), by default tier<number>. The ID is reserved, so
+    # several threads building tiers at the same time get different IDs.
+    def allocate_tier_id(self, base=None):
+        return self.tier_ids.allocate_name(set(self.tiers_dict) | set(self.tier_index_dict), base)
+
+    def get_annotation_id_allocator(self):
+        return self.annotation_ids
+
+    def add_media_file(self, media_file):
         
-        # Add linked file descriptors
-        for linked_file_descriptor in self.get_linked_files():
-            
-            node += linked_file_descriptor.to_xml(indent=indent)
+        # Check type
+        if isinstance(media_file, ELANMediaDescriptor):
+            self.media_files.append(media_file)
+            self.media_files_dict[media_file.get_media_url()] = media_file
         
-        # Add properties
-        for prop in self.properties:
-            
-            # Add NAME
-            node += 2 * indent + "<PROPERTY NAME=\"" + escape(prop) + "\">"
+        else:
+            raise TypeError("Media file to be added has to be of type ELANMediaDescriptor.")
 
-            # Add value
-            node += escape(self.get_property(prop))
-            
-            # Add PROPERTY end tag
-            node += "</PROPERTY>\n"
-        
-        # Add HEADER end tag
-        node += indent + "</HEADER>\n"
+    def add_linked_file(self, linked_file):
         
-        # ADD TIME_ORDER
-        node += self.get_time_order().to_xml(indent=indent)
+        # Check type
+        if isinstance(linked_file, ELANLinkedFileDescriptor):
+            self.linked_files.append(linked_file)
+            self.linked_files_dict[linked_file.get_link_url()] = linked_file
         
-        # Add tiers
-        for tier in self.get_tiers():
-            
-            node += tier.to_xml(indent=indent)
+        else:
+            raise TypeError("Linked file to be added has to be of type ELANLinkedFileDescriptor.")
+    
+    def add_tier(self, tier):
         
-        # Add linguistic types
-        for linguistic_type in self.get_linguistic_types():
+        # Check type
+        if isinstance(tier, ELANTier):
+            self.tiers.append(tier)
+            self.tiers_dict[tier.get_tier_id()] = tier
+            self.tier_ids.release_name(tier.get_tier_id())
             
-            node += linguistic_type.to_xml(indent=indent)
+            # Add annotation to annotations_dict
+            for annotation in tier:
+                self.annotations_dict[annotation.get_annotation_id()] = annotation
+                self.annotation_ids.register(annotation.get_annotation_id())
 
-        # Add locales
-        for locale in self.get_locales():
-            
-            node += locale.to_xml(indent=indent)
+            self.count_time_slot_references(tier.annotations, 1)
+
+            if self.journal is not None:
+                with self.journal_group():
+                    self.journal.record(["add_tier", len(self.tiers) - 1, ELANJournal.get_tier_record(tier)])
+                    if tier.annotations:
+                        self.journal.record(["add_annotations", [ELANJournal.get_annotation_record(annotation, position)
+                                                                 for position, annotation in enumerate(tier.annotations)]])
+
+            self.mark_modified()
         
-        # Add constraints
-        for constraint in self.get_constraints():
-            
-            node += constraint.to_xml(indent=indent)
+        else:
+            raise TypeError("Tier to be added has to be of type ELANTier.")
+
+    # Remove annotations given by their IDs. With cascade, annotations
+    # depending on them (reference annotations referring to them and
+    # time-aligned annotations within their effective time span on
+    # dependent tiers, including subdivisions with unaligned time slots)
+    # are removed as well; otherwise removing an annotation with dependents
+    # raises a RuntimeError. PREVIOUS_ANNOTATION chains of the remaining
+    # siblings are repaired and time slots no longer referred to are
+    # released. Returns the IDs of all removed annotations.
+    def remove_annotations(self, annotation_ids, cascade=True):
+
+        self.load_all_tiers()
+
+        removed = {}
+        for annotation_id in annotation_ids:
+            removed[annotation_id] = self.get_annotation_by_id(annotation_id)
+
+        # Find dependent annotations level by level
+        children_index = self.get_children_index()
+        effective_times = self.get_effective_times()
+        child_tiers = {}
+        for tier in self.tiers:
+            if tier.get_parent_tier_ref() is not None:
+                child_tiers.setdefault(tier.get_parent_tier_ref(), []).append(tier)
+
+        intervals = {}
+        pending = list(removed.values())
+
+        while pending:
+
+            dependents = []
+            for annotation in pending:
+
+                for child in children_index.get(annotation.annotation_id, []):
+                    dependents.append(child)
+
+                if isinstance(annotation, ELANAlignableAnnotation):
+                    for child_tier in child_tiers.get(annotation.tier.get_tier_id(), []):
+                        dependents.extend(self.get_annotations_within(child_tier, annotation, effective_times, intervals))
+
+            pending = []
+            for dependent in dependents:
+                if dependent.annotation_id not in removed:
+                    if not cascade:
+                        raise RuntimeError("Annotation " + dependent.annotation_id + " depends on an annotation to be removed.")
+                    removed[dependent.annotation_id] = dependent
+                    pending.append(dependent)
+
+        with self.journal_group():
+
+            # Repair PREVIOUS_ANNOTATION chains among the remaining siblings
+            for annotation in removed.values():
+
+                if not isinstance(annotation, ELANRefAnnotation):
+                    continue
+
+                previous_annotation = annotation.previous_annotation
+                while previous_annotation is not None and previous_annotation in removed:
+                    previous_annotation = removed[previous_annotation].previous_annotation
+
+                for sibling in children_index.get(annotation.annotation_ref, []):
+                    if sibling.previous_annotation == annotation.annotation_id and sibling.annotation_id not in removed:
+                        sibling.set_previous_annotation_ref(previous_annotation)
+
+            self.discard_annotations(removed.values())
+
+        return list(removed)
+
+    # Return (start time, end time, annotation) triples for the
+    # time-aligned annotations of a tier from their effective times (see
+    # get_effective_times), sorted by start and end time. Unlike
+    # get_time_intervals, annotations on unaligned time slots are included
+    # wherever their times can be determined.
+    def get_effective_intervals(self, tier, effective_times):
+
+        intervals = []
+        for annotation in tier.annotations:
+            if isinstance(annotation, ELANAlignableAnnotation):
+                start, end = effective_times.get(annotation.annotation_id, (None, None))
+                if start is not None and end is not None:
+                    intervals.append((start, end, annotation))
+
+        intervals.sort(key=lambda interval: (interval[0], interval[1]))
+
+        return intervals
+
+    # Return the time-aligned annotations of a tier within the effective
+    # time span of an annotation (see get_effective_times), using (and
+    # filling) a dictionary of sorted intervals
+    def get_annotations_within(self, tier, annotation, effective_times, intervals):
+
+        start, end = effective_times.get(annotation.annotation_id, (None, None))
+
+        if start is None or end is None:
+            return []
+
+        tier_id = tier.get_tier_id()
+        if tier_id not in intervals:
+            tier_intervals = self.get_effective_intervals(tier, effective_times)
+            intervals[tier_id] = ([interval[0] for interval in tier_intervals], tier_intervals)
+
+        starts, tier_intervals = intervals[tier_id]
+
+        result = []
+        position = bisect_left(starts, start)
+        while position < len(tier_intervals) and tier_intervals[position][0] <= end:
+            if tier_intervals[position][1] <= end and tier_intervals[position][2] is not annotation:
+                result.append(tier_intervals[position][2])
+            position += 1
+
+        return result
+
+    # Return a dictionary from time slot IDs to the number of time-aligned
+    # annotations referring to them. It is built in one pass when first
+    # needed and then kept up to date as annotations are added and removed.
+    def get_time_slot_references(self):
+
+        if self.time_slot_references is None:
+
+            self.load_all_tiers()
+
+            references = {}
+            for tier in self.tiers:
+                for annotation in tier.annotations:
+                    if isinstance(annotation, ELANAlignableAnnotation):
+                        references[annotation.start_time_slot] = references.get(annotation.start_time_slot, 0) + 1
+                        references[annotation.end_time_slot] = references.get(annotation.end_time_slot, 0) + 1
+
+            self.time_slot_references = references
+
+        return self.time_slot_references
+
+    # Add (count=1) or remove (count=-1) the references of annotations to
+    # their time slots. Returns the IDs of time slots no longer referred to.
+    def count_time_slot_references(self, annotations, count):
+
+        references = self.time_slot_references
+        if references is None:
+            return []
+
+        unreferenced = []
+        for annotation in annotations:
+            if isinstance(annotation, ELANAlignableAnnotation):
+                for time_slot_id in [annotation.start_time_slot, annotation.end_time_slot]:
+                    number = references.get(time_slot_id, 0) + count
+                    if number > 0:
+                        references[time_slot_id] = number
+                    elif time_slot_id in references:
+                        del references[time_slot_id]
+                        unreferenced.append(time_slot_id)
+
+        return unreferenced
+
+    # Move a reference of an annotation from one time slot to another
+    def move_time_slot_reference(self, old_time_slot_id, new_time_slot_id):
+
+        references = self.time_slot_references
+        if references is None:
+            return
+
+        references[new_time_slot_id] = references.get(new_time_slot_id, 0) + 1
+
+        number = references.get(old_time_slot_id, 0) - 1
+        if number > 0:
+            references[old_time_slot_id] = number
+        else:
+            references.pop(old_time_slot_id, None)
+
+    # Remove annotations from their tiers and from the file in one pass per
+    # tier and (unless release_time_slots is False) release the time slots
+    # that are no longer referred to (without cascading or repairing
+    # PREVIOUS_ANNOTATION chains). Time slots to release are found through
+    # the reference counts of the time slots, not by scanning all tiers.
+    def discard_annotations(self, annotations, release_time_slots=True):
+
+        annotations = list(annotations)
+        if not annotations:
+            return
+
+        self.release_clones()
+
+        if release_time_slots:
+            self.get_time_slot_references()
+
+        removed_by_tier = {}
+        discarded = []
+
+        for annotation in annotations:
+
+            removed_by_tier.setdefault(id(annotation.tier), (annotation.tier, set()))[1].add(id(annotation))
+
+            if self.annotations_dict.get(annotation.annotation_id) is annotation:
+                del self.annotations_dict[annotation.annotation_id]
+                discarded.append(annotation)
+
+        released = self.count_time_slot_references(discarded, -1)
+
+        # Records of the removed annotations with their positions in the tiers
+        records = []
+
+        for tier, removed in removed_by_tier.values():
+
+            annotations = []
+            annotations_removed = []
+            for position, annotation in enumerate(tier.annotations):
+                if id(annotation) not in removed:
+                    annotations.append(annotation)
+                else:
+                    annotations_removed.append(annotation)
+                    if self.journal is not None:
+                        records.append(ELANJournal.get_annotation_record(annotation, position))
+
+            tier.annotations = annotations
+
+            for annotation in annotations_removed:
+                if tier.annotations_dict.get(annotation.annotation_id) is annotation:
+                    del tier.annotations_dict[annotation.annotation_id]
+
+        if not release_time_slots:
+            released = []
+
+        with self.journal_group():
+
+            if self.journal is not None:
+                self.journal.record(["remove_annotations", records])
+
+            time_slots = []
+            for time_slot_id in released:
+                time_slot = self.time_slots_dict.pop(time_slot_id, None)
+                if time_slot is not None:
+                    time_slots.append(time_slot)
+
+            self.time_order.remove_time_slots(time_slots)
+
+        self.mark_modified()
+
+    # Remove a tier with all its annotations. With cascade, its dependent
+    # tiers are removed as well; otherwise removing a tier with dependent
+    # tiers raises a RuntimeError. Returns the IDs of the removed tiers.
+    def remove_tier(self, tier_id, cascade=True):
+
+        self.load_all_tiers()
+
+        tier = self.resolve_tier(tier_id)
+
+        child_tiers = {}
+        for other_tier in self.tiers:
+            if other_tier.get_parent_tier_ref() is not None:
+                child_tiers.setdefault(other_tier.get_parent_tier_ref(), []).append(other_tier)
+
+        removed_tiers = [tier]
+        position = 0
+        while position < len(removed_tiers):
+            for child_tier in child_tiers.get(removed_tiers[position].get_tier_id(), []):
+                if not cascade:
+                    raise RuntimeError("Tier " + child_tier.get_tier_id() + " depends on tier " + tier.get_tier_id() + ".")
+                if child_tier not in removed_tiers:
+                    removed_tiers.append(child_tier)
+            position += 1
+
+        removed_tier_ids = [removed_tier.get_tier_id() for removed_tier in removed_tiers]
+
+        with self.journal_group():
+
+            self.discard_annotations(annotation for removed_tier in removed_tiers for annotation in removed_tier.annotations)
+
+            # Record the removals from the last position to the first, so
+            # undoing them restores the original positions
+            if self.journal is not None:
+                for position in reversed(range(len(self.tiers))):
+                    if self.tiers[position].get_tier_id() in removed_tier_ids:
+                        self.journal.record(["remove_tier", position, ELANJournal.get_tier_record(self.tiers[position])])
+
+        self.tiers = [other_tier for other_tier in self.tiers if other_tier.get_tier_id() not in removed_tier_ids]
+
+        for removed_tier_id in removed_tier_ids:
+            del self.tiers_dict[removed_tier_id]
+            self.tier_index_dict.pop(removed_tier_id, None)
+            self.tier_ids.release_name(removed_tier_id)
+
+        self.tier_index = [entry for entry in self.tier_index if entry[0] not in removed_tier_ids]
+
+        self.mark_modified()
+
+        return removed_tier_ids
+
+    # Compact the time order and renumber all IDs: time slots no annotation
+    # refers to are dropped, time-aligned time slots with equal time values
+    # are optionally merged into one, the time order is sorted, and time
+    # slots and annotations are renumbered (ts1, ts2, ... in time order and
+    # a1, a2, ... in document order) with all references rewritten and the
+    # lastUsedAnnotationId property updated. Apart from sorting the time
+    # order, every step is a linear pass. Returns a dictionary with the
+    # numbers of removed and merged time slots and of renumbered IDs.
+    # Annotations referring to time slots that do not exist raise a
+    # RuntimeError before anything is changed.
+    #
+    # IDs and references are rewritten directly on the objects rather than
+    # through the setters: the whole compaction is recorded in the journal
+    # as one "compact" operation (which clears the undo history, see
+    # ELANJournal), the dictionaries and time slot reference counts are
+    # rebuilt afterwards and the file is marked as modified once. Time
+    # values are not changed.
+    def compact(self, merge_equal_time_slots=False):
+
+        self.load_all_tiers()
+
+        alignable_annotations = []
+        ref_annotations = []
+        for tier in self.tiers:
+            for annotation in tier.annotations:
+                if isinstance(annotation, ELANAlignableAnnotation):
+                    alignable_annotations.append(annotation)
+                else:
+                    ref_annotations.append(annotation)
+
+        missing = [(annotation.annotation_id, time_slot_id) for annotation in alignable_annotations
+                   for time_slot_id in [annotation.start_time_slot, annotation.end_time_slot] if time_slot_id not in self.time_slots_dict]
+
+        if missing:
+            raise RuntimeError(str(len(missing)) + " time slot references cannot be resolved, e.g. time slot " + str(missing[0][1]) +
+                               " of annotation " + str(missing[0][0]) + ".")
+
+        self.release_clones()
+
+        if self.journal is not None:
+            self.journal.record(["compact", merge_equal_time_slots])
+
+        # Time slots that are referred to
+        referenced = set()
+        for annotation in alignable_annotations:
+            referenced.add(annotation.start_time_slot)
+            referenced.add(annotation.end_time_slot)
+
+        # Map time slots with equal time values to the first of them
+        replacements = {}
+        if merge_equal_time_slots:
+            first_by_value = {}
+            for time_slot in self.time_order:
+                if time_slot.ID in referenced and time_slot.time_value is not None:
+                    first = first_by_value.setdefault(time_slot.time_value, time_slot.ID)
+                    if first != time_slot.ID:
+                        replacements[time_slot.ID] = first
+
+            for annotation in alignable_annotations:
+                annotation.start_time_slot = replacements.get(annotation.start_time_slot, annotation.start_time_slot)
+                annotation.end_time_slot = replacements.get(annotation.end_time_slot, annotation.end_time_slot)
+
+        kept = [time_slot for time_slot in self.time_order if time_slot.ID in referenced and time_slot.ID not in replacements]
+        removed_count = len(self.time_order) - len(kept) - len(replacements)
+
+        # Sort the remaining time slots and renumber them
+        time_slots = ELANTimeSlotList(kept)
+        time_slots.sort()
+
+        time_slot_ids = {}
+        for number, time_slot in enumerate(time_slots):
+            time_slot_ids[time_slot.ID] = "ts" + str(number + 1)
+            time_slot.ID = "ts" + str(number + 1)
+
+        for annotation in alignable_annotations:
+            annotation.start_time_slot = time_slot_ids[annotation.start_time_slot]
+            annotation.end_time_slot = time_slot_ids[annotation.end_time_slot]
+
+        self.time_order.time_slots = time_slots
+        self.time_order.time_slots_dict = dict((time_slot.ID, time_slot) for time_slot in time_slots)
+        self.time_order.renumber_on_save = False
+        self.time_order.time_slot_ids.set_last_number(len(time_slots))
+        self.time_slots_dict = dict(self.time_order.time_slots_dict)
+
+        # Renumber the annotations in document order
+        annotation_ids = {}
+        number = 0
+        for tier in self.tiers:
+            for annotation in tier.annotations:
+                number += 1
+                annotation_ids[annotation.annotation_id] = "a" + str(number)
+
+        for tier in self.tiers:
+            for annotation in tier.annotations:
+                annotation.annotation_id = annotation_ids[annotation.annotation_id]
+            tier.annotations_dict = dict((annotation.annotation_id, annotation) for annotation in tier.annotations)
+
+        for annotation in ref_annotations:
+            annotation.annotation_ref = annotation_ids.get(annotation.annotation_ref, annotation.annotation_ref)
+            if annotation.previous_annotation is not None:
+                annotation.previous_annotation = annotation_ids.get(annotation.previous_annotation, annotation.previous_annotation)
+
+        self.annotations_dict = dict((annotation.annotation_id, annotation) for tier in self.tiers for annotation in tier.annotations)
+        self.time_slot_references = None
+
+        self.annotation_ids.set_last_number(number)
+        self.set_property("lastUsedAnnotationId", str(number))
+
+        self.mark_modified()
+
+        return {
+            "removed_time_slots": removed_count,
+            "merged_time_slots": len(replacements),
+            "time_slots": len(time_slots),
+            "annotations": number,
+        }
+
+    # Return the time-aligned time slots to be changed by a time
+    # transformation: all of them, or only those whose time value lies in
+    # range (a (start, end) pair, end exclusive) and/or those referred to by
+    # the given tiers and the tiers depending on them. Nothing is changed
+    # (see plan_time_change for time slots shared with other tiers).
+    def select_time_slots(self, range=None, tiers=None):
+        return self.plan_time_change(range, tiers)[0]
+
+    # Work out which time slots a time transformation changes without
+    # changing anything. Returns the time slots (see select_time_slots) and
+    # a dictionary from the IDs of those also referred to by tiers outside
+    # the selection to the selected annotations referring to them, which
+    # have to be moved to copies of these time slots (see apply_time_change).
+    def plan_time_change(self, range=None, tiers=None):
+
+        self.load_all_tiers()
+
+        shared = {}
+
+        if tiers is None:
+            time_slots = [time_slot for time_slot in self.time_order if time_slot.time_value is not None]
+
+        else:
+
+            # Add all dependent tiers to the selection
+            selected_tiers = [self.resolve_tier(tier) for tier in tiers]
+            selected_tier_ids = set(tier.get_tier_id() for tier in selected_tiers)
+            for tier in self.get_tiers_in_hierarchy_order():
+                if tier.get_parent_tier_ref() in selected_tier_ids:
+                    selected_tier_ids.add(tier.get_tier_id())
+
+            selected = []
+            other_references = set()
+            for tier in self.tiers:
+                for annotation in tier.annotations:
+                    if isinstance(annotation, ELANAlignableAnnotation):
+                        if tier.get_tier_id() in selected_tier_ids:
+                            selected.append(annotation)
+                        else:
+                            other_references.add(annotation.start_time_slot)
+                            other_references.add(annotation.end_time_slot)
+
+            time_slot_ids = set()
+            for annotation in selected:
+                for time_slot_id in [annotation.start_time_slot, annotation.end_time_slot]:
+                    time_slot_ids.add(time_slot_id)
+                    if time_slot_id in other_references:
+                        annotations = shared.setdefault(time_slot_id, [])
+                        if not annotations or annotations[-1] is not annotation:
+                            annotations.append(annotation)
+
+            time_slots = [self.time_slots_dict[time_slot_id] for time_slot_id in time_slot_ids
+                          if time_slot_id in self.time_slots_dict and self.time_slots_dict[time_slot_id].time_value is not None]
+
+        if range is not None:
+            start, end = range
+            time_slots = [time_slot for time_slot in time_slots
+                          if (start is None or time_slot.time_value >= start) and (end is None or time_slot.time_value < end)]
+            if shared:
+                time_slot_ids = set(time_slot.ID for time_slot in time_slots)
+                shared = dict((time_slot_id, annotations) for time_slot_id, annotations in shared.items() if time_slot_id in time_slot_ids)
+
+        return time_slots, shared
+
+    # Check new time values before anything is changed: negative values
+    # are clamped to 0 (negative="clamp") or rejected (negative="error"),
+    # and time-aligned annotations must not end up ending before they
+    # start. Annotations listed in shared (see plan_time_change) follow the
+    # new values of shared time slots; all others keep the old ones.
+    # Returns the IDs of the clamped time slots.
+    def check_time_values(self, time_slots, time_values, negative="clamp", shared=None):
+
+        if negative not in ["clamp", "error"]:
+            raise RuntimeError("Unknown policy for negative time values: " + str(negative))
+
+        clamped = [time_slot.ID for time_slot, time_value in zip(time_slots, time_values) if time_value < 0]
+
+        if clamped and negative == "error":
+            raise RuntimeError(str(len(clamped)) + " time values would become negative, e.g. that of time slot " + clamped[0] + ".")
+
+        new_values = dict((time_slot.ID, max(time_value, 0)) for time_slot, time_value in zip(time_slots, time_values))
+        if not new_values:
+            return clamped
+
+        if shared is None:
+            shared = {}
+        moving = set(id(annotation) for annotations in shared.values() for annotation in annotations)
+
+        time_slots_dict = self.time_slots_dict
+
+        def get_time_value(annotation, time_slot_id):
+            if time_slot_id in new_values and (time_slot_id not in shared or id(annotation) in moving):
+                return new_values[time_slot_id]
+            time_slot = time_slots_dict.get(time_slot_id)
+            if time_slot is None:
+                return None
+            return time_slot.time_value
+
+        self.load_all_tiers()
+
+        inverted = []
+        for tier in self.tiers:
+            for annotation in tier.annotations:
+                if isinstance(annotation, ELANAlignableAnnotation):
+                    if annotation.start_time_slot in new_values or annotation.end_time_slot in new_values:
+                        start = get_time_value(annotation, annotation.start_time_slot)
+                        end = get_time_value(annotation, annotation.end_time_slot)
+                        if start is not None and end is not None and start > end:
+                            inverted.append(annotation.annotation_id)
+
+        if inverted:
+            raise RuntimeError(str(len(inverted)) + " annotations would end before they start, e.g. annotation " + inverted[0] + ".")
+
+        return clamped
+
+    # Set new time values for time slots in bulk, after checking them (see
+    # check_time_values). Returns the IDs of the clamped time slots.
+    def set_time_values(self, time_slots, time_values, negative="clamp", sort=True):
+
+        clamped = self.check_time_values(time_slots, time_values, negative)
+        self.write_time_values(time_slots, time_values, sort)
+
+        return clamped
+
+    # Write new time values without any checks. This is the bulk
+    # counterpart of ELANTimeSlot.set_time_value, and all bulk changes of
+    # time values go through it: shared parts of clones are released, the
+    # change is recorded as one journal operation, the time order is
+    # sorted (or its sort keys refreshed) once and the file is marked as
+    # modified once. Negative values are written as 0.
+    def write_time_values(self, time_slots, time_values, sort=True):
+
+        self.release_clones()
+
+        time_values = [max(time_value, 0) for time_value in time_values]
+
+        if self.journal is not None:
+            self.journal.record(["set_time_values", [time_slot.ID for time_slot in time_slots], [time_slot.time_value for time_slot in time_slots],
+                                 time_values])
+
+        for time_slot, time_value in zip(time_slots, time_values):
+            time_slot.time_value = time_value
+
+        # Restore the time order if only part of it was changed
+        if sort:
+            self.time_order.sort()
+        else:
+            self.time_order.time_slots.invalidate_keys()
+
+        self.mark_modified()
+
+    # Apply the new time values of a time transformation planned by
+    # plan_time_change. Everything is checked first (see
+    # check_time_values); only then are the selected annotations moved to
+    # copies of the time slots they share with other tiers (inserted right
+    # after the originals), and the time values written (see
+    # write_time_values), all in one step of the journal. Returns the IDs
+    # of the clamped time slots.
+    def apply_time_change(self, time_slots, time_values, shared, negative="clamp", sort=True):
+
+        clamped = self.check_time_values(time_slots, time_values, negative, shared)
+
+        with self.journal_group():
+
+            if shared:
+                positions = dict((time_slot.ID, position) for position, time_slot in enumerate(time_slots))
+                time_slots = list(time_slots)
+
+                for time_slot_id, annotations in shared.items():
+                    original = self.time_slots_dict[time_slot_id]
+                    copy = self.insert_time_slot(ELANTimeSlot(self.time_order.get_new_time_slot_id(), original.time_value), after=original)
+                    for annotation in annotations:
+                        if annotation.start_time_slot == time_slot_id:
+                            annotation.set_start_time_slot(copy.ID)
+                        if annotation.end_time_slot == time_slot_id:
+                            annotation.set_end_time_slot(copy.ID)
+                    time_slots[positions[time_slot_id]] = copy
+
+            self.write_time_values(time_slots, time_values, sort)
+
+        return clamped
+
+    # Shift the time values of all time slots (or those selected by range
+    # and tiers, see select_time_slots) by offset_ms milliseconds. With
+    # compensate_time_origin, the TIME_ORIGIN of the media descriptors is
+    # moved the other way, so annotations keep their position in the media
+    # (e.g. when a recording is embedded in a longer timeline). Returns the
+    # IDs of the time slots whose new time value had to be clamped to 0.
+    def shift_times(self, offset_ms, range=None, tiers=None, negative="clamp", compensate_time_origin=False):
+
+        offset_ms = int(offset_ms)
+        time_slots, shared = self.plan_time_change(range, tiers)
+
+        if numpy is not None and time_slots:
+            time_values = (numpy.fromiter((time_slot.time_value for time_slot in time_slots), dtype=numpy.int64, count=len(time_slots)) + offset_ms).tolist()
+        else:
+            time_values = [time_slot.time_value + offset_ms for time_slot in time_slots]
+
+        partial = range is not None or tiers is not None
+        clamped = self.apply_time_change(time_slots, time_values, shared, negative, sort=partial)
+
+        if compensate_time_origin:
+            for media_descriptor in self.media_files:
+                time_origin = int(media_descriptor.get_time_origin() or 0) - offset_ms
+                media_descriptor.set_time_origin(str(time_origin))
+
+        return clamped
+
+    # Scale the time values of all time slots (or those selected by range
+    # and tiers, see select_time_slots) by factor around anchor (in
+    # milliseconds), rounding to whole milliseconds, e.g. after the media
+    # has been resampled. With scale_time_origin, the TIME_ORIGIN of the
+    # media descriptors is scaled as well. Returns the IDs of the time
+    # slots whose new time value had to be clamped to 0.
+    def scale_times(self, factor, anchor=0, range=None, tiers=None, negative="clamp", scale_time_origin=False):
+
+        if factor <= 0:
+            raise RuntimeError("Scaling factor must be positive.")
+
+        time_slots, shared = self.plan_time_change(range, tiers)
+
+        if numpy is not None and time_slots:
+            time_values = numpy.fromiter((time_slot.time_value for time_slot in time_slots), dtype=numpy.int64, count=len(time_slots))
+            time_values = numpy.rint(anchor + (time_values - anchor) * factor).astype(numpy.int64).tolist()
+        else:
+            time_values = [int(round(anchor + (time_slot.time_value - anchor) * factor)) for time_slot in time_slots]
+
+        partial = range is not None or tiers is not None
+        clamped = self.apply_time_change(time_slots, time_values, shared, negative, sort=partial)
+
+        if scale_time_origin:
+            for media_descriptor in self.media_files:
+                if media_descriptor.has_time_origin():
+                    media_descriptor.set_time_origin(str(int(round(int(media_descriptor.get_time_origin()) * factor))))
+
+        return clamped
+
+    # Copy tiers with their annotations from another ELAN file into this
+    # one. Parent tiers of the given tiers are copied as well, since
+    # reference annotations cannot exist without them. Linguistic types,
+    # controlled vocabularies, constraints, locales and the external and
+    # lexicon references they need are brought along. Tiers, linguistic
+    # types and controlled vocabularies whose IDs are already used here
+    # with a different definition are handled according to conflict:
+    #
+    #   rename     the copy gets a new ID with a numeric suffix (e.g. words-2)
+    #   skip       the tier (and its imported dependent tiers) is not copied;
+    #              linguistic types and vocabularies of this file are kept
+    #   overwrite  the tier of this file (with its dependent tiers) is
+    #              removed; linguistic types and vocabularies are replaced
+    #
+    # All new annotation and time slot IDs are allocated at once and the
+    # time slots are merged into the time order by time value in one go.
+    # Returns a dictionary from the IDs of the copied tiers in the source
+    # to their IDs in this file.
+    def import_tiers(self, source, tier_ids, conflict="rename"):
+
+        if conflict not in ["rename", "skip", "overwrite"]:
+            raise RuntimeError("Unknown policy for conflicting IDs: " + str(conflict))
+
+        if source is self:
+            raise RuntimeError("Cannot import tiers from an ELAN file into itself.")
+
+        with self.journal_group():
+
+            # Collect the tiers to be copied with their ancestors, parents first
+            selected = {}
+            for tier_id in tier_ids:
+                if isinstance(tier_id, ELANTier):
+                    tier_id = tier_id.get_tier_id()
+                while tier_id is not None and tier_id not in selected:
+                    tier = source.load_tier(tier_id) if tier_id in source.tier_index_dict else source.resolve_tier(tier_id)
+                    selected[tier_id] = tier
+                    tier_id = tier.get_parent_tier_ref()
+
+            source_tiers = [tier for tier in source.get_tiers_in_hierarchy_order() if tier.get_tier_id() in selected]
+
+            # Map the tier IDs
+            used_tier_ids = set(self.tiers_dict) | set(self.tier_index_dict)
+            tier_id_map = {}
+            overwritten = []
+
+            for tier in source_tiers:
+
+                tier_id = tier.get_tier_id()
+                parent_tier_ref = tier.get_parent_tier_ref()
+
+                if parent_tier_ref is not None and parent_tier_ref not in tier_id_map:
+                    continue
+
+                if tier_id in used_tier_ids:
+                    if conflict == "skip":
+                        continue
+                    elif conflict == "rename":
+                        tier_id_map[tier_id] = self.tier_ids.allocate_name(used_tier_ids, tier_id)
+                    else:
+                        overwritten.append(tier_id)
+                        tier_id_map[tier_id] = tier_id
+                else:
+                    tier_id_map[tier_id] = tier_id
+
+                used_tier_ids.add(tier_id_map[tier_id])
+
+            source_tiers = [tier for tier in source_tiers if tier.get_tier_id() in tier_id_map]
+
+            for tier_id in overwritten:
+                if tier_id in self.tiers_dict or tier_id in self.tier_index_dict:
+                    self.remove_tier(tier_id, cascade=True)
+
+            # Bring along controlled vocabularies and linguistic types
+            linguistic_type_map = {}
+            cv_map = {}
+            external_ref_ids = set()
+
+            for tier in source_tiers:
+
+                linguistic_type_id = tier.get_linguistic_type()
+                if linguistic_type_id in linguistic_type_map:
+                    continue
+
+                linguistic_type = source.get_linguistic_type_by_id(linguistic_type_id)
+                if linguistic_type is None:
+                    linguistic_type_map[linguistic_type_id] = linguistic_type_id
+                    continue
+
+                cv_ref = linguistic_type.get_controlled_vocabulary_ref()
+                if cv_ref is not None and cv_ref not in cv_map:
+                    cv_map[cv_ref] = self.import_controlled_vocabulary(source.get_controlled_vocabulary_by_id(cv_ref), conflict, external_ref_ids)
+
+                linguistic_type_map[linguistic_type_id] = self.import_linguistic_type(source, linguistic_type, cv_map.get(cv_ref, cv_ref), conflict, external_ref_ids)
+
+                if linguistic_type.has_constraints() and self.get_constraint_by_stereotype(linguistic_type.get_constraints()) is None:
+                    constraint = source.get_constraint_by_stereotype(linguistic_type.get_constraints())
+                    if constraint is not None:
+                        self.add_constraint(ELANConstraint(constraint.get_stereotype(), constraint.get_description()))
+
+            # Bring along the locales of the tiers
+            language_codes = set(locale.get_language_code() for locale in self.locales)
+            for locale in source.get_locales():
+                if locale.get_language_code() not in language_codes and any(tier.get_default_locale() == locale.get_language_code() for tier in source_tiers):
+                    self.add_locale(ELANLocale(locale.get_language_code(), locale.get_country_code(), locale.get_variant()))
+                    language_codes.add(locale.get_language_code())
+
+            # Map annotation and time slot IDs in one pass
+            annotation_count = 0
+            time_slot_ids = set()
+            for tier in source_tiers:
+                annotation_count += len(tier.annotations)
+                for annotation in tier.annotations:
+                    if isinstance(annotation, ELANAlignableAnnotation):
+                        time_slot_ids.add(annotation.start_time_slot)
+                        time_slot_ids.add(annotation.end_time_slot)
+                    if annotation.external_ref is not None:
+                        external_ref_ids.add(annotation.external_ref)
+
+            new_annotation_ids = iter(self.allocate_annotation_ids(annotation_count))
+            new_time_slot_ids = iter(self.time_order.allocate_time_slot_ids(len(time_slot_ids)))
+
+            annotation_id_map = {}
+            for tier in source_tiers:
+                for annotation in tier.annotations:
+                    annotation_id_map[annotation.annotation_id] = next(new_annotation_ids)
+
+            # Copy the time slots in source order, so unaligned time slots can
+            # be placed after their copied predecessors
+            time_slot_map = {}
+            aligned_time_slots = []
+            unaligned_time_slots = []
+            previous_time_slot = None
+
+            for time_slot in source.time_order:
+                if time_slot.ID in time_slot_ids:
+                    new_time_slot = ELANTimeSlot(next(new_time_slot_ids), time_slot.time_value)
+                    time_slot_map[time_slot.ID] = new_time_slot.ID
+                    if new_time_slot.time_value is None:
+                        unaligned_time_slots.append((new_time_slot, previous_time_slot))
+                    else:
+                        aligned_time_slots.append(new_time_slot)
+                    previous_time_slot = new_time_slot
+
+            if len(time_slot_map) < len(time_slot_ids):
+                raise RuntimeError("Annotations of the tiers to be imported refer to time slots missing from the time order.")
+
+            self.time_order.insert_time_slots(aligned_time_slots)
+            for new_time_slot in aligned_time_slots:
+                self.time_slots_dict[new_time_slot.ID] = new_time_slot
+
+            for new_time_slot, previous_time_slot in unaligned_time_slots:
+                self.insert_time_slot(new_time_slot, previous_time_slot)
+
+            # Copy the tiers and annotations
+            new_annotations = []
+            for tier in source_tiers:
+
+                parent_tier_ref = tier.get_parent_tier_ref()
+                if parent_tier_ref is not None:
+                    parent_tier_ref = tier_id_map[parent_tier_ref]
+
+                new_tier = ELANTier(tier_id_map[tier.get_tier_id()], linguistic_type_map[tier.get_linguistic_type()], self,
+                                    tier.participant, tier.annotator, tier.default_locale, parent_tier_ref)
+
+                for annotation in tier.annotations:
+
+                    annotation_id = annotation_id_map[annotation.annotation_id]
+
+                    if isinstance(annotation, ELANAlignableAnnotation):
+                        new_annotation = ELANAlignableAnnotation(annotation_id, annotation.annotation_value, time_slot_map[annotation.start_time_slot],
+                                                                 time_slot_map[annotation.end_time_slot], self, new_tier, annotation.svg_ref, annotation.external_ref)
+                    else:
+                        if annotation.annotation_ref not in annotation_id_map:
+                            raise RuntimeError("Annotation " + annotation.annotation_id + " refers to annotation " + str(annotation.annotation_ref) + " outside the tiers to be imported.")
+                        new_annotation = ELANRefAnnotation(annotation_id, annotation.annotation_value, annotation_id_map[annotation.annotation_ref], self, new_tier,
+                                                           annotation_id_map.get(annotation.previous_annotation), annotation.external_ref)
+
+                    new_tier.annotations.append(new_annotation)
+                    new_tier.annotations_dict[annotation_id] = new_annotation
+
+                new_annotations.extend(new_tier.annotations)
+                self.add_tier(new_tier)
+
+            # Bring along external references of annotations and vocabularies
+            for external_ref_id in external_ref_ids:
+                if external_ref_id not in self.external_references_dict and external_ref_id in source.external_references_dict:
+                    external_reference = source.external_references_dict[external_ref_id]
+                    self.add_external_reference(ELANExternalReference(external_reference.get_id(), external_reference.get_type(), external_reference.get_value()))
+
+            if self.active_transaction is not None:
+                self.active_transaction.add_annotations(new_annotations)
+
+            self.mark_modified()
+
+            return dict((tier.get_tier_id(), tier_id_map[tier.get_tier_id()]) for tier in source_tiers)
+
+    # Copy a controlled vocabulary of another ELAN file into this one (see
+    # import_tiers) and return its ID in this file
+    def import_controlled_vocabulary(self, controlled_vocabulary, conflict, external_ref_ids):
+
+        cv_id = controlled_vocabulary.get_cv_id()
+        existing = self.get_controlled_vocabulary_by_id(cv_id)
+
+        def describe(cv):
+            return (cv.description, cv.ext_ref, [(entry.value, entry.description, entry.ext_ref) for entry in cv.cv_entries])
+
+        if existing is not None:
+            if describe(existing) == describe(controlled_vocabulary) or conflict == "skip":
+                return cv_id
+            elif conflict == "rename":
+                cv_id = self.get_unused_id(cv_id, self.controlled_vocabularies_dict)
+
+        new_cv = ELANControlledVocabulary(cv_id, controlled_vocabulary.description, controlled_vocabulary.ext_ref)
+        for entry in controlled_vocabulary.cv_entries:
+            new_cv.add_cv_entry(ELANControlledVocabularyEntry(entry.value, cv_id, entry.description, entry.ext_ref))
+            if entry.ext_ref is not None:
+                external_ref_ids.add(entry.ext_ref)
+
+        if controlled_vocabulary.ext_ref is not None:
+            external_ref_ids.add(controlled_vocabulary.ext_ref)
+
+        if existing is not None and cv_id == existing.get_cv_id():
+            self.controlled_vocabularies = [new_cv if cv is existing else cv for cv in self.controlled_vocabularies]
+            self.controlled_vocabularies_dict[cv_id] = new_cv
+            self.mark_modified()
+        else:
+            self.add_controlled_vocabulary(new_cv)
+
+        return cv_id
+
+    # Copy a linguistic type of another ELAN file into this one (see
+    # import_tiers) with the given controlled vocabulary reference and
+    # return its ID in this file
+    def import_linguistic_type(self, source, linguistic_type, cv_ref, conflict, external_ref_ids):
+
+        linguistic_type_id = linguistic_type.get_linguistic_type_id()
+        existing = self.get_linguistic_type_by_id(linguistic_type_id)
+
+        definition = (linguistic_type.time_alignable, linguistic_type.constraints, linguistic_type.graphic_references, cv_ref,
+                      linguistic_type.external_ref, linguistic_type.lexicon_ref)
+
+        if existing is not None:
+            if conflict == "skip" or definition == (existing.time_alignable, existing.constraints, existing.graphic_references,
+                                                    existing.controlled_vocabulary_ref, existing.external_ref, existing.lexicon_ref):
+                return linguistic_type_id
+            elif conflict == "rename":
+                linguistic_type_id = self.get_unused_id(linguistic_type_id, self.linguistic_types_dict)
+
+        if linguistic_type.time_alignable:
+            time_alignable = "true"
+        else:
+            time_alignable = "false"
+
+        new_linguistic_type = ELANLinguisticType(linguistic_type_id, self, time_alignable, linguistic_type.constraints, linguistic_type.graphic_references,
+                                                 cv_ref, linguistic_type.external_ref, linguistic_type.lexicon_ref)
+
+        if linguistic_type.external_ref is not None:
+            external_ref_ids.add(linguistic_type.external_ref)
+
+        lexicon_ref = linguistic_type.lexicon_ref
+        if lexicon_ref is not None and lexicon_ref not in self.lexicon_references_dict and lexicon_ref in source.lexicon_references_dict:
+            self.add_lexicon_reference(source.lexicon_references_dict[lexicon_ref])
+
+        if existing is not None and linguistic_type_id == existing.get_linguistic_type_id():
+            self.linguistic_types = [new_linguistic_type if other is existing else other for other in self.linguistic_types]
+            self.linguistic_types_dict[linguistic_type_id] = new_linguistic_type
+            self.mark_modified()
+        else:
+            self.add_linguistic_type(new_linguistic_type)
+
+        return linguistic_type_id
+
+    # Return ID if it is not among used_ids, otherwise ID with the first
+    # free numeric suffix (ID-2, ID-3, ...)
+    @staticmethod
+    def get_unused_id(ID, used_ids):
+
+        if ID not in used_ids:
+            return ID
+
+        number = 2
+        while ID + "-" + str(number) in used_ids:
+            number += 1
+
+        return ID + "-" + str(number)
+
+    # Return a new ELANFile with copies of the header (metadata, media and
+    # linked file descriptors, properties), linguistic types, constraints,
+    # controlled vocabularies, locales, lexicon and external references of
+    # this file, but without any time slots, tiers or annotations. Set
+    # controlled_vocabularies to False to leave out the controlled
+    # vocabularies.
+    def copy_header(self, controlled_vocabularies=True):
+
+        elan_file = ELANFile()
+
+        elan_file.url = self.url
+        elan_file.author = self.author
+        elan_file.date = self.date
+        elan_file.format = self.format
+        elan_file.version = self.version
+        elan_file.media_file = self.media_file
+        elan_file.time_units = self.time_units
+        elan_file.properties = dict(self.properties)
+
+        for media_file in self.media_files:
+            elan_file.add_media_file(copy.copy(media_file))
+
+        for linked_file in self.linked_files:
+            elan_file.add_linked_file(copy.copy(linked_file))
+
+        for linguistic_type in self.linguistic_types:
+            new_linguistic_type = copy.copy(linguistic_type)
+            new_linguistic_type.ELAN_file = elan_file
+            elan_file.add_linguistic_type(new_linguistic_type)
+
+        for constraint in self.constraints:
+            elan_file.add_constraint(copy.copy(constraint))
+
+        if controlled_vocabularies:
+            for controlled_vocabulary in self.controlled_vocabularies:
+                elan_file.add_controlled_vocabulary(self.copy_controlled_vocabulary(controlled_vocabulary))
+
+        for locale in self.locales:
+            elan_file.add_locale(copy.copy(locale))
+
+        for lexicon_reference in self.lexicon_references:
+            elan_file.add_lexicon_reference(copy.copy(lexicon_reference))
+
+        for external_reference in self.external_references:
+            elan_file.add_external_reference(copy.copy(external_reference))
+
+        elan_file.revision = 0
+
+        return elan_file
+
+    # Return a copy of a controlled vocabulary and its entries
+    def copy_controlled_vocabulary(self, controlled_vocabulary):
+
+        new_controlled_vocabulary = copy.copy(controlled_vocabulary)
+        new_controlled_vocabulary.cv_entries = [copy.copy(entry) for entry in controlled_vocabulary.cv_entries]
+        new_controlled_vocabulary.cv_entries_dict = dict((entry.get_value(), entry) for entry in new_controlled_vocabulary.cv_entries)
+
+        return new_controlled_vocabulary
+
+    # Return a copy of the file that can be changed independently of it.
+    # Tiers, the time order and the controlled vocabularies are shared with
+    # this file at first, so cloning takes time proportional to the number
+    # of tiers, not of annotations. Reading the copy (e.g. to_xml,
+    # statistics, get_effective_times, get_annotation_columns or the times
+    # of its annotations) goes through the shared parts. A shared part is
+    # only copied (with the references of its annotations and time slots
+    # rebound to the copy) when it is about to be modified or when an
+    # accessor hands out its mutable objects: get_tiers, get_tier_by_id,
+    # get_annotations_dict, get_annotation_by_id and get_children_index
+    # copy the tiers, get_time_order, get_time_slots_dict and
+    # get_time_slot_by_id the time order, and the controlled vocabulary
+    # accessors the controlled vocabularies (of the copy and of this
+    # file). Modifying this file copies everything its clones still share
+    # with it. Tiers of a lazily read file that have not been loaded yet
+    # are read from disk by the copy itself.
+    def clone(self):
+
+        # A clone of a clone shares nothing with the original file
+        self.copy_shared_parts()
+
+        elan_file = self.copy_header(controlled_vocabularies=False)
+
+        # Share the controlled vocabularies
+        elan_file.controlled_vocabularies = self.controlled_vocabularies
+        elan_file.controlled_vocabularies_dict = self.controlled_vocabularies_dict
+        elan_file.shared_controlled_vocabularies = True
+
+        elan_file.xml_tree = self.xml_tree
+        elan_file.annotation_ids.set_last_number(self.annotation_ids.get_last_number())
+
+        # Share the time order
+        elan_file.time_order = self.time_order
+        elan_file.time_slots_dict = self.time_slots_dict
+        elan_file.shared_time_order = True
+
+        # Share the loaded tiers, keep the offsets of the others
+        elan_file.tier_index = list(self.tier_index)
+        for tier in self.tiers:
+            if tier.get_tier_id() not in self.tier_index_dict:
+                elan_file.tier_index.append((tier.get_tier_id(), None, None))
+
+        for tier_id, start, end in elan_file.tier_index:
+            elan_file.tier_index_dict[tier_id] = (start, end)
+
+        elan_file.tier_index_stat = self.tier_index_stat
+        elan_file.tier_index_encoding = self.tier_index_encoding
+        elan_file.shared_tiers = dict(self.tiers_dict)
+
+        elan_file.clone_source = self
+        elan_file.revision = 0
+
+        self.clones.append(weakref.ref(elan_file))
+
+        return elan_file
+
+    # Give the clones of this file their own copies of the parts they still
+    # share with it. Called before this file is modified.
+    def release_clones(self):
+
+        if not self.clones:
+            return
+
+        clones = self.clones
+        self.clones = []
+
+        for reference in clones:
+            elan_file = reference()
+            if elan_file is not None and elan_file.clone_source is self:
+                elan_file.copy_shared_parts()
+
+    # Replace all parts shared with the ELAN file this file was cloned from
+    # by copies
+    def copy_shared_parts(self):
+        self.copy_shared_time_order()
+        self.copy_shared_controlled_vocabularies()
+        self.load_shared_tiers()
+
+    # Let go of the ELAN file this file was cloned from once nothing is
+    # shared any more
+    def check_clone_source(self):
+
+        if self.clone_source is None:
+            return
+
+        if not self.shared_tiers and not self.shared_time_order and not self.shared_controlled_vocabularies:
+            self.clone_source = None
+
+    # Replace the time order shared with the ELAN file this file was
+    # cloned from by a copy
+    def copy_shared_time_order(self):
+
+        if not self.shared_time_order:
+            return
+
+        source_time_order = self.time_order
+
+        time_order = ELANTimeOrder(self)
+        time_slots = []
+        for time_slot in source_time_order:
+            new_time_slot = ELANTimeSlot(time_slot.ID, time_slot.time_value)
+            new_time_slot.time_order = time_order
+            time_slots.append(new_time_slot)
+
+        time_order.time_slots.build(time_slots)
+        time_order.time_slots_dict = dict((time_slot.ID, time_slot) for time_slot in time_slots)
+        time_order.renumber_on_save = source_time_order.renumber_on_save
+        time_order.time_slot_ids.set_last_number(source_time_order.time_slot_ids.get_last_number())
+
+        self.time_order = time_order
+        self.time_slots_dict = dict(time_order.time_slots_dict)
+        self.shared_time_order = False
+
+        self.check_clone_source()
+
+    # Replace the controlled vocabularies shared with the ELAN file this
+    # file was cloned from by copies
+    def copy_shared_controlled_vocabularies(self):
+
+        if not self.shared_controlled_vocabularies:
+            return
+
+        self.controlled_vocabularies = [self.copy_controlled_vocabulary(controlled_vocabulary) for controlled_vocabulary in self.controlled_vocabularies]
+        self.controlled_vocabularies_dict = dict((controlled_vocabulary.get_cv_id(), controlled_vocabulary) for controlled_vocabulary in self.controlled_vocabularies)
+        self.shared_controlled_vocabularies = False
+
+        self.check_clone_source()
+
+    # Stop sharing controlled vocabularies between this file and the ELAN
+    # file it was cloned from or its clones. Controlled vocabularies can be
+    # changed without the file noticing, so this is done before they are
+    # handed out.
+    def unshare_controlled_vocabularies(self):
+
+        self.copy_shared_controlled_vocabularies()
+
+        for reference in self.clones:
+            elan_file = reference()
+            if elan_file is not None and elan_file.clone_source is self:
+                elan_file.copy_shared_controlled_vocabularies()
+
+    # Return a copy of a tier shared with the ELAN file this file was
+    # cloned from, with its annotations rebound to this file. The time
+    # slots are referenced by ID, so the time order can stay shared.
+    def copy_shared_tier(self, tier_id):
+
+        source_tier = self.shared_tiers.pop(tier_id)
+
+        tier = copy.copy(source_tier)
+        tier.ELAN_file = self
+        tier.annotations = []
+        tier.annotations_dict = {}
+
+        for annotation in source_tier.annotations:
+            new_annotation = copy.copy(annotation)
+            new_annotation.ELAN_file = self
+            new_annotation.tier = tier
+            tier.annotations.append(new_annotation)
+            tier.annotations_dict[new_annotation.annotation_id] = new_annotation
+
+        self.check_clone_source()
+
+        return tier
+
+    # Split the file into pieces covering consecutive time windows, either
+    # of window_ms milliseconds each or delimited by a list of boundaries
+    # (in milliseconds). Every piece is an independent ELANFile with a copy
+    # of the header, linguistic types and controlled vocabularies and all
+    # tiers (possibly empty). Time-aligned annotations crossing a boundary
+    # are handled according to policy:
+    #
+    #   cut   the annotation is clipped to each window it overlaps
+    #   keep  the annotation is kept whole in the window it starts in
+    #
+    # Reference annotations go wherever their parent annotation goes, and
+    # with keep, time-aligned annotations of dependent tiers follow the
+    # parent annotation containing them. Annotation and time slot IDs are
+    # kept. With rebase, the times of each piece start at 0 and the time
+    # origin of its media descriptors is moved to the start of the window.
+    # Annotations are assigned to windows in one pass using binary search
+    # over the window boundaries. Returns the list of pieces or, if
+    # file_name_pattern is given (e.g. "part_{}.eaf"), writes each piece to
+    # disk as soon as it is built and returns the list of file names.
+    def split_by_time(self, window_ms=None, boundaries=None, policy="cut", rebase=False, file_name_pattern=None):
+
+        if policy not in ["cut", "keep"]:
+            raise RuntimeError("Unknown policy for annotations crossing window boundaries: " + str(policy))
+
+        if (window_ms is None) == (boundaries is None):
+            raise RuntimeError("Either window_ms or boundaries has to be given.")
+
+        self.load_all_tiers()
+
+        if window_ms is not None:
+
+            if window_ms <= 0:
+                raise RuntimeError("Window length must be positive.")
+
+            end_time = max([time_slot.time_value for time_slot in self.time_order if time_slot.time_value is not None] + [0])
+            boundaries = list(range(window_ms, end_time, window_ms))
+
+        starts = [0] + sorted(boundary for boundary in set(boundaries) if boundary > 0)
+        ends = starts[1:] + [None]
+
+        def get_windows(start, end):
+
+            first = max(bisect_right(starts, start) - 1, 0)
+            if policy == "keep":
+                return [first]
+
+            last = max(bisect_left(starts, end) - 1, first)
+            return list(range(first, last + 1))
+
+        effective_times = self.get_effective_times()
+        windows_by_annotation = {}
+
+        # Lists of annotations per window and tier
+        pieces = [{} for start in starts]
+
+        for tier in self.get_tiers_in_hierarchy_order():
+
+            tier_id = tier.get_tier_id()
+            parent_tier = self.tiers_dict.get(tier.get_parent_tier_ref())
+
+            parent_starts = None
+            if policy == "keep" and parent_tier is not None:
+                parent_intervals = self.get_effective_intervals(parent_tier, effective_times)
+                parent_starts = [interval[0] for interval in parent_intervals]
+
+            windows = [0]
+
+            for annotation in tier.annotations:
+
+                if isinstance(annotation, ELANRefAnnotation):
+                    windows = windows_by_annotation.get(annotation.annotation_ref, [])
+
+                else:
 
-        # Add controlled vocabularies
-        for controlled_vocabulary in self.get_controlled_vocabularies():
-            
-            node += controlled_vocabulary.to_xml(indent=indent)
+                    start, end = effective_times.get(annotation.annotation_id, (None, None))
+                    if start is None:
+                        start = end
+                    if end is None:
+                        end = start
 
-        # Add lexicon references
-        for lexicon_reference in self.get_lexicon_references():
-            
-            node += lexicon_reference.to_xml(indent=indent)
-        
-        # Add external references
-        for external_reference in self.get_external_references():
-            
-            node += external_reference.to_xml(indent=indent)
-        
-        # Close ANNOTATION_DOCUMENT node
-        node += "</ANNOTATION_DOCUMENT>\n"
-        
-        # Make sure that the xml can be parsed
-        try:
+                    # Annotations without any time stay with their predecessor
+                    if start is not None:
 
-            dom.parseString(node)
-            
-        except:
+                        windows = None
 
-            raise RuntimeError("Could not produce well-formed XML from ELANFile object.")
-        
-        # Return the string representation of the XML node
-        return node
+                        # Follow the parent annotation containing the annotation
+                        if parent_starts:
+                            position = bisect_right(parent_starts, start) - 1
+                            if position >= 0 and parent_intervals[position][1] >= end:
+                                windows = windows_by_annotation.get(parent_intervals[position][2].annotation_id)
 
-    # Getter and setter methods
-    def get_url(self):
-        return self.url
-    
-    def get_xml_tree(self):
-        return self.xml_tree
-    
-    def get_author(self):
-        return self.author
-    
-    def get_date(self):
-        return self.date
-    
-    def get_format(self):
-        return self.format
-    
-    def get_version(self):
-        return self.version
-    
-    # Warning: deprecated attribute
-    def get_media_file(self):
-        return self.media_file
-    
-    def get_time_units(self):
-        return self.time_units
-    
-    def get_media_files(self):
-        return self.media_files
-    
-    def get_media_files_dict(self):
-        return self.media_files_dict
-    
-    def get_linked_files(self):
-        return self.linked_files
-    
-    def get_linked_files_dict(self):
-        return self.linked_files_dict
-    
-    def get_properties(self):
-        return self.properties
-    
-    def get_property(self, key):
-        if key in self.properties:
-            return self.properties[key]
-        else:
-            return None
-    
-    def get_time_order(self):
-        return self.time_order
-    
-    def get_tiers(self):
-        return self.tiers
-    
-    def get_linguistic_types(self):
-        return self.linguistic_types
-    
-    def get_linguistic_types_dict(self):
-        return self.linguistic_types_dict
-    
-    def get_constraints(self):
-        return self.constraints
-    
-    def get_constraints_dict(self):
-        return self.constraints_dict
-    
-    def get_controlled_vocabularies(self):
-        return self.controlled_vocabularies
+                        if windows is None:
+                            windows = get_windows(start, end)
 
-    def get_controlled_vocabularies_dict(self):
-        return self.controlled_vocabularies_dict
-    
-    def get_locales(self):
-        return self.locales
-    
-    def get_lexicon_references(self):
-        return self.lexicon_references
-    
-    def get_lexicon_references_dict(self):
-        return self.lexicon_references_dict
-    
-    def get_external_references(self):
-        return self.external_references
-    
-    def get_external_references_dict(self):
-        return self.external_references_dict
-    
-    def get_time_slots_dict(self):
-        return self.time_slots_dict
-    
-    def get_annotations_dict(self):
-        return self.annotations_dict
-    
-    # TODO: Implement type checking for setter methods
-    def set_url(self, url):
-        self.url = url
-    
-    def set_xml_tree(self, xml_tree):
-        self.xml_tree = xml_tree
-    
-    def set_author(self, author):
-        self.author = author
-        
-    def set_date(self, date):
-        self.date = date
+                windows_by_annotation[annotation.annotation_id] = windows
 
-    def set_format(self, elan_format):
-        self.format = elan_format
-    
-    def set_version(self, version):
-        self.version = version
-    
-    # Warning: Deprecated attribute
-    def set_media_file(self, media_file):
-        self.media_file = media_file
-    
-    # Warning: Should always be milliseconds
-    def set_time_units(self, time_units):
-        self.time_units = time_units
-    
-    def set_media_files(self, media_files):
-        self.media_files = media_files
-    
-    def set_media_files_dict(self, media_files_dict):
-        self.media_files_dict = media_files_dict
-    
-    def set_linked_files(self, linked_files):
-        self.linked_files = linked_files
-    
-    def set_linked_files_dict(self, linked_files_dict):
-        self.linked_files_dict = linked_files_dict
-    
-    def set_properties(self, properties):
-        self.properties = properties
-    
-    def set_property(self, prop, value):
-        self.properties[prop] = value
-    
-    def set_time_order(self, time_order):
-        self.time_order = time_order
-    
-    def set_tiers(self, tiers):
-        self.tiers = tiers
-    
-    def set_tiers_dict(self, tiers_dict):
-        self.tiers_dict = tiers_dict
-    
-    def set_linguistic_types(self, linguistic_types):
-        self.linguistic_types = linguistic_types
-    
-    def set_linguistic_types_dict(self, linguistic_types_dict):
-        self.linguistic_types_dict = linguistic_types_dict
-    
-    def set_constraints(self, constraints):
-        self.constraints = constraints
-    
-    def set_constraints_dict(self, constraints_dict):
-        self.constraints_dict = constraints_dict
-    
-    def set_controlled_vocabularies(self, controlled_vocabularies):
-        self.controlled_vocabularies = controlled_vocabularies
-    
-    def set_controlled_vocabularies_dict(self, controlled_vocabularies_dict):
-        self.controlled_vocabularies_dict = controlled_vocabularies_dict
-    
-    def set_locales(self, locales):
-        self.locales = locales
-    
-    def set_lexicon_references(self, lexicon_references):
-        self.lexicon_references = lexicon_references
-    
-    def set_lexicon_references_dict(self, lexicon_references_dict):
-        self.lexicon_references_dict = lexicon_references_dict
-    
-    def set_external_references(self, external_references):
-        self.external_references
-    
-    def set_external_references_dict(self, external_references_dict):
-        self.external_references_dict = external_references_dict
+                for window in windows:
+                    pieces[window].setdefault(tier_id, []).append(annotation)
 
-    def set_time_slots_dict(self, time_slots_dict):
-        self.time_slots_dict = time_slots_dict
-    
-    def set_annotations_dict(self, annotations_dict):
-        self.annotations_dict = annotations_dict
-    
-    def has_url(self):
-        if self.URL is not None:
-            return True
-        else:
-            return False
-    
-    def has_xml_tree(self):
-        if self.xml_tree is not None:
-            return True
-        else:
-            return False
+        # Build (and write) the pieces one by one
+        positions = {}
+        for position, time_slot in enumerate(self.time_order):
+            positions[time_slot.ID] = position
 
-    def has_author(self):
-        if self.author is not None:
-            return True
-        else:
-            return False
+        results = []
 
-    def has_date(self):
-        if self.date is not None:
-            return True
-        else:
-            return False
+        for window, annotations_by_tier in enumerate(pieces):
 
-    def has_format(self):
-        if self.format is not None:
-            return True
-        else:
-            return False
+            window_start = starts[window]
+            window_end = ends[window]
 
-    def has_version(self):
-        if self.version is not None:
-            return True
-        else:
-            return False
-    
-    def has_media_file(self):
-        if self.media_file is not None:
-            return True
-        else:
-            return False
-    
-    def has_time_units(self):
-        if self.time_units is not None:
-            return True
-        else:
-            return False
+            piece = self.copy_header()
+            time_slots = {}
+
+            def copy_time_slot(time_slot_id):
+
+                if time_slot_id not in time_slots:
+
+                    time_value = self.time_slots_dict[time_slot_id].time_value
+
+                    if time_value is not None:
+                        if policy == "cut":
+                            time_value = max(time_value, window_start)
+                            if window_end is not None:
+                                time_value = min(time_value, window_end)
+                        if rebase:
+                            time_value -= window_start
+
+                    time_slots[time_slot_id] = ELANTimeSlot(time_slot_id, time_value)
+
+                return time_slot_id
 
-    def has_media_files(self):
-        if len(self.media_files) > 0:
-            return True
-        else:
-            return False
+            for tier in self.tiers:
 
-    def has_linked_files(self):
-        if len(self.linked_files) > 0:
-            return True
-        else:
-            return False
+                new_tier = ELANTier(tier.tier_id, tier.linguistic_type, piece, tier.participant, tier.annotator, tier.default_locale, tier.parent_tier_ref)
 
-    def has_properties(self):
-        if len(self.properties) > 0:
-            return True
-        else:
-            return False
+                for annotation in annotations_by_tier.get(tier.tier_id, []):
 
-    def has_time_order(self):
-        if self.time_order is not None:
-            return True
-        else:
-            return False
-    
-    def has_tiers(self):
-        if len(self.tiers) > 0:
-            return True
-        else:
-            return False
-   
-    def has_linguistic_types(self):
-        if len(self.linguistic_types) > 0:
-            return True
-        else:
-            return False
-    
-    def has_constraints(self):
-        if len(self.constraints) > 0:
-            return True
-        else:
-            return False
-    
-    def has_controlled_vocabularies(self):
-        if len(self.controlled_vocabularies) > 0:
-            return True
-        else:
-            return False
-    
-    def has_locales(self):
-        if len(self.locales) > 0:
-            return True
-        else:
-            return False
-        
-    def has_lexicon_references(self):
-        if len(self.lexicon_references) > 0:
-            return True
-        else:
-            return False
+                    if isinstance(annotation, ELANAlignableAnnotation):
+                        new_annotation = ELANAlignableAnnotation(annotation.annotation_id, annotation.annotation_value, copy_time_slot(annotation.start_time_slot),
+                                                                 copy_time_slot(annotation.end_time_slot), piece, new_tier, annotation.svg_ref, annotation.external_ref)
+                    else:
+                        new_annotation = ELANRefAnnotation(annotation.annotation_id, annotation.annotation_value, annotation.annotation_ref, piece, new_tier,
+                                                           annotation.previous_annotation, annotation.external_ref)
 
-    def has_external_references(self):
-        if len(self.external_references) > 0:
-            return True
-        else:
-            return False
+                    new_tier.annotations.append(new_annotation)
+                    new_tier.annotations_dict[new_annotation.annotation_id] = new_annotation
 
-    def has_time_slots(self):
-        if len(self.time_slots_dict) > 0:
-            return True
-        else:
-            return False
+                piece.add_tier(new_tier)
 
-    def has_annotations(self):
-        if len(self.annotations_dict) > 0:
-            return True
-        else:
-            return False
+            for time_slot_id in sorted(time_slots, key=lambda time_slot_id: positions[time_slot_id]):
+                piece.add_time_slot(time_slots[time_slot_id])
 
-    def add_media_file(self, media_file):
-        
-        # Check type
-        if isinstance(media_file, ELANMediaDescriptor):
-            self.media_files.append(media_file)
-            self.media_files_dict[media_file.get_url()] = media_file
-        
-        else:
-            raise TypeError("Media file to be added has to be of type ELANMediaDescriptor.")
+            if rebase:
+                for media_descriptor in piece.media_files:
+                    media_descriptor.set_time_origin(str(int(media_descriptor.get_time_origin() or 0) + window_start))
 
-    def add_linked_file(self, linked_file):
-        
-        # Check type
-        if isinstance(linked_file, ELANLinkedFileDescriptor):
-            self.linked_files.append(linked_file)
-            self.linked_files_dict[linked_file.get_url()] = linked_file
-        
-        else:
-            raise TypeError("Linked file to be added has to be of type ELANLinkedFileDescriptor.")
-    
-    def add_tier(self, tier):
-        
-        # Check type
-        if isinstance(tier, ELANTier):
-            self.tiers.append(tier)
-            self.tiers_dict[tier.get_tier_id()] = tier
-            
-            # Add annotation to annotations_dict
-            for annotation in tier:
-                self.annotations_dict[annotation.get_annotation_id()] = annotation
-        
-        else:
-            raise TypeError("Tier to be added has to be of type ELANTier.")
+            if file_name_pattern is not None:
+                file_name = file_name_pattern.format(window + 1)
+                piece.write_elan_file(file_name)
+                results.append(file_name)
+            else:
+                results.append(piece)
+
+        return results
     
     def add_linguistic_type(self, linguistic_type):
         
@@ -3697,6 +7670,7 @@ class ELANFile:
         if isinstance(linguistic_type, ELANLinguisticType):
             self.linguistic_types.append(linguistic_type)
             self.linguistic_types_dict[linguistic_type.get_linguistic_type_id()] = linguistic_type
+            self.mark_modified()
         
         else:
             raise TypeError("Linguistic type to be added has to be of type ELANLinguisticType.")
@@ -3715,8 +7689,10 @@ class ELANFile:
         
         # Check type
         if isinstance(controlled_vocabulary, ELANControlledVocabulary):
+            self.unshare_controlled_vocabularies()
             self.controlled_vocabularies.append(controlled_vocabulary)
-            self.controlled_vocabularies_dict[controlled_vocabulary.get_id()] = controlled_vocabulary
+            self.controlled_vocabularies_dict[controlled_vocabulary.get_cv_id()] = controlled_vocabulary
+            self.mark_modified()
         
         else:
             raise TypeError("Controlled vocabulary to be added has to be of type ELANControlledVocabulary.")
@@ -3751,102 +7727,23 @@ class ELANFile:
             raise TypeError("Lexicon reference to be added has to be of type ELANLexiconReference.")
     
     def add_time_slot(self, time_slot):
+        self.copy_shared_time_order()
         self.time_order.add_time_slot(time_slot)
         self.time_slots_dict[time_slot.get_id()] = time_slot
 
-#         # Get original id of time_slot to be added
-#         original_id = time_slot.get_id()
-#         time_value = time_slot.get_time_value()
-#         
-#         # Mapping from old time order to new order
-#         time_order_mapping = {}
-#         
-#         # New time order
-#         new_time_order = ELANTimeOrder(self)
-#         
-#         offset = 0
-#         added = False
-#         for current_time_slot in self.time_order:
-#             
-#             # Does the current time slot come after the new time
-#             # slot to be inserted?
-#             if current_time_slot.get_time_value() > time_value and added is False:
-#                 
-#                 # Increase offset
-#                 offset = 1
-#                 
-#                 # Set id of new time slot to id of current time slot
-#                 new_id = current_time_slot.get_id()
-#                 time_slot.set_id(new_id)
-#                 
-#                 # Add new time slot to new time order
-#                 new_time_order.add_time_slot(time_slot)
-#                 
-#                 # Remember that the new time slot has been added
-#                 added = True
-# 
-#             # Get original id of current time slot
-#             old_id = current_time_slot.get_id()
-#             
-#             # Update annotation id of time_slot
-#             if offset > 0:
-#                 
-#                 match = re.search("^ts(\d+)$", old_id)
-#                 if match:
-#                     
-#                     old_number = int(match.group(1))
-#                     new_number = old_number + offset
-#                     new_id = "ts" + str(new_number)
-#                     
-#                     # Create entry in time order mapping
-#                     time_order_mapping[old_id] = new_id
-#                     
-#                     # Change id of current time slot
-#                     current_time_slot.set_id(new_id)
-#                 
-#                 else:
-#                     
-#                     raise("Could not match time slot id", old_id)
-#             
-#             else:
-#                 
-#                 # Leave id of current time slot unchanged
-#                 # and enter a corresponding mapping to
-#                 # time order mapping
-#                 time_order_mapping[old_id] = old_id
-#             
-#             # Add current time slot to new time order
-#             new_time_order.add_time_slot(current_time_slot)
-#         
-#         # Update annotations
-#         for annotation_id in self.annotations_dict:
-#             
-#             annotation = self.annotations_dict[annotation_id]
-# 
-#             # Set new start time slot
-#             old_start_time_slot = annotation.get_start_time_slot()
-#             if old_start_time_slot in time_order_mapping:
-#                 
-#                 annotation.set_start_time_slot(time_order_mapping[old_start_time_slot])
-#                
-#             # Set new end time slot
-#             old_end_time_slot = annotation.get_end_time_slot()
-#             if old_end_time_slot in time_order_mapping:
-#                 
-#                 annotation.set_end_time_slot(time_order_mapping[old_end_time_slot])
-#         
-#         # Sort time order
-#         self.time_order = sorted(new_time_order)
-#         
-#         # Update time slots dictionary
-#         self.time_slots_dict = {}
-#         
-#         for current_time_slot in self.time_order:
-#             
-#             self.time_slots_dict[current_time_slot.get_id()] = current_time_slot
-#         
-#         # Return new id of new time slot that was inserted
-#         return time_slot.get_id()
+    # Insert a time slot in time position (see ELANTimeOrder.insert_time_slot)
+    def insert_time_slot(self, time_slot, after=None):
+        self.copy_shared_time_order()
+        self.time_order.insert_time_slot(time_slot, after)
+        self.time_slots_dict[time_slot.get_id()] = time_slot
+        return time_slot
+
+    # Create a time slot with a new ID and insert it in time position
+    def new_time_slot(self, time_value=None, after=None):
+        self.copy_shared_time_order()
+        time_slot = self.time_order.new_time_slot(time_value, after)
+        self.time_slots_dict[time_slot.get_id()] = time_slot
+        return time_slot
 
     def get_media_file_by_url(self, url):
         if url in self.media_files_dict:
@@ -3869,18 +7766,23 @@ class ELANFile:
             return None
     
     def get_time_slot_by_id(self, time_slot_id):
+        self.copy_shared_time_order()
         if time_slot_id in self.time_slots_dict:
             return self.time_slots_dict[time_slot_id]
         else:
             return None
 
     def get_tier_by_id(self, tier_id):
-        if tier_id in self.tiers_dict:
+        if tier_id in self.shared_tiers:
+            return self.load_tier(tier_id)
+        elif tier_id in self.tiers_dict:
             return self.tiers_dict[tier_id]
         else:
             return None
 
     def get_annotation_by_id(self, annotation_id):
+        if annotation_id not in self.annotations_dict and self.shared_tiers:
+            self.load_shared_tiers()
         if annotation_id in self.annotations_dict:
             return self.annotations_dict[annotation_id]
         else:
@@ -3899,12 +7801,26 @@ class ELANFile:
             return None
 
     def get_controlled_vocabulary_by_id(self, cv_id):
-        if cv_id in self.cvs_dict:
-            return self.cvs_dict[cv_id]
+        self.unshare_controlled_vocabularies()
+        if cv_id in self.controlled_vocabularies_dict:
+            return self.controlled_vocabularies_dict[cv_id]
         else:
             return None
 
+    # Return the controlled vocabulary referenced by the linguistic
+    # type of a tier, or None if the tier is not restricted to one
+    def get_controlled_vocabulary_for_tier(self, tier):
+
+        tier = self.resolve_tier_to_read(tier)
+
+        linguistic_type = self.get_linguistic_type_by_id(tier.get_linguistic_type())
+        if linguistic_type is None or not linguistic_type.has_controlled_vocabulary_ref():
+            return None
+
+        return self.get_controlled_vocabulary_by_id(linguistic_type.get_controlled_vocabulary_ref())
+
     def get_cv_entry_by_value(self, cv_id, value):
+        self.unshare_controlled_vocabularies()
         return self.controlled_vocabularies_dict[cv_id].get_cv_entry_by_value(value)
     
     def get_external_reference_by_id(self, ext_ref_id):
@@ -3918,3 +7834,508 @@ class ELANFile:
             return self.lexicon_refs_dict[lexicon_ref_id]
         else:
             return None
+
+    # Return the ELANTier object for a tier given as object or as tier ID
+    def resolve_tier(self, tier):
+
+        if isinstance(tier, ELANTier):
+            return tier
+
+        if tier in self.shared_tiers:
+            return self.load_tier(tier)
+
+        if tier in self.tiers_dict:
+            return self.tiers_dict[tier]
+        else:
+            raise KeyError("Unknown tier ID: " + str(tier))
+
+    # Return (start time, end time, annotation) triples for all time-aligned
+    # annotations of a tier, sorted by start and end time. Annotations
+    # anchored to unaligned time slots are left out.
+    def get_time_intervals(self, tier):
+
+        tier = self.resolve_tier(tier)
+        time_slots_dict = self.time_slots_dict
+
+        intervals = []
+        for annotation in tier:
+
+            if not isinstance(annotation, ELANAlignableAnnotation):
+                continue
+
+            start_time_slot = time_slots_dict.get(annotation.start_time_slot)
+            end_time_slot = time_slots_dict.get(annotation.end_time_slot)
+
+            if start_time_slot is None or end_time_slot is None:
+                continue
+
+            if start_time_slot.time_value is None or end_time_slot.time_value is None:
+                continue
+
+            intervals.append((start_time_slot.time_value, end_time_slot.time_value, annotation))
+
+        intervals.sort(key=lambda interval: (interval[0], interval[1]))
+
+        return intervals
+
+    # Collect the timings and values of the annotations of the given tiers
+    # (by default all tiers) in a single pass. Returns a dictionary of typed
+    # arrays (start, end, tier, value, aligned), one entry per annotation,
+    # the codebook of annotation values that the value codes refer to, and
+    # the list of tier IDs that the tier indexes refer to. Pass an existing
+    # codebook to share codes between calls (it is extended in place).
+    def get_annotation_columns(self, tiers=None, codebook=None):
+
+        if tiers is None:
+            tiers = self.get_tiers_to_read()
+
+        tiers = [self.resolve_tier_to_read(tier) for tier in tiers]
+
+        if codebook is None:
+            codebook = []
+
+        codes = {}
+        for code, value in enumerate(codebook):
+            codes.setdefault(value, code)
+
+        starts = array("q")
+        ends = array("q")
+        tier_indexes = array("i")
+        values = array("i")
+        aligned = array("b")
+
+        time_slots_dict = self.time_slots_dict
+
+        for tier_index, tier in enumerate(tiers):
+            for annotation in tier.annotations:
+
+                value = annotation.annotation_value
+                code = codes.get(value)
+                if code is None:
+                    code = len(codebook)
+                    codes[value] = code
+                    codebook.append(value)
+
+                values.append(code)
+                tier_indexes.append(tier_index)
+
+                start = None
+                end = None
+                if isinstance(annotation, ELANAlignableAnnotation):
+                    start_time_slot = time_slots_dict.get(annotation.start_time_slot)
+                    end_time_slot = time_slots_dict.get(annotation.end_time_slot)
+                    if start_time_slot is not None and end_time_slot is not None:
+                        start = start_time_slot.time_value
+                        end = end_time_slot.time_value
+
+                if start is None or end is None:
+                    starts.append(0)
+                    ends.append(0)
+                    aligned.append(0)
+                else:
+                    starts.append(start)
+                    ends.append(end)
+                    aligned.append(1)
+
+        columns = {
+            "start": starts,
+            "end": ends,
+            "tier": tier_indexes,
+            "value": values,
+            "aligned": aligned,
+        }
+
+        return columns, codebook, [tier.get_tier_id() for tier in tiers]
+
+    # Export the timings and values of the annotations of the given tiers
+    # (by default all tiers) as a NumPy structured array with the fields
+    # in NUMPY_ANNOTATION_FIELDS, one row per annotation. Annotation values
+    # are replaced by codes indexing the codebook (see
+    # get_annotation_columns). Returns the array, the codebook and the list
+    # of tier IDs that the tier field refers to.
+    def to_numpy(self, tiers=None, codebook=None):
+
+        if numpy is None:
+            raise RuntimeError("Exporting annotations to arrays requires NumPy.")
+
+        columns, codebook, tier_ids = self.get_annotation_columns(tiers, codebook)
+
+        # Convert the columns without further Python-level loops
+        result = numpy.zeros(len(columns["value"]), dtype=NUMPY_ANNOTATION_FIELDS)
+
+        if len(result) > 0:
+            result["start"] = numpy.asarray(columns["start"], dtype=numpy.int64)
+            result["end"] = numpy.asarray(columns["end"], dtype=numpy.int64)
+            result["duration"] = result["end"] - result["start"]
+            result["tier"] = numpy.asarray(columns["tier"], dtype=numpy.int32)
+            result["value"] = numpy.asarray(columns["value"], dtype=numpy.int32)
+            result["aligned"] = numpy.asarray(columns["aligned"], dtype=numpy.int8).astype(bool)
+
+        return result, codebook, tier_ids
+
+    # Compute annotation statistics per tier, per participant and for the
+    # whole file (see ELANStatistics). The result is computed in one pass
+    # over all annotations (vectorised if NumPy is available) and cached
+    # until the file is modified; treat it as read-only and use
+    # ELANStatistics.combine to aggregate several files.
+    def statistics(self):
+
+        tiers = self.get_tiers_to_read()
+
+        if self.statistics_cache is not None and self.statistics_revision == self.revision:
+            return self.statistics_cache
+
+        tier_statistics = {}
+        participant_statistics = {}
+
+        if numpy is not None:
+
+            data, codebook, tier_ids = self.to_numpy()
+
+            empty_values = numpy.array([value is None or value == "" for value in codebook], dtype=bool)
+
+            # Annotations are grouped by tier, in the order of the tiers
+            boundaries = numpy.searchsorted(data["tier"], numpy.arange(len(tier_ids) + 1)).tolist()
+
+            for tier_index, tier_id in enumerate(tier_ids):
+                group = ELANAnnotationStatistics()
+                group.add_array(data[boundaries[tier_index]:boundaries[tier_index + 1]], empty_values, codebook)
+                tier_statistics[tier_id] = group
+
+        else:
+
+            columns, codebook, tier_ids = self.get_annotation_columns()
+
+            empty_values = [value is None or value == "" for value in codebook]
+
+            groups = [ELANAnnotationStatistics() for tier_id in tier_ids]
+
+            for start, end, tier_index, code, aligned in zip(columns["start"], columns["end"], columns["tier"], columns["value"], columns["aligned"]):
+                if aligned:
+                    groups[tier_index].add(end - start, codebook[code], empty_values[code])
+                else:
+                    groups[tier_index].add(None, codebook[code], empty_values[code])
+
+            for tier_index, tier_id in enumerate(tier_ids):
+                tier_statistics[tier_id] = groups[tier_index]
+
+        # Aggregate tiers by participant and over the whole file
+        totals = ELANAnnotationStatistics()
+        for tier in tiers:
+            group = tier_statistics[tier.get_tier_id()]
+
+            if tier.get_participant() not in participant_statistics:
+                participant_statistics[tier.get_participant()] = ELANAnnotationStatistics()
+
+            participant_statistics[tier.get_participant()].merge(group)
+            totals.merge(group)
+
+        self.statistics_cache = ELANStatistics(totals, tier_statistics, participant_statistics, file_count=1)
+        self.statistics_revision = self.revision
+
+        return self.statistics_cache
+
+    # Return the tiers ordered such that every tier comes after its parent
+    # tier. Tiers whose parent is missing or part of a cycle come last.
+    def get_tiers_in_hierarchy_order(self):
+
+        self.load_shared_tiers()
+
+        return self.order_tiers_by_hierarchy(self.tiers)
+
+    # Order a list of tiers such that every tier comes after its parent
+    # tier (see get_tiers_in_hierarchy_order)
+    def order_tiers_by_hierarchy(self, tiers):
+
+        tier_ids = set(tier.get_tier_id() for tier in tiers)
+
+        children = {}
+        roots = []
+        for tier in tiers:
+            parent_tier_ref = tier.get_parent_tier_ref()
+            if parent_tier_ref is None or parent_tier_ref not in tier_ids:
+                roots.append(tier)
+            else:
+                children.setdefault(parent_tier_ref, []).append(tier)
+
+        ordered = []
+        queue = deque(roots)
+        while queue:
+            tier = queue.popleft()
+            ordered.append(tier)
+            queue.extend(children.get(tier.get_tier_id(), []))
+
+        if len(ordered) < len(tiers):
+            visited = set(id(tier) for tier in ordered)
+            ordered.extend(tier for tier in tiers if id(tier) not in visited)
+
+        return ordered
+
+    # Return a dictionary from time slot IDs to time values in which
+    # unaligned time slots (e.g. between the annotations of a
+    # Time_Subdivision tier) are spaced evenly between the time-aligned
+    # time slots around them in the time order. Unaligned time slots at the
+    # start or end of the time order get None.
+    def get_time_slot_values(self):
+
+        time_values = {}
+        previous_value = None
+        unaligned = []
+
+        for time_slot in self.time_order:
+
+            if time_slot.time_value is None:
+                unaligned.append(time_slot.ID)
+                continue
+
+            count = len(unaligned) + 1
+            for position, time_slot_id in enumerate(unaligned):
+                if previous_value is None:
+                    time_values[time_slot_id] = None
+                else:
+                    time_values[time_slot_id] = previous_value + (time_slot.time_value - previous_value) * (position + 1) // count
+
+            unaligned = []
+            time_values[time_slot.ID] = time_slot.time_value
+            previous_value = time_slot.time_value
+
+        for time_slot_id in unaligned:
+            time_values[time_slot_id] = None
+
+        return time_values
+
+    # Compute the effective time span of every annotation in one pass over
+    # the tier hierarchy. Alignable annotations span their own time slots,
+    # with unaligned time slots placed evenly between their time-aligned
+    # neighbours (see get_time_slot_values). Reference annotations inherit the span of their parent annotation; on
+    # Symbolic_Subdivision tiers the span of the parent is divided evenly
+    # among the children in the order of their PREVIOUS_ANNOTATION chain.
+    # Returns a dictionary from annotation IDs to (start, end) pairs, with
+    # None for times that cannot be determined. The result is cached until
+    # the file is modified.
+    def get_effective_times(self):
+
+        if self.effective_times_cache is not None and self.effective_times_revision == self.revision:
+            return self.effective_times_cache
+
+        tiers = self.get_tiers_to_read()
+
+        effective_times = {}
+        time_values = self.get_time_slot_values()
+
+        for tier in self.order_tiers_by_hierarchy(tiers):
+
+            # Siblings sharing a parent annotation, in document order
+            siblings = {}
+
+            for annotation in tier.annotations:
+
+                if isinstance(annotation, ELANAlignableAnnotation):
+                    effective_times[annotation.annotation_id] = (time_values.get(annotation.start_time_slot), time_values.get(annotation.end_time_slot))
+
+                else:
+                    siblings.setdefault(annotation.annotation_ref, []).append(annotation)
+
+            if not siblings:
+                continue
+
+            linguistic_type = self.linguistic_types_dict.get(tier.get_linguistic_type())
+            subdivide = linguistic_type is not None and linguistic_type.get_constraints() == "Symbolic_Subdivision"
+
+            for annotation_ref, group in siblings.items():
+
+                start, end = effective_times.get(annotation_ref, (None, None))
+
+                if not subdivide or len(group) == 1:
+                    for annotation in group:
+                        effective_times[annotation.annotation_id] = (start, end)
+                    continue
+
+                group = self.order_annotation_chain(group)
+
+                if start is None or end is None:
+                    for annotation in group:
+                        effective_times[annotation.annotation_id] = (None, None)
+                    continue
+
+                count = len(group)
+                for position, annotation in enumerate(group):
+                    effective_times[annotation.annotation_id] = (
+                        start + (end - start) * position // count,
+                        start + (end - start) * (position + 1) // count)
+
+        self.effective_times_cache = effective_times
+        self.effective_times_revision = self.revision
+
+        return effective_times
+
+    # Return a dictionary from annotation IDs to the lists of reference
+    # annotations referring to them, in document order. The index is built
+    # in one pass over all annotations and cached until the file is modified.
+    def get_children_index(self):
+
+        if self.children_index_cache is not None and self.children_index_revision == self.revision:
+            return self.children_index_cache
+
+        self.load_all_tiers()
+
+        children_index = {}
+        for tier in self.tiers:
+            for annotation in tier.annotations:
+                if isinstance(annotation, ELANRefAnnotation):
+                    children_index.setdefault(annotation.annotation_ref, []).append(annotation)
+
+        self.children_index_cache = children_index
+        self.children_index_revision = self.revision
+
+        return children_index
+
+    # Return the reference annotations referring to an annotation (given as
+    # object or as annotation ID), ordered by their PREVIOUS_ANNOTATION chain
+    def get_child_annotations(self, annotation):
+
+        if isinstance(annotation, ELANAnnotation):
+            annotation = annotation.get_annotation_id()
+
+        children = self.get_children_index().get(annotation, [])
+
+        if len(children) > 1:
+            return self.order_annotation_chain(children)
+        else:
+            return list(children)
+
+    # Order sibling reference annotations by their PREVIOUS_ANNOTATION chain.
+    # Annotations that cannot be reached from the start of the chain keep
+    # their document order after the chained ones.
+    @staticmethod
+    def order_annotation_chain(annotations):
+
+        following = {}
+        heads = []
+        annotation_ids = set(annotation.annotation_id for annotation in annotations)
+
+        for annotation in annotations:
+            if annotation.previous_annotation is None or annotation.previous_annotation not in annotation_ids:
+                heads.append(annotation)
+            else:
+                following.setdefault(annotation.previous_annotation, []).append(annotation)
+
+        ordered = []
+        visited = set()
+        for head in heads:
+            annotation = head
+            while annotation is not None and annotation.annotation_id not in visited:
+                ordered.append(annotation)
+                visited.add(annotation.annotation_id)
+                next_annotations = following.get(annotation.annotation_id)
+                annotation = next_annotations[0] if next_annotations else None
+
+        if len(ordered) < len(annotations):
+            ordered.extend(annotation for annotation in annotations if annotation.annotation_id not in visited)
+
+        return ordered
+
+    # Join the time-aligned annotations of two tiers on a temporal relation
+    # and yield the matching (annotation of tier_a, annotation of tier_b)
+    # pairs. Supported predicates:
+    #
+    #   overlaps    a and b share some time (or are at most max_gap apart)
+    #   contains    a covers b (boundaries may differ by up to max_gap)
+    #   during      b covers a (boundaries may differ by up to max_gap)
+    #   meets       b starts where a ends (give or take max_gap)
+    #   before      b starts after a ends (at most max_gap later, if given)
+    #
+    # Both tiers are sorted once and then swept in time order, so the
+    # cost is O((n + m) log(n + m) + k) for k matching pairs.
+    def temporal_join(self, tier_a, tier_b, predicate="overlaps", max_gap=None):
+
+        intervals_a = self.get_time_intervals(tier_a)
+        intervals_b = self.get_time_intervals(tier_b)
+
+        # Relations between the end of a and the start of b can be
+        # answered with binary searches on the start times of b
+        if predicate == "meets" or predicate == "before":
+
+            if predicate == "meets":
+                low = -(max_gap or 0)
+                high = max_gap or 0
+            else:
+                low = 0
+                high = max_gap
+
+            starts_b = [interval[0] for interval in intervals_b]
+
+            for start_a, end_a, annotation_a in intervals_a:
+
+                first = bisect_left(starts_b, end_a + low)
+                if high is None:
+                    last = len(starts_b)
+                else:
+                    last = bisect_right(starts_b, end_a + high)
+
+                for position in range(first, last):
+                    yield annotation_a, intervals_b[position][2]
+
+            return
+
+        if predicate not in ("overlaps", "contains", "during"):
+            raise RuntimeError("Unknown temporal predicate: " + str(predicate))
+
+        gap = max_gap or 0
+
+        # Overlaps require a shared stretch of time, containment
+        # also holds for intervals that only touch the boundaries
+        strict = predicate == "overlaps"
+
+        # Active intervals of both tiers, with heaps ordered by end time
+        active_a = {}
+        active_b = {}
+        heap_a = []
+        heap_b = []
+
+        position_a = 0
+        position_b = 0
+
+        while position_a < len(intervals_a) or position_b < len(intervals_b):
+
+            # Process the interval with the next start time
+            # (on ties, intervals of tier_a come first)
+            if position_b >= len(intervals_b) or (position_a < len(intervals_a) and intervals_a[position_a][0] <= intervals_b[position_b][0]):
+                interval = intervals_a[position_a]
+                active, heap, other_active, other_heap = active_a, heap_a, active_b, heap_b
+                key = position_a
+                position_a += 1
+                from_a = True
+            else:
+                interval = intervals_b[position_b]
+                active, heap, other_active, other_heap = active_b, heap_b, active_a, heap_a
+                key = position_b
+                position_b += 1
+                from_a = False
+
+            start = interval[0]
+
+            # Remove intervals of the other tier that ended before this one started
+            while other_heap and (other_heap[0][0] <= start if strict else other_heap[0][0] < start):
+                del other_active[heapq.heappop(other_heap)[1]]
+
+            # All remaining intervals of the other tier overlap this one
+            for other_interval in other_active.values():
+
+                if from_a:
+                    interval_a, interval_b = interval, other_interval
+                else:
+                    interval_a, interval_b = other_interval, interval
+
+                if predicate == "contains":
+                    if interval_a[0] - gap > interval_b[0] or interval_b[1] > interval_a[1] + gap:
+                        continue
+
+                elif predicate == "during":
+                    if interval_b[0] - gap > interval_a[0] or interval_a[1] > interval_b[1] + gap:
+                        continue
+
+                yield interval_a[2], interval_b[2]
+
+            active[key] = interval
+            heapq.heappush(heap, (interval[1] + gap, key))
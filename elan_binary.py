@@ -0,0 +1,521 @@
+# Binary companion format for ELAN files
+#
+# An EAF binary file (conventionally with the extension .eafb) stores the
+# complete contents of an ELANFile in a form that can be opened with mmap
+# and read tier by tier. Loading a single tier only touches the pages of
+# its directory entry, its annotation records, the time slots and the
+# strings it refers to. Converting the whole file back yields an ELANFile
+# that produces the same EAF XML as the original.
+#
+# Layout (all integers in little-endian byte order, sections 8-byte aligned):
+#
+#   header              magic b"EAFBIN01" (8 bytes), format version (uint32),
+#                       number of sections (uint32), total size (uint64)
+#   section table       one (offset, item count) pair of uint64 per section,
+#                       in the order given by SECTIONS below
+#   STRING_OFFSETS      uint64[n + 1], byte offsets into STRING_DATA
+#   STRING_DATA         UTF-8 encoded strings of the string pool
+#   METADATA            UTF-8 encoded JSON object with the header, media and
+#                       linked file descriptors, properties, linguistic
+#                       types, locales, constraints, controlled vocabularies,
+#                       lexicon references and external references
+#   TIME_SLOT_ID        int64[number of time slots], string indexes
+#   TIME_VALUE          int64[number of time slots], NULL_TIME if unaligned
+#   TIER_DIRECTORY      int64[number of tiers * TIER_RECORD_SIZE]
+#   ANNOTATIONS         int64[number of annotations * ANNOTATION_RECORD_SIZE]
+#
+# Time slots keep their order from the TIME_ORDER element. A tier directory
+# entry consists of the string indexes of TIER_ID, PARTICIPANT, ANNOTATOR,
+# LINGUISTIC_TYPE_REF, DEFAULT_LOCALE and PARENT_REF, followed by the row of
+# its first annotation record and its number of annotations. An annotation
+# record consists of its kind (ALIGNABLE or REF), the string indexes of
+# ANNOTATION_ID and ANNOTATION_VALUE, two references, and the string indexes
+# of SVG_REF and EXT_REF. For alignable annotations the references are the
+# rows of TIME_SLOT_REF1 and TIME_SLOT_REF2 in the time slot arrays, for
+# reference annotations the string indexes of ANNOTATION_REF and
+# PREVIOUS_ANNOTATION. String index -1 stands for None.
+
+import json
+import mmap
+import struct
+import sys
+from array import array
+
+from elan import ELANFile, ELANTimeSlot, ELANTier, ELANAlignableAnnotation, ELANRefAnnotation
+from elan import ELANMediaDescriptor, ELANLinkedFileDescriptor, ELANLinguisticType, ELANConstraint, ELANLocale
+from elan import ELANControlledVocabulary, ELANControlledVocabularyEntry, ELANLexiconReference, ELANExternalReference
+from elan_snapshot import ELANStringTable, align_offset, NULL_TIME, NULL_INDEX
+
+# Magic number and version of the binary format
+BINARY_MAGIC = b"EAFBIN01"
+BINARY_VERSION = 1
+
+# Header: magic, version, number of sections, total size
+HEADER_FORMAT = "<8sIIQ"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+# Entry of the section table: offset, number of items
+SECTION_ENTRY_FORMAT = "<QQ"
+SECTION_ENTRY_SIZE = struct.calcsize(SECTION_ENTRY_FORMAT)
+
+# Sections of the binary file with their array type codes
+SECTIONS = [
+    ("STRING_OFFSETS", "Q"),
+    ("STRING_DATA", "B"),
+    ("METADATA", "B"),
+    ("TIME_SLOT_ID", "q"),
+    ("TIME_VALUE", "q"),
+    ("TIER_DIRECTORY", "q"),
+    ("ANNOTATIONS", "q"),
+]
+
+# Number of int64 fields per tier directory entry and annotation record
+TIER_RECORD_SIZE = 8
+ANNOTATION_RECORD_SIZE = 7
+
+# Kinds of annotation records
+ALIGNABLE = 0
+REF = 1
+
+# Classes whose objects are stored field by field in the metadata
+METADATA_CLASSES = {
+    "media_files": ELANMediaDescriptor,
+    "linked_files": ELANLinkedFileDescriptor,
+    "locales": ELANLocale,
+    "constraints": ELANConstraint,
+    "lexicon_references": ELANLexiconReference,
+    "external_references": ELANExternalReference,
+}
+
+# Attributes stored in the metadata for the objects of each class.
+# References to other objects (the ELAN file of a linguistic type, the
+# entries of a controlled vocabulary and the vocabulary of an entry) are
+# restored separately.
+METADATA_FIELDS = {
+    ELANMediaDescriptor: ("media_url", "mime_type", "relative_media_url", "time_origin", "extracted_from"),
+    ELANLinkedFileDescriptor: ("link_url", "mime_type", "relative_link_url", "time_origin", "associated_with"),
+    ELANLocale: ("language_code", "country_code", "variant"),
+    ELANConstraint: ("stereotype", "description"),
+    ELANLexiconReference: ("lex_ref_id", "lex_ref_name", "lex_ref_type", "url", "lexicon_id", "lexicon_name", "datcat_id", "datcat_name"),
+    ELANExternalReference: ("ext_ref_id", "ext_ref_type", "value"),
+    ELANLinguisticType: ("linguistic_type_id", "time_alignable", "constraints", "graphic_references", "controlled_vocabulary_ref", "external_ref", "lexicon_ref"),
+    ELANControlledVocabulary: ("cv_id", "description", "ext_ref"),
+    ELANControlledVocabularyEntry: ("value", "description", "ext_ref"),
+}
+
+
+# Store the metadata fields of an object in a dictionary
+def _object_to_dict(obj):
+
+    fields = {}
+    for key in METADATA_FIELDS[type(obj)]:
+        fields[key] = getattr(obj, key)
+
+    return fields
+
+
+# Reconstruct an object from a dictionary of its metadata fields (the
+# constructor is bypassed, since it expects the values as found in XML)
+def _object_from_dict(cls, fields):
+
+    obj = cls.__new__(cls)
+    for key in METADATA_FIELDS[cls]:
+        setattr(obj, key, fields.get(key))
+
+    return obj
+
+
+# Convert arrays to little-endian byte order if necessary
+def _to_little_endian(column):
+
+    if sys.byteorder != "little" and column.itemsize > 1:
+        column = array(column.typecode, column)
+        column.byteswap()
+
+    return column
+
+
+# Collect the document-level metadata of an ELANFile object
+def _metadata_to_dict(elan_file):
+
+    metadata = {
+        "url": elan_file.get_url(),
+        "author": elan_file.get_author(),
+        "date": elan_file.get_date(),
+        "format": elan_file.get_format(),
+        "version": elan_file.get_version(),
+        "media_file": elan_file.get_media_file(),
+        "time_units": elan_file.get_time_units(),
+        "properties": list(elan_file.get_properties().items()),
+    }
+
+    for key in METADATA_CLASSES:
+        metadata[key] = [_object_to_dict(obj) for obj in getattr(elan_file, key)]
+
+    metadata["linguistic_types"] = [_object_to_dict(linguistic_type) for linguistic_type in elan_file.get_linguistic_types()]
+
+    metadata["controlled_vocabularies"] = []
+    for controlled_vocabulary in elan_file.get_controlled_vocabularies():
+        fields = _object_to_dict(controlled_vocabulary)
+        fields["cv_entries"] = [_object_to_dict(cv_entry) for cv_entry in controlled_vocabulary]
+        metadata["controlled_vocabularies"].append(fields)
+
+    return metadata
+
+
+# Restore the document-level metadata of an ELANFile object
+def _metadata_from_dict(metadata, elan_file):
+
+    elan_file.set_url(metadata["url"])
+    elan_file.set_author(metadata["author"])
+    elan_file.set_date(metadata["date"])
+    elan_file.set_format(metadata["format"])
+    elan_file.set_version(metadata["version"])
+    elan_file.set_media_file(metadata["media_file"])
+    elan_file.set_time_units(metadata["time_units"])
+
+    for name, value in metadata["properties"]:
+        elan_file.set_property(name, value)
+
+    for fields in metadata["media_files"]:
+        elan_file.add_media_file(_object_from_dict(ELANMediaDescriptor, fields))
+
+    for fields in metadata["linked_files"]:
+        elan_file.add_linked_file(_object_from_dict(ELANLinkedFileDescriptor, fields))
+
+    for fields in metadata["linguistic_types"]:
+        linguistic_type = _object_from_dict(ELANLinguisticType, fields)
+        linguistic_type.set_ELAN_file(elan_file)
+        elan_file.add_linguistic_type(linguistic_type)
+
+    for fields in metadata["locales"]:
+        elan_file.add_locale(_object_from_dict(ELANLocale, fields))
+
+    for fields in metadata["constraints"]:
+        elan_file.add_constraint(_object_from_dict(ELANConstraint, fields))
+
+    for fields in metadata["controlled_vocabularies"]:
+        controlled_vocabulary = _object_from_dict(ELANControlledVocabulary, fields)
+        controlled_vocabulary.cv_entries = []
+        controlled_vocabulary.cv_entries_dict = {}
+
+        for entry_fields in fields["cv_entries"]:
+            cv_entry = _object_from_dict(ELANControlledVocabularyEntry, entry_fields)
+            cv_entry.set_cv_ref(controlled_vocabulary)
+            controlled_vocabulary.cv_entries.append(cv_entry)
+            controlled_vocabulary.cv_entries_dict[cv_entry.get_value()] = cv_entry
+
+        elan_file.add_controlled_vocabulary(controlled_vocabulary)
+
+    for fields in metadata["lexicon_references"]:
+        elan_file.add_lexicon_reference(_object_from_dict(ELANLexiconReference, fields))
+
+    for fields in metadata["external_references"]:
+        elan_file.add_external_reference(_object_from_dict(ELANExternalReference, fields))
+
+
+# Write an ELANFile object to a binary file at path
+def write_binary_file(elan_file, path):
+
+    strings = ELANStringTable()
+    columns = {}
+
+    for section_name, type_code in SECTIONS:
+        columns[section_name] = array(type_code)
+
+    # Packed time slot arrays
+    time_slot_rows = {}
+    if elan_file.has_time_order():
+        for time_slot in elan_file.get_time_order_to_read():
+            time_slot_rows[time_slot.get_id()] = len(columns["TIME_SLOT_ID"])
+            columns["TIME_SLOT_ID"].append(strings.add(time_slot.get_id()))
+
+            if time_slot.has_time_value():
+                columns["TIME_VALUE"].append(time_slot.get_time_value())
+            else:
+                columns["TIME_VALUE"].append(NULL_TIME)
+
+    # Tier directory and annotation records, tier by tier, so that
+    # the strings of a tier end up close to each other in the pool
+    annotation_count = 0
+    for tier in elan_file.get_tiers_to_read():
+
+        columns["TIER_DIRECTORY"].extend([
+            strings.add(tier.get_tier_id()),
+            strings.add(tier.get_participant()),
+            strings.add(tier.get_annotator()),
+            strings.add(tier.get_linguistic_type()),
+            strings.add(tier.get_default_locale()),
+            strings.add(tier.get_parent_tier_ref()),
+            annotation_count,
+            len(tier),
+        ])
+
+        for annotation in tier:
+
+            if isinstance(annotation, ELANAlignableAnnotation):
+
+                if annotation.get_start_time_slot() not in time_slot_rows or annotation.get_end_time_slot() not in time_slot_rows:
+                    raise KeyError("Annotation " + annotation.get_annotation_id() + " refers to an unknown time slot.")
+
+                columns["ANNOTATIONS"].extend([
+                    ALIGNABLE,
+                    strings.add(annotation.get_annotation_id()),
+                    strings.add(annotation.get_annotation_value()),
+                    time_slot_rows[annotation.get_start_time_slot()],
+                    time_slot_rows[annotation.get_end_time_slot()],
+                    strings.add(annotation.get_svg_ref()),
+                    strings.add(annotation.get_external_ref()),
+                ])
+
+            else:
+
+                columns["ANNOTATIONS"].extend([
+                    REF,
+                    strings.add(annotation.get_annotation_id()),
+                    strings.add(annotation.get_annotation_value()),
+                    strings.add(annotation.get_annotation_ref()),
+                    strings.add(annotation.get_previous_annotation_ref()),
+                    NULL_INDEX,
+                    strings.add(annotation.get_external_ref()),
+                ])
+
+            annotation_count += 1
+
+    columns["STRING_OFFSETS"], columns["STRING_DATA"] = strings.to_columns()
+    columns["METADATA"] = array("B", json.dumps(_metadata_to_dict(elan_file)).encode("utf-8"))
+
+    # Compute the offsets of all sections
+    offset = align_offset(HEADER_SIZE + len(SECTIONS) * SECTION_ENTRY_SIZE)
+    section_table = []
+    for section_name, type_code in SECTIONS:
+        column = columns[section_name]
+        section_table.append((offset, len(column)))
+        offset = align_offset(offset + len(column) * column.itemsize)
+
+    total_size = offset
+
+    with open(path, "wb") as output_file:
+
+        output_file.write(struct.pack(HEADER_FORMAT, BINARY_MAGIC, BINARY_VERSION, len(SECTIONS), total_size))
+
+        for section_offset, item_count in section_table:
+            output_file.write(struct.pack(SECTION_ENTRY_FORMAT, section_offset, item_count))
+
+        for position, (section_name, type_code) in enumerate(SECTIONS):
+            output_file.seek(section_table[position][0])
+            _to_little_endian(columns[section_name]).tofile(output_file)
+
+        # Pad the file to its full size
+        output_file.truncate(total_size)
+
+
+# Class to model an opened binary ELAN file
+class ELANBinaryFile:
+
+    # Path of the binary file
+    path = None
+
+    # mmap object of the file
+    mapping = None
+
+    # Read-only memoryview of the whole file
+    buffer = None
+
+    # Dictionary from section names to typed memoryviews
+    columns = None
+
+    # Cache of decoded strings
+    strings_cache = None
+
+    # Dictionary view from tier IDs to rows in the tier directory
+    tier_rows_dict = None
+
+    # Constructor
+    def __init__(self, path):
+        self.path = path
+        self.strings_cache = {}
+
+        with open(path, "rb") as input_file:
+            self.mapping = mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.buffer = memoryview(self.mapping)
+
+        magic, version, section_count, total_size = struct.unpack_from(HEADER_FORMAT, self.buffer, 0)
+
+        if magic != BINARY_MAGIC:
+            raise RuntimeError("File " + str(path) + " is not an EAF binary file.")
+
+        if version != BINARY_VERSION:
+            raise RuntimeError("Unsupported EAF binary file version: " + str(version))
+
+        if section_count != len(SECTIONS):
+            raise RuntimeError("Unexpected number of sections in EAF binary file: " + str(section_count))
+
+        if sys.byteorder != "little":
+            raise RuntimeError("EAF binary files can only be mapped on little-endian machines.")
+
+        # Construct zero-copy views on all sections
+        self.columns = {}
+        for position, (section_name, type_code) in enumerate(SECTIONS):
+            offset, item_count = struct.unpack_from(SECTION_ENTRY_FORMAT, self.buffer, HEADER_SIZE + position * SECTION_ENTRY_SIZE)
+            item_size = array(type_code).itemsize
+            self.columns[section_name] = self.buffer[offset:offset + item_count * item_size].cast(type_code)
+
+        # Construct the dictionary view on the tier directory
+        self.tier_rows_dict = {}
+        for row in range(self.get_tier_count()):
+            self.tier_rows_dict[self.get_string(self.columns["TIER_DIRECTORY"][row * TIER_RECORD_SIZE])] = row
+
+    # Release all views on the file and close it
+    def close(self):
+
+        if self.columns is not None:
+            for column in self.columns.values():
+                column.release()
+            self.columns = None
+
+        if self.buffer is not None:
+            self.buffer.release()
+            self.buffer = None
+
+        if self.mapping is not None:
+            self.mapping.close()
+            self.mapping = None
+
+    # Getter methods
+    def get_path(self):
+        return self.path
+
+    def get_string(self, index):
+
+        if index == NULL_INDEX:
+            return None
+
+        if index not in self.strings_cache:
+            offsets = self.columns["STRING_OFFSETS"]
+            self.strings_cache[index] = bytes(self.columns["STRING_DATA"][offsets[index]:offsets[index + 1]]).decode("utf-8")
+
+        return self.strings_cache[index]
+
+    def get_metadata(self):
+        return json.loads(bytes(self.columns["METADATA"]).decode("utf-8"))
+
+    def get_tier_count(self):
+        return len(self.columns["TIER_DIRECTORY"]) // TIER_RECORD_SIZE
+
+    def get_tier_ids(self):
+        return list(self.tier_rows_dict)
+
+    def has_tier(self, tier_id):
+        if tier_id in self.tier_rows_dict:
+            return True
+        else:
+            return False
+
+    # Construct an empty ELANFile object carrying the metadata of the file
+    def new_elan_file(self):
+
+        elan_file = ELANFile()
+        _metadata_from_dict(self.get_metadata(), elan_file)
+
+        return elan_file
+
+    # Add the time slot in the given row to an ELANFile object
+    def _add_time_slot(self, elan_file, row):
+
+        time_slot_id = self.get_string(self.columns["TIME_SLOT_ID"][row])
+
+        if time_slot_id not in elan_file.get_time_slots_dict():
+
+            time_value = self.columns["TIME_VALUE"][row]
+            if time_value == NULL_TIME:
+                time_value = None
+
+            elan_file.add_time_slot(ELANTimeSlot(time_slot_id, time_value))
+
+        return time_slot_id
+
+    # Load the tier with the given ID into an ELANFile object (a new one
+    # carrying only the metadata if none is given), adding the time slots
+    # referenced by its annotations, and return the ELANTier object
+    def load_tier(self, tier_id, elan_file=None):
+
+        if tier_id not in self.tier_rows_dict:
+            raise KeyError("No tier with the ID " + str(tier_id) + " found.")
+
+        if elan_file is None:
+            elan_file = self.new_elan_file()
+
+        directory = self.columns["TIER_DIRECTORY"]
+        records = self.columns["ANNOTATIONS"]
+        base = self.tier_rows_dict[tier_id] * TIER_RECORD_SIZE
+
+        tier = ELANTier(tier_id, self.get_string(directory[base + 3]), elan_file,
+                        participant=self.get_string(directory[base + 1]),
+                        annotator=self.get_string(directory[base + 2]),
+                        default_locale=self.get_string(directory[base + 4]),
+                        parent_tier_ref=self.get_string(directory[base + 5]))
+
+        first_row = directory[base + 6]
+        for row in range(first_row, first_row + directory[base + 7]):
+
+            record = records[row * ANNOTATION_RECORD_SIZE:(row + 1) * ANNOTATION_RECORD_SIZE]
+            annotation_id = self.get_string(record[1])
+            annotation_value = self.get_string(record[2])
+
+            if record[0] == ALIGNABLE:
+                annotation = ELANAlignableAnnotation(annotation_id, annotation_value,
+                                                     self._add_time_slot(elan_file, record[3]),
+                                                     self._add_time_slot(elan_file, record[4]),
+                                                     elan_file, tier,
+                                                     svg_ref=self.get_string(record[5]),
+                                                     external_ref=self.get_string(record[6]))
+            else:
+                annotation = ELANRefAnnotation(annotation_id, annotation_value,
+                                               self.get_string(record[3]),
+                                               elan_file, tier,
+                                               previous_annotation=self.get_string(record[4]),
+                                               external_ref=self.get_string(record[6]))
+
+            tier.add_annotation(annotation)
+
+        elan_file.add_tier(tier)
+
+        return tier
+
+    # Convert the binary file (or only the given tiers) into an ELANFile object
+    def to_elan_file(self, tier_ids=None):
+
+        elan_file = self.new_elan_file()
+
+        # Restore the complete time order first to keep its original order
+        if tier_ids is None:
+            for row in range(len(self.columns["TIME_SLOT_ID"])):
+                self._add_time_slot(elan_file, row)
+
+            tier_ids = self.get_tier_ids()
+
+        for tier_id in tier_ids:
+            self.load_tier(tier_id, elan_file)
+
+        return elan_file
+
+    def __len__(self):
+        return self.get_tier_count()
+
+    def __contains__(self, tier_id):
+        return self.has_tier(tier_id)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# Read a binary file completely into an ELANFile object
+def read_binary_file(path):
+
+    with ELANBinaryFile(path) as binary_file:
+        return binary_file.to_elan_file()
@@ -0,0 +1,285 @@
+# Keyword-in-context (KWIC) concordances of ELAN files
+#
+# Every match of a literal string or regular expression in the annotation
+# values of the selected tiers becomes one ELANConcordanceLine with the
+# text to the left and right of the match, the neighbouring annotations of
+# the same tier as context, the effective time span of the annotation and
+# the values of the annotations on dependent tiers (e.g. translations or
+# glosses). Dependent annotations are found through the index of child
+# annotations of the ELAN file and through binary search in the sorted
+# intervals of time-aligned dependent tiers, so no tier is rescanned per
+# match. Lines are yielded as they are found; for corpora only one file per
+# worker process is held in memory.
+
+import re
+from bisect import bisect_left
+from functools import partial
+
+from elan import ELANAlignableAnnotation
+from elan_corpus import map_elan_files
+
+
+# Class to model a single line of a concordance
+class ELANConcordanceLine:
+
+    # File, tier and annotation containing the match
+    file_name = None
+    tier_id = None
+    participant = None
+    annotation_id = None
+
+    # Text before the match, the match itself and the text after it
+    left_context = ""
+    keyword = ""
+    right_context = ""
+
+    # Effective time span of the annotation
+    start_time = None
+    end_time = None
+
+    # Dictionary from dependent tier IDs to lists of annotation values
+    dependents = None
+
+    # Constructor
+    def __init__(self, file_name, tier_id, participant, annotation_id, left_context, keyword, right_context, start_time=None, end_time=None, dependents=None):
+
+        if dependents is None:
+            dependents = {}
+
+        self.file_name = file_name
+        self.tier_id = tier_id
+        self.participant = participant
+        self.annotation_id = annotation_id
+        self.left_context = left_context
+        self.keyword = keyword
+        self.right_context = right_context
+        self.start_time = start_time
+        self.end_time = end_time
+        self.dependents = dependents
+
+    # Getter methods
+    def get_file_name(self):
+        return self.file_name
+
+    def get_tier_id(self):
+        return self.tier_id
+
+    def get_participant(self):
+        return self.participant
+
+    def get_annotation_id(self):
+        return self.annotation_id
+
+    def get_left_context(self):
+        return self.left_context
+
+    def get_keyword(self):
+        return self.keyword
+
+    def get_right_context(self):
+        return self.right_context
+
+    def get_start_time(self):
+        return self.start_time
+
+    def get_end_time(self):
+        return self.end_time
+
+    def get_dependents(self):
+        return self.dependents
+
+    def get_dependent_values(self, tier_id):
+        return self.dependents.get(tier_id, [])
+
+    # Format the line with the keyword centred in a column of the given
+    # width on either side
+    def format(self, width=40):
+        return self.left_context[-width:].rjust(width) + " " + self.keyword + " " + self.right_context[:width].ljust(width)
+
+    def __repr__(self):
+        return "[" + str(self.tier_id) + ", " + str(self.annotation_id) + ", " + repr(self.keyword) + "]"
+
+
+# Compile a search pattern given as literal string, regular expression
+# string or compiled regular expression
+def compile_pattern(pattern, regex=False, ignore_case=False):
+
+    if not isinstance(pattern, str):
+        return pattern
+
+    if not regex:
+        pattern = re.escape(pattern)
+
+    if ignore_case:
+        return re.compile(pattern, re.IGNORECASE)
+    else:
+        return re.compile(pattern)
+
+
+# Indexes of an ELAN file needed to build concordance lines, built once
+# per file and extended on demand
+class _ConcordanceIndex:
+
+    def __init__(self, elan_file):
+
+        self.elan_file = elan_file
+        self.effective_times = elan_file.get_effective_times()
+        self.children_index = elan_file.get_children_index()
+
+        # Dictionary from tier IDs to the lists of their child tiers
+        self.child_tiers = {}
+        for tier in elan_file.get_tiers():
+            if tier.get_parent_tier_ref() is not None:
+                self.child_tiers.setdefault(tier.get_parent_tier_ref(), []).append(tier)
+
+        # Sorted start times and intervals of time-aligned tiers
+        self.intervals = {}
+
+    # Return the annotations of a tier in order of time
+    def get_ordered_annotations(self, tier):
+
+        effective_times = self.effective_times
+
+        def key(annotation):
+            start = effective_times.get(annotation.get_annotation_id(), (None, None))[0]
+            if start is None:
+                return (1, 0)
+            else:
+                return (0, start)
+
+        return sorted(tier.get_annotations(), key=key)
+
+    # Return the sorted start times and intervals of a time-aligned tier.
+    # Effective times are used, so that annotations on unaligned time
+    # slots (e.g. on Time_Subdivision tiers) are included.
+    def get_intervals(self, tier):
+
+        tier_id = tier.get_tier_id()
+
+        if tier_id not in self.intervals:
+
+            intervals = []
+            for annotation in tier.get_annotations():
+                start, end = self.effective_times.get(annotation.get_annotation_id(), (None, None))
+                if start is not None and end is not None:
+                    intervals.append((start, end, annotation))
+
+            intervals.sort(key=lambda interval: (interval[0], interval[1]))
+
+            self.intervals[tier_id] = ([interval[0] for interval in intervals], intervals)
+
+        return self.intervals[tier_id]
+
+    # Collect the values of all annotations depending on an annotation,
+    # grouped by tier ID, in the order of the tier hierarchy
+    def collect_dependents(self, annotation, dependents):
+
+        tier_id = annotation.get_tier().get_tier_id()
+        start, end = self.effective_times.get(annotation.get_annotation_id(), (None, None))
+
+        for child_tier in self.child_tiers.get(tier_id, []):
+
+            child_tier_id = child_tier.get_tier_id()
+            values = dependents.setdefault(child_tier_id, [])
+
+            if child_tier.get_annotations() and isinstance(child_tier.get_annotations()[0], ELANAlignableAnnotation):
+
+                # Time-aligned dependents lie within the span of the annotation
+                if start is None or end is None:
+                    continue
+
+                starts, intervals = self.get_intervals(child_tier)
+                children = []
+                position = bisect_left(starts, start)
+                while position < len(intervals) and intervals[position][0] < end:
+                    if intervals[position][1] <= end:
+                        children.append(intervals[position][2])
+                    position += 1
+
+            else:
+
+                children = [child for child in self.children_index.get(annotation.get_annotation_id(), []) if child.get_tier() is child_tier]
+                if len(children) > 1:
+                    children = self.elan_file.order_annotation_chain(children)
+
+            for child in children:
+                values.append(child.get_annotation_value())
+                self.collect_dependents(child, dependents)
+
+
+# Yield an ELANConcordanceLine for every match of a pattern in the values
+# of the annotations of the given tiers (by default all tiers). The context
+# consists of up to context annotations on either side of the matching
+# annotation on the same tier (in order of time) plus the rest of its
+# value. Set dependents to False to leave out dependent tiers.
+def iter_concordance(elan_file, pattern, tiers=None, regex=False, ignore_case=False, context=3, dependents=True, separator=" "):
+
+    pattern = compile_pattern(pattern, regex, ignore_case)
+
+    if tiers is None:
+        tiers = elan_file.get_tiers()
+
+    file_name = elan_file.get_url()
+    if not isinstance(file_name, str):
+        file_name = None
+
+    index = _ConcordanceIndex(elan_file)
+
+    for tier in tiers:
+
+        tier = elan_file.resolve_tier(tier)
+
+        # Skip tiers without any match before ordering their annotations
+        if not any(pattern.search(annotation.get_annotation_value() or "") for annotation in tier.get_annotations()):
+            continue
+
+        annotations = index.get_ordered_annotations(tier)
+        values = [annotation.get_annotation_value() or "" for annotation in annotations]
+
+        for position, annotation in enumerate(annotations):
+
+            value = values[position]
+            matches = list(pattern.finditer(value))
+            if not matches:
+                continue
+
+            left_values = values[max(0, position - context):position]
+            right_values = values[position + 1:position + 1 + context]
+
+            start_time, end_time = index.effective_times.get(annotation.get_annotation_id(), (None, None))
+
+            annotation_dependents = {}
+            if dependents:
+                index.collect_dependents(annotation, annotation_dependents)
+
+            for match in matches:
+
+                left_context = separator.join(left_values + [value[:match.start()]]).strip()
+                right_context = separator.join([value[match.end():]] + right_values).strip()
+
+                yield ELANConcordanceLine(file_name, tier.get_tier_id(), tier.get_participant(), annotation.get_annotation_id(),
+                                          left_context, match.group(0), right_context, start_time, end_time, annotation_dependents)
+
+
+# Return the concordance lines of a single ELAN file as a list. Tiers are
+# selected by ID and tiers missing from the file are skipped.
+def _get_concordance(elan_file, pattern, tier_ids=None, regex=False, ignore_case=False, context=3, dependents=True, separator=" "):
+
+    tiers = None
+    if tier_ids is not None:
+        tiers = [tier_id for tier_id in tier_ids if elan_file.get_tier_by_id(tier_id) is not None]
+
+    return list(iter_concordance(elan_file, pattern, tiers, regex, ignore_case, context, dependents, separator))
+
+
+# Yield the concordance lines of a corpus (a directory or a list of file
+# names) file by file, searching the files in parallel. Tiers are selected
+# by ID in every file (by default all tiers).
+def iter_corpus_concordance(sources, pattern, tier_ids=None, regex=False, ignore_case=False, context=3, dependents=True, separator=" ", processes=None, chunksize=1):
+
+    function = partial(_get_concordance, pattern=pattern, tier_ids=tier_ids, regex=regex, ignore_case=ignore_case,
+                       context=context, dependents=dependents, separator=separator)
+
+    for source, lines in map_elan_files(function, sources, processes, chunksize):
+        for line in lines:
+            yield line
@@ -0,0 +1,68 @@
+# Helpers for processing a corpus of ELAN files in parallel
+#
+# Functions applied to the files of a corpus run in a pool of worker
+# processes. Every worker reads its files itself, so only file names go to
+# the workers and only the results of the function come back. Functions
+# must be picklable, i.e. defined at module level (functools.partial
+# objects of such functions work as well).
+
+import os
+import multiprocessing
+
+from elan import ELANFile, is_elan_file_name
+
+
+# Yield the names of all ELAN files (compressed or not) below a
+# directory, in a stable order
+def iter_elan_file_names(directory):
+
+    for root, directories, file_names in os.walk(directory):
+
+        directories.sort()
+
+        for file_name in sorted(file_names):
+            if is_elan_file_name(file_name):
+                yield os.path.join(root, file_name)
+
+
+# Read one ELAN file and apply a function to it
+def _apply_to_elan_file(task):
+
+    source, function = task
+
+    if isinstance(source, ELANFile):
+        elan_file = source
+    else:
+        elan_file = ELANFile.read_elan_file(source)
+
+    return source, function(elan_file)
+
+
+# Apply a function to every ELAN file of a corpus and yield
+# (source, result) pairs in the order of the sources. Sources are file
+# names (including paths into zip archives) or a directory to search for
+# ELAN files. ELANFile objects are accepted as sources as well, but are
+# only processed without copying when processes=1, which runs everything
+# in the current process.
+def map_elan_files(function, sources, processes=None, chunksize=1):
+
+    if isinstance(sources, str) and os.path.isdir(sources):
+        sources = iter_elan_file_names(sources)
+
+    tasks = ((source, function) for source in sources)
+
+    if processes == 1:
+        for task in tasks:
+            yield _apply_to_elan_file(task)
+
+        return
+
+    pool = multiprocessing.Pool(processes)
+
+    try:
+        for result in pool.imap(_apply_to_elan_file, tasks, chunksize):
+            yield result
+
+    finally:
+        pool.terminate()
+        pool.join()
@@ -0,0 +1,201 @@
+# Streaming export of the annotations of a corpus of ELAN files into tables
+#
+# The exporter turns ELANFile objects, or ELAN files read from disk one at a
+# time, into batches of at most batch_size rows with the columns listed in
+# ANNOTATION_COLUMNS. Batches can be consumed as plain dictionaries of
+# lists, as pandas DataFrames, or written to Arrow IPC or Parquet files.
+# Only one file and one batch are held in memory at any time, so memory use
+# does not grow with the size of the corpus. pandas and pyarrow are
+# optional and only needed for the corresponding output formats.
+
+from elan import ELANFile, ELANAlignableAnnotation
+
+# pandas is optional and only needed for DataFrame output
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+# pyarrow is optional and only needed for Arrow IPC and Parquet output
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+try:
+    import pyarrow.parquet
+except ImportError:
+    pass
+
+# Columns of the exported tables
+ANNOTATION_COLUMNS = [
+    "file",
+    "annotation_id",
+    "tier_id",
+    "participant",
+    "linguistic_type",
+    "start",
+    "end",
+    "value",
+    "parent_annotation_id",
+]
+
+# Default number of rows per batch
+DEFAULT_BATCH_SIZE = 65536
+
+
+# Yield the ELANFile objects of a corpus given as ELANFile objects
+# and/or file names, reading files from disk only when they are needed
+def iter_elan_files(sources):
+
+    for source in sources:
+
+        if isinstance(source, ELANFile):
+            yield source
+        else:
+            yield ELANFile.read_elan_file(source)
+
+
+# Yield one row (a tuple in the order of ANNOTATION_COLUMNS) per annotation
+def iter_annotation_rows(elan_file):
+
+    file_name = elan_file.get_url()
+    if not isinstance(file_name, str):
+        file_name = None
+
+    time_slots_dict = elan_file.get_time_slots_dict_to_read()
+
+    for tier in elan_file.get_tiers_to_read():
+
+        tier_id = tier.get_tier_id()
+        participant = tier.get_participant()
+        linguistic_type = tier.get_linguistic_type()
+
+        for annotation in tier:
+
+            if isinstance(annotation, ELANAlignableAnnotation):
+
+                start_time_slot = time_slots_dict.get(annotation.get_start_time_slot())
+                end_time_slot = time_slots_dict.get(annotation.get_end_time_slot())
+
+                start = start_time_slot.get_time_value() if start_time_slot is not None else None
+                end = end_time_slot.get_time_value() if end_time_slot is not None else None
+                parent_annotation_id = None
+
+            else:
+
+                start = None
+                end = None
+                parent_annotation_id = annotation.get_annotation_ref()
+
+            yield (file_name, annotation.get_annotation_id(), tier_id, participant, linguistic_type,
+                   start, end, annotation.get_annotation_value(), parent_annotation_id)
+
+
+# Yield batches of at most batch_size rows as dictionaries
+# from column names to lists of values
+def iter_record_batches(sources, batch_size=DEFAULT_BATCH_SIZE):
+
+    if batch_size < 1:
+        raise RuntimeError("Batch size must be positive.")
+
+    columns = [[] for column in ANNOTATION_COLUMNS]
+    row_count = 0
+
+    for elan_file in iter_elan_files(sources):
+
+        for row in iter_annotation_rows(elan_file):
+
+            for position, value in enumerate(row):
+                columns[position].append(value)
+
+            row_count += 1
+
+            if row_count == batch_size:
+                yield dict(zip(ANNOTATION_COLUMNS, columns))
+                columns = [[] for column in ANNOTATION_COLUMNS]
+                row_count = 0
+
+    if row_count > 0:
+        yield dict(zip(ANNOTATION_COLUMNS, columns))
+
+
+# Yield the batches as pandas DataFrames (times as nullable integers)
+def iter_dataframes(sources, batch_size=DEFAULT_BATCH_SIZE):
+
+    if pandas is None:
+        raise RuntimeError("Exporting annotations to DataFrames requires pandas.")
+
+    for batch in iter_record_batches(sources, batch_size):
+
+        batch["start"] = pandas.array(batch["start"], dtype="Int64")
+        batch["end"] = pandas.array(batch["end"], dtype="Int64")
+
+        yield pandas.DataFrame(batch, columns=ANNOTATION_COLUMNS)
+
+
+# Return the Arrow schema of the exported tables
+def get_arrow_schema():
+
+    if pyarrow is None:
+        raise RuntimeError("Exporting annotations to Arrow requires pyarrow.")
+
+    return pyarrow.schema([
+        ("file", pyarrow.string()),
+        ("annotation_id", pyarrow.string()),
+        ("tier_id", pyarrow.string()),
+        ("participant", pyarrow.string()),
+        ("linguistic_type", pyarrow.string()),
+        ("start", pyarrow.int64()),
+        ("end", pyarrow.int64()),
+        ("value", pyarrow.string()),
+        ("parent_annotation_id", pyarrow.string()),
+    ])
+
+
+# Yield the batches as pyarrow RecordBatch objects
+def iter_arrow_batches(sources, batch_size=DEFAULT_BATCH_SIZE):
+
+    schema = get_arrow_schema()
+
+    for batch in iter_record_batches(sources, batch_size):
+
+        arrays = [pyarrow.array(batch[field.name], type=field.type) for field in schema]
+
+        yield pyarrow.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+# Write all annotations to an Arrow IPC file, batch by batch.
+# Returns the number of rows written.
+def write_arrow_ipc(sources, path, batch_size=DEFAULT_BATCH_SIZE):
+
+    schema = get_arrow_schema()
+    row_count = 0
+
+    with pyarrow.OSFile(path, "wb") as sink:
+        with pyarrow.ipc.new_file(sink, schema) as writer:
+            for batch in iter_arrow_batches(sources, batch_size):
+                writer.write_batch(batch)
+                row_count += batch.num_rows
+
+    return row_count
+
+
+# Write all annotations to a Parquet file, one row group per batch.
+# Returns the number of rows written.
+def write_parquet(sources, path, batch_size=DEFAULT_BATCH_SIZE, compression="snappy"):
+
+    schema = get_arrow_schema()
+
+    if not hasattr(pyarrow, "parquet"):
+        raise RuntimeError("Exporting annotations to Parquet requires pyarrow with Parquet support.")
+
+    row_count = 0
+
+    with pyarrow.parquet.ParquetWriter(path, schema, compression=compression) as writer:
+        for batch in iter_arrow_batches(sources, batch_size):
+            writer.write_table(pyarrow.Table.from_batches([batch], schema=schema))
+            row_count += batch.num_rows
+
+    return row_count
@@ -0,0 +1,282 @@
+# Frequency lists and n-gram tables of the annotation values of a corpus
+#
+# Counting follows a map-reduce scheme: worker processes read the ELAN files
+# of a corpus, tokenize the values of the selected tiers and count n-grams
+# per file (map). The partial Counters are added up in the parent process as
+# they arrive (reduce). If the combined table grows beyond max_entries
+# distinct n-grams, it is written to a sorted run file on disk and cleared;
+# at the end the runs are merged in one sequential pass. The counter also
+# records how many files and tokens were processed and how long it took.
+
+import os
+import re
+import time
+import pickle
+import tempfile
+from collections import Counter
+from functools import partial
+from heapq import merge, nlargest
+from itertools import groupby
+
+from elan_corpus import map_elan_files
+
+# Default pattern of tokens in annotation values
+TOKEN_PATTERN = re.compile(r"\w+(?:['\-]\w+)*")
+
+# Number of entries pickled together in a run file
+SPILL_CHUNK_SIZE = 10000
+
+
+# Split an annotation value into tokens
+def tokenize(value, pattern=TOKEN_PATTERN, lowercase=False):
+
+    if value is None:
+        return []
+
+    if lowercase:
+        value = value.lower()
+
+    return pattern.findall(value)
+
+
+# Return the tiers of an ELAN file whose tier ID matches tier_pattern and
+# whose linguistic type is linguistic_type (None matches everything)
+def select_tiers(elan_file, tier_pattern=None, linguistic_type=None):
+
+    if isinstance(tier_pattern, str):
+        tier_pattern = re.compile(tier_pattern)
+
+    tiers = []
+    for tier in elan_file.get_tiers():
+
+        if tier_pattern is not None and tier_pattern.search(tier.get_tier_id()) is None:
+            continue
+
+        if linguistic_type is not None and tier.get_linguistic_type() != linguistic_type:
+            continue
+
+        tiers.append(tier)
+
+    return tiers
+
+
+# Count the n-grams (tuples of n tokens) of the selected tiers of an ELAN
+# file. By default n-grams do not cross annotation boundaries; with
+# across_annotations=True the annotations of a tier form one token stream
+# (in order of time). Returns the Counter and the number of tokens.
+def count_ngrams(elan_file, n=1, tier_pattern=None, linguistic_type=None, lowercase=False, pattern=TOKEN_PATTERN, across_annotations=False):
+
+    if isinstance(pattern, str):
+        pattern = re.compile(pattern)
+
+    counter = Counter()
+    token_count = 0
+
+    effective_times = None
+    if across_annotations:
+        effective_times = elan_file.get_effective_times()
+
+    for tier in select_tiers(elan_file, tier_pattern, linguistic_type):
+
+        annotations = tier.get_annotations()
+
+        if across_annotations:
+            annotations = sorted(annotations, key=lambda annotation: effective_times.get(annotation.get_annotation_id(), (None, None))[0] or 0)
+            streams = [[token for annotation in annotations for token in tokenize(annotation.get_annotation_value(), pattern, lowercase)]]
+        else:
+            streams = (tokenize(annotation.get_annotation_value(), pattern, lowercase) for annotation in annotations)
+
+        for tokens in streams:
+
+            token_count += len(tokens)
+
+            if n == 1:
+                counter.update((token,) for token in tokens)
+            else:
+                counter.update(zip(*[tokens[offset:] for offset in range(n)]))
+
+    return counter, token_count
+
+
+# Class to combine partial counts into a frequency table, spilling sorted
+# runs to disk when the table grows too large
+class ELANFrequencyCounter:
+
+    # Combined counts held in memory
+    counter = None
+
+    # Maximum number of distinct n-grams held in memory (None for no limit)
+    max_entries = None
+
+    # Directory and names of the run files written so far
+    spill_directory = None
+    run_file_names = None
+
+    # Throughput figures
+    file_count = 0
+    token_count = 0
+    start_time = None
+    end_time = None
+
+    # Constructor
+    def __init__(self, max_entries=None, spill_directory=None):
+        self.counter = Counter()
+        self.max_entries = max_entries
+        self.spill_directory = spill_directory
+        self.run_file_names = []
+        self.file_count = 0
+        self.token_count = 0
+        self.start_time = time.time()
+        self.end_time = None
+
+    # Add the counts of one file
+    def add(self, counter, token_count=0):
+
+        self.counter.update(counter)
+        self.file_count += 1
+        self.token_count += token_count
+
+        if self.max_entries is not None and len(self.counter) > self.max_entries:
+            self.spill()
+
+    # Write the counts held in memory to a sorted run file and clear them
+    def spill(self):
+
+        if not self.counter:
+            return
+
+        handle, file_name = tempfile.mkstemp(suffix=".run", dir=self.spill_directory)
+
+        with os.fdopen(handle, "wb") as run_file:
+            items = sorted(self.counter.items())
+            for position in range(0, len(items), SPILL_CHUNK_SIZE):
+                pickle.dump(items[position:position + SPILL_CHUNK_SIZE], run_file, pickle.HIGHEST_PROTOCOL)
+
+        self.run_file_names.append(file_name)
+        self.counter = Counter()
+
+    # Mark the end of counting (for the throughput report)
+    def finish(self):
+        self.end_time = time.time()
+
+    # Yield the entries of a run file in order
+    @staticmethod
+    def iter_run(file_name):
+
+        with open(file_name, "rb") as run_file:
+            while True:
+                try:
+                    chunk = pickle.load(run_file)
+                except EOFError:
+                    return
+                for item in chunk:
+                    yield item
+
+    # Yield all (n-gram, count) pairs sorted by n-gram, merging the runs on
+    # disk with the counts in memory
+    def items(self):
+
+        if not self.run_file_names:
+            for item in sorted(self.counter.items()):
+                yield item
+            return
+
+        runs = [self.iter_run(file_name) for file_name in self.run_file_names]
+        runs.append(iter(sorted(self.counter.items())))
+
+        for ngram, group in groupby(merge(*runs), key=lambda item: item[0]):
+            yield ngram, sum(count for key, count in group)
+
+    # Return the k most frequent n-grams as (n-gram, count) pairs
+    def most_common(self, k=None):
+
+        if not self.run_file_names:
+            return self.counter.most_common(k)
+
+        if k is None:
+            return sorted(self.items(), key=lambda item: item[1], reverse=True)
+
+        return nlargest(k, self.items(), key=lambda item: item[1])
+
+    # Return all counts as a single Counter (only sensible if they fit
+    # into memory)
+    def to_counter(self):
+
+        if not self.run_file_names:
+            return Counter(self.counter)
+
+        return Counter(dict(self.items()))
+
+    # Write the frequency table as tab-separated lines (tokens of an n-gram
+    # separated by spaces), sorted by n-gram
+    def write_tsv(self, file_name):
+
+        with open(file_name, "w", encoding="utf-8") as output_file:
+            for ngram, count in self.items():
+                output_file.write(" ".join(ngram) + "\t" + str(count) + "\n")
+
+    # Remove the run files from disk
+    def close(self):
+
+        for file_name in self.run_file_names:
+            if os.path.exists(file_name):
+                os.remove(file_name)
+
+        self.run_file_names = []
+
+    # Return the throughput of the counting as a dictionary
+    def get_report(self):
+
+        end_time = self.end_time
+        if end_time is None:
+            end_time = time.time()
+
+        seconds = end_time - self.start_time
+
+        report = {
+            "files": self.file_count,
+            "tokens": self.token_count,
+            "seconds": seconds,
+            "files_per_second": None,
+            "tokens_per_second": None,
+            "runs": len(self.run_file_names),
+        }
+
+        if seconds > 0:
+            report["files_per_second"] = self.file_count / seconds
+            report["tokens_per_second"] = self.token_count / seconds
+
+        return report
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# Count the n-grams of the selected tiers over a corpus (a directory or a
+# list of file names) in parallel worker processes and return an
+# ELANFrequencyCounter. With max_entries, the combined table is spilled to
+# sorted run files in spill_directory whenever it exceeds that many
+# distinct n-grams; call close() on the result (or use it as a context
+# manager) to remove them. progress, if given, is called with the
+# throughput report after every file.
+def count_corpus_ngrams(sources, n=1, tier_pattern=None, linguistic_type=None, lowercase=False, pattern=TOKEN_PATTERN, across_annotations=False,
+                        processes=None, chunksize=1, max_entries=None, spill_directory=None, progress=None):
+
+    function = partial(count_ngrams, n=n, tier_pattern=tier_pattern, linguistic_type=linguistic_type, lowercase=lowercase,
+                       pattern=pattern, across_annotations=across_annotations)
+
+    frequency_counter = ELANFrequencyCounter(max_entries, spill_directory)
+
+    for source, (counter, token_count) in map_elan_files(function, sources, processes, chunksize):
+
+        frequency_counter.add(counter, token_count)
+
+        if progress is not None:
+            progress(frequency_counter.get_report())
+
+    frequency_counter.finish()
+
+    return frequency_counter
@@ -0,0 +1,695 @@
+# Multi-tier structured queries over ELAN files
+#
+# A query declares variables standing for annotations, constrains them by
+# tier, participant, linguistic type and value, and relates them in time or
+# in the tier hierarchy. Statements are separated by newlines or ';':
+#
+#   w: tier=A_words value=/^hel/
+#   m: type=morph value="lo"
+#   t: participant=B
+#   m child_of w
+#   t overlaps w
+#   t before w 500
+#
+# Values are bare words, "quoted strings" (exact matches) or /regular
+# expressions/ (searched in the value; tiers, participants and types can be
+# matched by regular expressions as well). Relations between variables:
+#
+#   a overlaps b        the time spans of a and b overlap
+#   a within b          a lies within the time span of b
+#   a contains b        b lies within the time span of a
+#   a before b [n]      a ends before b starts (at most n ms before)
+#   a after b [n]       a starts after b ends (at most n ms after)
+#   a child_of b        b is the parent annotation of a
+#   a parent_of b       a is the parent annotation of b
+#
+# Times are effective times, so reference annotations take part in temporal
+# relations as well. The parent of a reference annotation is the annotation
+# it refers to; the parent of a time-aligned annotation on a dependent tier
+# is the annotation of the parent tier containing it.
+#
+# The planner estimates the number of candidates of every variable from the
+# sizes of its tiers (or from the value index for exact values), starts with
+# the most selective variable and adds the remaining variables in order of
+# their estimates, preferring variables related to the ones already bound.
+# Each new variable is then looked up through the most selective index
+# available: the parent index for hierarchy relations, the interval index
+# (binary search in the start times of a tier) for temporal relations, the
+# value index for exact values, or a scan of its tiers otherwise. Queries run
+# on a single ELANFile or on a corpus in parallel worker processes.
+
+import re
+from bisect import bisect_left, bisect_right
+from functools import partial
+
+from elan import ELANRefAnnotation
+from elan_corpus import map_elan_files
+
+# Names of the relations and the relations they are normalised to
+RELATIONS = {
+    "overlaps": ("overlaps", False),
+    "within": ("within", False),
+    "contains": ("within", True),
+    "before": ("before", False),
+    "after": ("before", True),
+    "child_of": ("child_of", False),
+    "parent_of": ("child_of", True),
+}
+
+# Constraint keys of variables
+CONSTRAINT_KEYS = ["tier", "participant", "type", "value"]
+
+# Access paths of the planner, most selective first
+ACCESS_PATHS = ["parent", "children", "interval", "value", "scan"]
+
+# Tokens of the query language
+TOKEN_PATTERN = re.compile(r'[ \t\r]*(?:(?P<regex>/(?:[^/\\\n]|\\.)*/)|(?P<string>"(?:[^"\\\n]|\\.)*")|(?P<symbol>[:=;\n])|(?P<word>[^\s:=;"/]+))')
+
+
+# Class to model a constraint on the tier, participant, linguistic type or
+# value of an annotation
+class ELANQueryConstraint:
+
+    # Constrained property (one of CONSTRAINT_KEYS)
+    key = None
+
+    # Exact value or compiled regular expression
+    value = None
+    is_regex = False
+
+    # Constructor
+    def __init__(self, key, value, is_regex=False):
+
+        if key not in CONSTRAINT_KEYS:
+            raise RuntimeError("Unknown query constraint: " + str(key))
+
+        self.key = key
+        self.is_regex = is_regex
+
+        if is_regex:
+            self.value = re.compile(value)
+        else:
+            self.value = value
+
+    # Check whether a string satisfies the constraint
+    def matches(self, value):
+
+        if value is None:
+            value = ""
+
+        if self.is_regex:
+            if self.value.search(value) is not None:
+                return True
+            else:
+                return False
+        else:
+            if value == self.value:
+                return True
+            else:
+                return False
+
+    def __repr__(self):
+        if self.is_regex:
+            return self.key + "=/" + self.value.pattern + "/"
+        else:
+            return self.key + "=" + repr(self.value)
+
+
+# Class to model a variable of a query standing for an annotation
+class ELANQueryVariable:
+
+    # Name of the variable
+    name = None
+
+    # List of ELANQueryConstraint objects
+    constraints = None
+
+    # Constructor
+    def __init__(self, name):
+        self.name = name
+        self.constraints = []
+
+    def add_constraint(self, constraint):
+        self.constraints.append(constraint)
+
+    def get_name(self):
+        return self.name
+
+    def get_constraints(self):
+        return self.constraints
+
+    # Return the exact value the annotations must have, if there is one
+    def get_exact_value(self):
+
+        for constraint in self.constraints:
+            if constraint.key == "value" and not constraint.is_regex:
+                return constraint.value
+
+        return None
+
+    # Return the tiers of an ELAN file satisfying the tier, participant and
+    # linguistic type constraints
+    def get_tiers(self, elan_file):
+
+        tiers = []
+        for tier in elan_file.get_tiers():
+
+            matches = True
+            for constraint in self.constraints:
+                if constraint.key == "tier":
+                    matches = constraint.matches(tier.get_tier_id())
+                elif constraint.key == "participant":
+                    matches = constraint.matches(tier.get_participant())
+                elif constraint.key == "type":
+                    matches = constraint.matches(tier.get_linguistic_type())
+                if not matches:
+                    break
+
+            if matches:
+                tiers.append(tier)
+
+        return tiers
+
+    # Check whether the value of an annotation satisfies the value constraints
+    def matches_value(self, annotation):
+
+        for constraint in self.constraints:
+            if constraint.key == "value" and not constraint.matches(annotation.get_annotation_value()):
+                return False
+
+        return True
+
+
+# Class to model a relation between two variables of a query. Relations are
+# normalised to overlaps, within, before and child_of.
+class ELANQueryRelation:
+
+    # Name of the relation and the related variables
+    relation = None
+    left = None
+    right = None
+
+    # Maximum distance in ms for before relations (None for no limit)
+    distance = None
+
+    # Constructor
+    def __init__(self, relation, left, right, distance=None):
+
+        if relation not in RELATIONS:
+            raise RuntimeError("Unknown query relation: " + str(relation))
+
+        relation, swap = RELATIONS[relation]
+
+        if swap:
+            left, right = right, left
+
+        self.relation = relation
+        self.left = left
+        self.right = right
+        self.distance = distance
+
+    # Check whether the relation holds between two annotations
+    def holds(self, index, left_annotation, right_annotation):
+
+        if self.relation == "child_of":
+            if index.get_parent(left_annotation) is right_annotation:
+                return True
+            else:
+                return False
+
+        left_start, left_end = index.get_times(left_annotation)
+        right_start, right_end = index.get_times(right_annotation)
+
+        if left_start is None or left_end is None or right_start is None or right_end is None:
+            return False
+
+        if self.relation == "overlaps":
+            result = left_start < right_end and right_start < left_end
+        elif self.relation == "within":
+            result = right_start <= left_start and left_end <= right_end
+        else:
+            result = left_end <= right_start and (self.distance is None or right_start - left_end <= self.distance)
+
+        if result:
+            return True
+        else:
+            return False
+
+    # Return the access path for looking up the variable at the given side
+    # of the relation when the other side is bound
+    def get_access_path(self, name):
+
+        if self.relation == "child_of":
+            if name == self.right:
+                return "parent"
+            else:
+                return "children"
+        else:
+            return "interval"
+
+    def __repr__(self):
+        result = self.left + " " + self.relation + " " + self.right
+        if self.distance is not None:
+            result += " " + str(self.distance)
+        return result
+
+
+# Indexes of an ELAN file used to evaluate queries, built on demand
+class ELANQueryIndex:
+
+    # Constructor
+    def __init__(self, elan_file):
+
+        self.elan_file = elan_file
+        self.effective_times = elan_file.get_effective_times()
+
+        # Dictionary from (tier ID, value) pairs to lists of annotations
+        self.value_index = None
+
+        # Dictionary from tier IDs to (start times, annotations, maximum
+        # duration) triples sorted by start time
+        self.interval_index = {}
+
+        # Dictionary from tier IDs to the lists of their child tiers
+        self.child_tiers = {}
+        for tier in elan_file.get_tiers():
+            if tier.get_parent_tier_ref() is not None:
+                self.child_tiers.setdefault(tier.get_parent_tier_ref(), []).append(tier)
+
+    def get_times(self, annotation):
+        return self.effective_times.get(annotation.get_annotation_id(), (None, None))
+
+    # Return the annotations of a tier with a given value
+    def get_annotations_by_value(self, tier, value):
+
+        if self.value_index is None:
+            self.value_index = {}
+            for other_tier in self.elan_file.get_tiers():
+                tier_id = other_tier.get_tier_id()
+                for annotation in other_tier.get_annotations():
+                    self.value_index.setdefault((tier_id, annotation.get_annotation_value()), []).append(annotation)
+
+        return self.value_index.get((tier.get_tier_id(), value), [])
+
+    # Return the start times, annotations and maximum duration of a tier
+    def get_intervals(self, tier):
+
+        tier_id = tier.get_tier_id()
+
+        if tier_id not in self.interval_index:
+
+            intervals = []
+            for annotation in tier.get_annotations():
+                start, end = self.get_times(annotation)
+                if start is not None and end is not None:
+                    intervals.append((start, end, annotation))
+
+            intervals.sort(key=lambda interval: (interval[0], interval[1]))
+
+            max_duration = 0
+            for start, end, annotation in intervals:
+                max_duration = max(max_duration, end - start)
+
+            self.interval_index[tier_id] = ([interval[0] for interval in intervals], [interval[2] for interval in intervals], max_duration)
+
+        return self.interval_index[tier_id]
+
+    # Return the annotations of a tier starting between low and high
+    # (inclusive, None for no limit)
+    def get_annotations_starting_between(self, tier, low, high):
+
+        starts, annotations, max_duration = self.get_intervals(tier)
+
+        if low is None:
+            first = 0
+        else:
+            first = bisect_left(starts, low)
+
+        if high is None:
+            last = len(starts)
+        else:
+            last = bisect_right(starts, high)
+
+        return annotations[first:last]
+
+    # Return the annotations of a tier that may satisfy a temporal relation
+    # with an annotation, where is_left tells whether the annotations of the
+    # tier are on the left side of the relation
+    def get_interval_candidates(self, tier, relation, annotation, is_left):
+
+        start, end = self.get_times(annotation)
+
+        if start is None or end is None:
+            return []
+
+        max_duration = self.get_intervals(tier)[2]
+
+        if relation.relation == "overlaps":
+            return self.get_annotations_starting_between(tier, start - max_duration, end)
+
+        elif relation.relation == "within":
+            if is_left:
+                return self.get_annotations_starting_between(tier, start, end)
+            else:
+                return self.get_annotations_starting_between(tier, end - max_duration, start)
+
+        else:
+            if is_left:
+                if relation.distance is None:
+                    return self.get_annotations_starting_between(tier, None, start)
+                else:
+                    return self.get_annotations_starting_between(tier, start - relation.distance - max_duration, start)
+            else:
+                if relation.distance is None:
+                    return self.get_annotations_starting_between(tier, end, None)
+                else:
+                    return self.get_annotations_starting_between(tier, end, end + relation.distance)
+
+    # Return the parent annotation of an annotation (see above)
+    def get_parent(self, annotation):
+
+        if isinstance(annotation, ELANRefAnnotation):
+            return self.elan_file.get_annotation_by_id(annotation.get_annotation_ref())
+
+        parent_tier_ref = annotation.get_tier().get_parent_tier_ref()
+        if parent_tier_ref is None:
+            return None
+
+        parent_tier = self.elan_file.get_tier_by_id(parent_tier_ref)
+        if parent_tier is None:
+            return None
+
+        start, end = self.get_times(annotation)
+        if start is None or end is None:
+            return None
+
+        for candidate in self.get_annotations_starting_between(parent_tier, start - self.get_intervals(parent_tier)[2], start):
+            candidate_start, candidate_end = self.get_times(candidate)
+            if candidate_start <= start and end <= candidate_end:
+                return candidate
+
+        return None
+
+    # Return the annotations of a tier whose parent is a given annotation
+    def get_children(self, tier, annotation):
+
+        if tier.get_annotations() and isinstance(tier.get_annotations()[0], ELANRefAnnotation):
+            return [child for child in self.elan_file.get_children_index().get(annotation.get_annotation_id(), []) if child.get_tier() is tier]
+
+        start, end = self.get_times(annotation)
+        if start is None or end is None:
+            return []
+
+        return [child for child in self.get_annotations_starting_between(tier, start, end) if self.get_parent(child) is annotation]
+
+
+# Class to model a query (see the top of this module for the syntax)
+class ELANQuery:
+
+    # Text of the query
+    text = None
+
+    # Dictionary from names to ELANQueryVariable objects (in order of
+    # declaration) and list of ELANQueryRelation objects
+    variables = None
+    relations = None
+
+    # Constructor
+    def __init__(self, text):
+        self.text = text
+        self.variables = {}
+        self.relations = []
+        self.parse(text)
+
+    # Parse the text of a query
+    def parse(self, text):
+
+        statements = [[]]
+        position = 0
+        text = text.strip()
+
+        while position < len(text):
+
+            match = TOKEN_PATTERN.match(text, position)
+            if match is None or match.end() == position:
+                raise RuntimeError("Cannot parse query at position " + str(position) + ": " + text[position:position + 20])
+
+            position = match.end()
+
+            if match.group("symbol") is not None and match.group("symbol") in ";\n":
+                statements.append([])
+            elif match.group("regex") is not None:
+                statements[-1].append(("regex", match.group("regex")[1:-1].replace("\\/", "/")))
+            elif match.group("string") is not None:
+                statements[-1].append(("string", match.group("string")[1:-1].replace('\\"', '"').replace("\\\\", "\\")))
+            elif match.group("symbol") is not None:
+                statements[-1].append(("symbol", match.group("symbol")))
+            elif match.group("word") is not None:
+                statements[-1].append(("word", match.group("word")))
+
+        for statement in statements:
+            if statement:
+                self.parse_statement(statement)
+
+        if not self.variables:
+            raise RuntimeError("Query does not declare any variables.")
+
+        for relation in self.relations:
+            for name in [relation.left, relation.right]:
+                if name not in self.variables:
+                    raise RuntimeError("Query relation refers to undeclared variable " + name)
+
+    # Parse a declaration (name: key=value ...) or relation (name relation
+    # name [distance])
+    def parse_statement(self, statement):
+
+        if statement[0][0] != "word":
+            raise RuntimeError("Query statement must start with a variable name.")
+
+        name = statement[0][1]
+
+        if len(statement) > 1 and statement[1] == ("symbol", ":"):
+
+            if name not in self.variables:
+                self.variables[name] = ELANQueryVariable(name)
+
+            rest = statement[2:]
+            if len(rest) % 3 != 0:
+                raise RuntimeError("Malformed constraints for query variable " + name)
+
+            for position in range(0, len(rest), 3):
+                key, equals, value = rest[position:position + 3]
+                if key[0] != "word" or equals != ("symbol", "="):
+                    raise RuntimeError("Malformed constraints for query variable " + name)
+                self.variables[name].add_constraint(ELANQueryConstraint(key[1], value[1], value[0] == "regex"))
+
+        elif len(statement) in [3, 4] and all(token[0] == "word" for token in statement):
+
+            distance = None
+            if len(statement) == 4:
+                try:
+                    distance = int(statement[3][1])
+                except ValueError:
+                    raise RuntimeError("Distance of query relation must be an integer: " + statement[3][1])
+
+            self.relations.append(ELANQueryRelation(statement[1][1], name, statement[2][1], distance))
+
+        else:
+            raise RuntimeError("Malformed query statement starting with " + name)
+
+    # Getter methods
+    def get_text(self):
+        return self.text
+
+    def get_variables(self):
+        return self.variables
+
+    def get_relations(self):
+        return self.relations
+
+    # Estimate the number of candidates of a variable in an ELAN file
+    def estimate(self, variable, index):
+
+        exact_value = variable.get_exact_value()
+        count = 0
+
+        for tier in variable.get_tiers(index.elan_file):
+            if exact_value is not None:
+                count += len(index.get_annotations_by_value(tier, exact_value))
+            else:
+                count += len(tier.get_annotations())
+
+        return count
+
+    # Plan the evaluation of the query on an ELAN file. Returns a list of
+    # (variable name, access path, relation used for access, relations to
+    # check afterwards, estimated candidates) tuples in order of evaluation.
+    def plan(self, elan_file, index=None):
+
+        if index is None:
+            index = ELANQueryIndex(elan_file)
+
+        estimates = dict((name, self.estimate(variable, index)) for name, variable in self.variables.items())
+
+        steps = []
+        bound = set()
+        remaining = list(self.variables)
+
+        while remaining:
+
+            # Prefer variables related to bound ones, then small estimates
+            def key(name):
+                connected = any((relation.left == name and relation.right in bound) or (relation.right == name and relation.left in bound) for relation in self.relations)
+                return (not connected, estimates[name])
+
+            name = min(remaining, key=key)
+            remaining.remove(name)
+
+            # Relations with bound variables; the most selective one is used
+            # to look up candidates, the others are checked afterwards
+            related = [relation for relation in self.relations
+                       if (relation.left == name and relation.right in bound) or (relation.right == name and relation.left in bound)
+                       or (relation.left == name and relation.right == name)]
+
+            access_relation = None
+            access_path = "scan"
+            if self.variables[name].get_exact_value() is not None:
+                access_path = "value"
+
+            for relation in related:
+                if relation.left == relation.right:
+                    continue
+                path = relation.get_access_path(name)
+                if ACCESS_PATHS.index(path) < ACCESS_PATHS.index(access_path):
+                    access_path = path
+                    access_relation = relation
+
+            checks = [relation for relation in related if relation is not access_relation]
+
+            steps.append((name, access_path, access_relation, checks, estimates[name]))
+            bound.add(name)
+
+        return steps
+
+    # Return a readable description of the plan for an ELAN file
+    def explain(self, elan_file):
+
+        lines = []
+        for name, access_path, access_relation, checks, estimate in self.plan(elan_file):
+            line = name + ": " + access_path
+            if access_relation is not None:
+                line += " via " + repr(access_relation)
+            if checks:
+                line += ", check " + ", ".join(repr(relation) for relation in checks)
+            line += " (estimated " + str(estimate) + " candidates)"
+            lines.append(line)
+
+        return "\n".join(lines)
+
+    # Yield all matches of the query in an ELAN file as dictionaries from
+    # variable names to annotations
+    def run(self, elan_file):
+
+        index = ELANQueryIndex(elan_file)
+        steps = self.plan(elan_file, index)
+
+        tiers = dict((name, variable.get_tiers(elan_file)) for name, variable in self.variables.items())
+        tier_sets = dict((name, set(id(tier) for tier in tier_list)) for name, tier_list in tiers.items())
+
+        def candidates(step, binding):
+
+            name, access_path, access_relation, checks, estimate = step
+            variable = self.variables[name]
+
+            if access_path == "parent":
+                parent = index.get_parent(binding[access_relation.left])
+                if parent is not None and id(parent.get_tier()) in tier_sets[name]:
+                    yield parent
+
+            elif access_path == "children":
+                for tier in tiers[name]:
+                    for child in index.get_children(tier, binding[access_relation.right]):
+                        yield child
+
+            elif access_path == "interval":
+                is_left = access_relation.left == name
+                if is_left:
+                    other = binding[access_relation.right]
+                else:
+                    other = binding[access_relation.left]
+                for tier in tiers[name]:
+                    for annotation in index.get_interval_candidates(tier, access_relation, other, is_left):
+                        yield annotation
+
+            elif access_path == "value":
+                for tier in tiers[name]:
+                    for annotation in index.get_annotations_by_value(tier, variable.get_exact_value()):
+                        yield annotation
+
+            else:
+                for tier in tiers[name]:
+                    for annotation in tier.get_annotations():
+                        yield annotation
+
+        def search(position, binding):
+
+            if position == len(steps):
+                yield dict(binding)
+                return
+
+            step = steps[position]
+            name, access_path, access_relation, checks, estimate = step
+            variable = self.variables[name]
+
+            for annotation in candidates(step, binding):
+
+                if not variable.matches_value(annotation):
+                    continue
+
+                binding[name] = annotation
+
+                if access_relation is not None and not access_relation.holds(index, binding[access_relation.left], binding[access_relation.right]):
+                    continue
+
+                if all(relation.holds(index, binding[relation.left], binding[relation.right]) for relation in checks):
+                    for result in search(position + 1, binding):
+                        yield result
+
+            binding.pop(name, None)
+
+        for result in search(0, {}):
+            yield result
+
+
+# Run a query on an ELAN file and describe the matches by dictionaries
+# from variable names to (tier ID, annotation ID, value, start, end) tuples
+def describe_query_matches(elan_file, query):
+
+    effective_times = elan_file.get_effective_times()
+    results = []
+
+    for match in query.run(elan_file):
+
+        result = {}
+        for name, annotation in match.items():
+            start, end = effective_times.get(annotation.get_annotation_id(), (None, None))
+            result[name] = (annotation.get_tier().get_tier_id(), annotation.get_annotation_id(), annotation.get_annotation_value(), start, end)
+
+        results.append(result)
+
+    return results
+
+
+# Run a query over a corpus (a directory or a list of file names) in
+# parallel and yield (file name, list of match descriptions) pairs for the
+# files with matches (see describe_query_matches)
+def run_corpus_query(query, sources, processes=None, chunksize=1):
+
+    if isinstance(query, str):
+        query = ELANQuery(query)
+
+    function = partial(describe_query_matches, query=query)
+
+    for source, results in map_elan_files(function, sources, processes, chunksize):
+        if results:
+            yield source, results
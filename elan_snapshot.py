@@ -0,0 +1,608 @@
+# Columnar, read-only snapshots of a set of ELAN files
+#
+# A snapshot lays out the tiers and annotations of one or more ELANFile
+# objects as flat columns in a single buffer, either in a
+# multiprocessing.shared_memory block or in an mmapped file. Worker
+# processes attach to the buffer without copying or parsing anything and
+# get read-only tier and annotation views with the same getters as
+# ELANTier and ELANAnnotation.
+#
+# Buffer layout (all integers in native byte order, sections 8-byte aligned):
+#
+#   header          magic (8 bytes), format version (uint32),
+#                   number of sections (uint32), total size (uint64)
+#   section table   one (offset, item count) pair of uint64 per section
+#   sections        typed columns in the order given by SECTIONS below
+#
+# Strings (tier IDs, participants, annotation values, ...) are stored once
+# in a string table: STRING_OFFSETS holds n + 1 byte offsets into the
+# UTF-8 encoded STRING_DATA. All string columns hold indexes into this
+# table, with -1 standing for None. Times are in milliseconds, with
+# NULL_TIME marking annotations or time slots without a time value.
+
+import mmap
+import struct
+from array import array
+from bisect import bisect_right
+
+from elan import ELANAlignableAnnotation
+
+# Shared memory is only available from Python 3.8 onwards
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+# Magic number and version of the snapshot format
+SNAPSHOT_MAGIC = b"EAFSNAP1"
+SNAPSHOT_VERSION = 1
+
+# Header: magic, version, number of sections, total size
+HEADER_FORMAT = "=8sIIQ"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+# Entry of the section table: offset, number of items
+SECTION_ENTRY_FORMAT = "=QQ"
+SECTION_ENTRY_SIZE = struct.calcsize(SECTION_ENTRY_FORMAT)
+
+# Marker for missing time values
+NULL_TIME = -(2 ** 63)
+
+# Marker for missing string or row references
+NULL_INDEX = -1
+
+# Sections of the snapshot with their array type codes
+SECTIONS = [
+    ("STRING_OFFSETS", "Q"),
+    ("STRING_DATA", "B"),
+    ("FILE_URL", "q"),
+    ("FILE_TIER_START", "q"),
+    ("FILE_TIER_COUNT", "q"),
+    ("TIER_ID", "q"),
+    ("TIER_PARTICIPANT", "q"),
+    ("TIER_ANNOTATOR", "q"),
+    ("TIER_LINGUISTIC_TYPE", "q"),
+    ("TIER_DEFAULT_LOCALE", "q"),
+    ("TIER_PARENT", "q"),
+    ("TIER_FILE", "q"),
+    ("TIER_ANNOTATION_START", "q"),
+    ("TIER_ANNOTATION_COUNT", "q"),
+    ("ANNOTATION_ID", "q"),
+    ("ANNOTATION_VALUE", "q"),
+    ("ANNOTATION_START", "q"),
+    ("ANNOTATION_END", "q"),
+    ("ANNOTATION_PARENT", "q"),
+    ("ANNOTATION_PREVIOUS", "q"),
+]
+
+
+# Round a byte offset up to the next multiple of 8
+def align_offset(offset):
+    return (offset + 7) & ~7
+
+
+# Class to build a deduplicated string table (shared with elan_binary)
+class ELANStringTable:
+
+    # Constructor
+    def __init__(self):
+        self.strings = []
+        self.indexes = {}
+
+    # Return the index of a string, adding it if necessary
+    def add(self, string):
+
+        if string is None:
+            return NULL_INDEX
+
+        if string not in self.indexes:
+            self.indexes[string] = len(self.strings)
+            self.strings.append(string)
+
+        return self.indexes[string]
+
+    # Produce the STRING_OFFSETS and STRING_DATA columns
+    def to_columns(self):
+
+        offsets = array("Q", [0])
+        data = bytearray()
+
+        for string in self.strings:
+            data += string.encode("utf-8")
+            offsets.append(len(data))
+
+        return offsets, array("B", bytes(data))
+
+
+# Build the columns of a snapshot from a list of ELANFile objects
+def _build_columns(elan_files):
+
+    strings = ELANStringTable()
+    columns = {}
+
+    for section_name, type_code in SECTIONS[2:]:
+        columns[section_name] = array(type_code)
+
+    for elan_file in elan_files:
+
+        columns["FILE_URL"].append(strings.add(elan_file.get_url()))
+        columns["FILE_TIER_START"].append(len(columns["TIER_ID"]))
+        columns["FILE_TIER_COUNT"].append(len(elan_file.get_tiers_to_read()))
+
+        # Global row numbers of the tiers and annotations of this file
+        tier_rows = {}
+        annotation_rows = {}
+        tier_row = len(columns["TIER_ID"])
+        annotation_row = len(columns["ANNOTATION_ID"])
+
+        for tier in elan_file.get_tiers_to_read():
+            tier_rows[tier.get_tier_id()] = tier_row
+            tier_row += 1
+
+            for annotation in tier:
+                annotation_rows[annotation.get_annotation_id()] = annotation_row
+                annotation_row += 1
+
+        time_slots_dict = elan_file.get_time_slots_dict_to_read()
+
+        for tier in elan_file.get_tiers_to_read():
+
+            columns["TIER_ID"].append(strings.add(tier.get_tier_id()))
+            columns["TIER_PARTICIPANT"].append(strings.add(tier.get_participant()))
+            columns["TIER_ANNOTATOR"].append(strings.add(tier.get_annotator()))
+            columns["TIER_LINGUISTIC_TYPE"].append(strings.add(tier.get_linguistic_type()))
+            columns["TIER_DEFAULT_LOCALE"].append(strings.add(tier.get_default_locale()))
+            columns["TIER_PARENT"].append(tier_rows.get(tier.get_parent_tier_ref(), NULL_INDEX))
+            columns["TIER_FILE"].append(len(columns["FILE_URL"]) - 1)
+            columns["TIER_ANNOTATION_START"].append(len(columns["ANNOTATION_ID"]))
+            columns["TIER_ANNOTATION_COUNT"].append(len(tier))
+
+            for annotation in tier:
+
+                columns["ANNOTATION_ID"].append(strings.add(annotation.get_annotation_id()))
+                columns["ANNOTATION_VALUE"].append(strings.add(annotation.get_annotation_value()))
+
+                if isinstance(annotation, ELANAlignableAnnotation):
+
+                    start_time_slot = time_slots_dict.get(annotation.get_start_time_slot())
+                    end_time_slot = time_slots_dict.get(annotation.get_end_time_slot())
+
+                    if start_time_slot is not None and start_time_slot.has_time_value():
+                        columns["ANNOTATION_START"].append(start_time_slot.get_time_value())
+                    else:
+                        columns["ANNOTATION_START"].append(NULL_TIME)
+
+                    if end_time_slot is not None and end_time_slot.has_time_value():
+                        columns["ANNOTATION_END"].append(end_time_slot.get_time_value())
+                    else:
+                        columns["ANNOTATION_END"].append(NULL_TIME)
+
+                    columns["ANNOTATION_PARENT"].append(NULL_INDEX)
+                    columns["ANNOTATION_PREVIOUS"].append(NULL_INDEX)
+
+                else:
+
+                    columns["ANNOTATION_START"].append(NULL_TIME)
+                    columns["ANNOTATION_END"].append(NULL_TIME)
+                    columns["ANNOTATION_PARENT"].append(annotation_rows.get(annotation.get_annotation_ref(), NULL_INDEX))
+                    columns["ANNOTATION_PREVIOUS"].append(annotation_rows.get(annotation.get_previous_annotation_ref(), NULL_INDEX))
+
+    columns["STRING_OFFSETS"], columns["STRING_DATA"] = strings.to_columns()
+
+    return columns
+
+
+# Lay out a set of columns in a single bytes object
+def _serialise_columns(columns):
+
+    section_table_size = len(SECTIONS) * SECTION_ENTRY_SIZE
+    offset = align_offset(HEADER_SIZE + section_table_size)
+
+    section_table = []
+    for section_name, type_code in SECTIONS:
+        column = columns[section_name]
+        section_table.append((offset, len(column)))
+        offset = align_offset(offset + len(column) * column.itemsize)
+
+    total_size = offset
+
+    buf = bytearray(total_size)
+    struct.pack_into(HEADER_FORMAT, buf, 0, SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(SECTIONS), total_size)
+
+    for position, (section_name, type_code) in enumerate(SECTIONS):
+        section_offset, item_count = section_table[position]
+        struct.pack_into(SECTION_ENTRY_FORMAT, buf, HEADER_SIZE + position * SECTION_ENTRY_SIZE, section_offset, item_count)
+
+        data = columns[section_name].tobytes()
+        buf[section_offset:section_offset + len(data)] = data
+
+    return buf
+
+
+# Class to model a read-only view on a single annotation of a snapshot
+class ELANSnapshotAnnotation:
+
+    # Reference to the snapshot
+    snapshot = None
+
+    # Row of the annotation in the annotation columns
+    row = None
+
+    # Reference to the tier view
+    tier = None
+
+    # Constructor
+    def __init__(self, snapshot, row, tier):
+        self.snapshot = snapshot
+        self.row = row
+        self.tier = tier
+
+    # Getter methods
+    def get_tier(self):
+        return self.tier
+
+    def get_annotation_id(self):
+        return self.snapshot.get_string(self.snapshot.columns["ANNOTATION_ID"][self.row])
+
+    def get_annotation_value(self):
+        return self.snapshot.get_string(self.snapshot.columns["ANNOTATION_VALUE"][self.row])
+
+    def get_annotation_type(self):
+        if self.snapshot.columns["ANNOTATION_PARENT"][self.row] == NULL_INDEX:
+            return "Alignable_Annotation"
+        else:
+            return "Ref_Annotation"
+
+    def get_start_time(self):
+        start_time = self.snapshot.columns["ANNOTATION_START"][self.row]
+        if start_time == NULL_TIME:
+            return None
+        else:
+            return start_time
+
+    def get_end_time(self):
+        end_time = self.snapshot.columns["ANNOTATION_END"][self.row]
+        if end_time == NULL_TIME:
+            return None
+        else:
+            return end_time
+
+    def get_annotation_ref(self):
+        parent_row = self.snapshot.columns["ANNOTATION_PARENT"][self.row]
+        if parent_row == NULL_INDEX:
+            return None
+        else:
+            return self.snapshot.get_string(self.snapshot.columns["ANNOTATION_ID"][parent_row])
+
+    def get_previous_annotation_ref(self):
+        previous_row = self.snapshot.columns["ANNOTATION_PREVIOUS"][self.row]
+        if previous_row == NULL_INDEX:
+            return None
+        else:
+            return self.snapshot.get_string(self.snapshot.columns["ANNOTATION_ID"][previous_row])
+
+    def get_parent_annotation(self):
+        parent_row = self.snapshot.columns["ANNOTATION_PARENT"][self.row]
+        if parent_row == NULL_INDEX:
+            return None
+        else:
+            return self.snapshot.get_annotation_by_row(parent_row)
+
+    def has_annotation_value(self):
+        if self.get_annotation_value() != "":
+            return True
+        else:
+            return False
+
+    def is_empty(self):
+        if self.get_annotation_value() in (None, ""):
+            return True
+        else:
+            return False
+
+    # Length in milliseconds (only defined for aligned annotations)
+    def __len__(self):
+        start_time = self.get_start_time()
+        end_time = self.get_end_time()
+
+        if start_time is None or end_time is None:
+            return 0
+        else:
+            return abs(end_time - start_time)
+
+    def __repr__(self):
+        return "[" + str(self.get_annotation_id()) + ", " + str(self.get_start_time()) + ", " + str(self.get_end_time()) + ", " + repr(self.get_annotation_value()) + "]"
+
+
+# Class to model a read-only view on a single tier of a snapshot
+class ELANSnapshotTier:
+
+    # Reference to the snapshot
+    snapshot = None
+
+    # Row of the tier in the tier columns
+    row = None
+
+    # Constructor
+    def __init__(self, snapshot, row):
+        self.snapshot = snapshot
+        self.row = row
+
+    # Getter methods
+    def get_tier_id(self):
+        return self.snapshot.get_string(self.snapshot.columns["TIER_ID"][self.row])
+
+    def get_participant(self):
+        return self.snapshot.get_string(self.snapshot.columns["TIER_PARTICIPANT"][self.row])
+
+    def get_annotator(self):
+        return self.snapshot.get_string(self.snapshot.columns["TIER_ANNOTATOR"][self.row])
+
+    def get_linguistic_type(self):
+        return self.snapshot.get_string(self.snapshot.columns["TIER_LINGUISTIC_TYPE"][self.row])
+
+    def get_default_locale(self):
+        return self.snapshot.get_string(self.snapshot.columns["TIER_DEFAULT_LOCALE"][self.row])
+
+    def get_parent_tier_ref(self):
+        parent_row = self.snapshot.columns["TIER_PARENT"][self.row]
+        if parent_row == NULL_INDEX:
+            return None
+        else:
+            return self.snapshot.get_string(self.snapshot.columns["TIER_ID"][parent_row])
+
+    def get_parent_tier(self):
+        parent_row = self.snapshot.columns["TIER_PARENT"][self.row]
+        if parent_row == NULL_INDEX:
+            return None
+        else:
+            return self.snapshot.get_tier_by_row(parent_row)
+
+    def get_file_index(self):
+        return self.snapshot.columns["TIER_FILE"][self.row]
+
+    def get_annotations(self):
+        return list(self)
+
+    # Zero-copy slices of the time columns of this tier
+    def get_start_times(self):
+        start = self.snapshot.columns["TIER_ANNOTATION_START"][self.row]
+        return self.snapshot.columns["ANNOTATION_START"][start:start + len(self)]
+
+    def get_end_times(self):
+        start = self.snapshot.columns["TIER_ANNOTATION_START"][self.row]
+        return self.snapshot.columns["ANNOTATION_END"][start:start + len(self)]
+
+    def has_participant(self):
+        if self.get_participant() is not None:
+            return True
+        else:
+            return False
+
+    def has_parent_tier_ref(self):
+        if self.snapshot.columns["TIER_PARENT"][self.row] != NULL_INDEX:
+            return True
+        else:
+            return False
+
+    def has_annotations(self):
+        if len(self) > 0:
+            return True
+        else:
+            return False
+
+    def is_empty(self):
+        if len(self) == 0:
+            return True
+        else:
+            return False
+
+    # Useful hooks
+    def __len__(self):
+        return self.snapshot.columns["TIER_ANNOTATION_COUNT"][self.row]
+
+    def __iter__(self):
+        start = self.snapshot.columns["TIER_ANNOTATION_START"][self.row]
+        for row in range(start, start + len(self)):
+            yield ELANSnapshotAnnotation(self.snapshot, row, self)
+
+    def __repr__(self):
+        return "[" + str(self.get_tier_id()) + ", " + str(len(self)) + " annotations]"
+
+
+# Class to model a columnar snapshot of a set of ELAN files
+class ELANSnapshot:
+
+    # Name of the shared memory block (if any)
+    name = None
+
+    # Path of the mmapped file (if any)
+    path = None
+
+    # Underlying shared memory block or mmap object
+    storage = None
+
+    # Read-only memoryview of the whole buffer
+    buffer = None
+
+    # Dictionary from section names to typed memoryviews
+    columns = None
+
+    # Cache of decoded strings
+    strings_cache = None
+
+    # Dictionary view from (file index, tier ID) to tier rows
+    tier_rows_dict = None
+
+    # Constructor (use export or attach instead)
+    def __init__(self, storage, buf, name=None, path=None):
+        self.storage = storage
+        self.name = name
+        self.path = path
+        self.strings_cache = {}
+        self.tier_rows_dict = None
+
+        # Read-only view on the whole buffer
+        self.buffer = memoryview(buf)
+        if not self.buffer.readonly:
+            self.buffer = self.buffer.toreadonly()
+
+        magic, version, section_count, total_size = struct.unpack_from(HEADER_FORMAT, self.buffer, 0)
+
+        if magic != SNAPSHOT_MAGIC:
+            raise RuntimeError("Buffer does not contain an ELAN snapshot.")
+
+        if version != SNAPSHOT_VERSION:
+            raise RuntimeError("Unsupported ELAN snapshot version: " + str(version))
+
+        if section_count != len(SECTIONS):
+            raise RuntimeError("Unexpected number of sections in ELAN snapshot: " + str(section_count))
+
+        # Construct zero-copy column views
+        self.columns = {}
+        for position, (section_name, type_code) in enumerate(SECTIONS):
+            offset, item_count = struct.unpack_from(SECTION_ENTRY_FORMAT, self.buffer, HEADER_SIZE + position * SECTION_ENTRY_SIZE)
+            item_size = array(type_code).itemsize
+            self.columns[section_name] = self.buffer[offset:offset + item_count * item_size].cast(type_code)
+
+    # Factory method to export a list of ELANFile objects into a snapshot.
+    # Without a path, the snapshot is placed in a new shared memory block
+    # (named name, or a random name); with a path, it is written to that
+    # file and mmapped.
+    @classmethod
+    def export(cls, elan_files, name=None, path=None):
+
+        buf = _serialise_columns(_build_columns(elan_files))
+
+        if path is not None:
+
+            with open(path, "wb") as output_file:
+                output_file.write(buf)
+
+            return cls.attach(path=path)
+
+        if shared_memory is None:
+            raise RuntimeError("Shared memory snapshots require multiprocessing.shared_memory (Python 3.8 or later).")
+
+        block = shared_memory.SharedMemory(name=name, create=True, size=len(buf))
+        block.buf[:len(buf)] = buf
+
+        return cls(block, block.buf[:len(buf)], name=block.name)
+
+    # Factory method to attach to an existing snapshot, either in a
+    # shared memory block with the given name or in the file at path
+    @classmethod
+    def attach(cls, name=None, path=None):
+
+        if path is not None:
+
+            with open(path, "rb") as input_file:
+                mapping = mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+            return cls(mapping, mapping, path=path)
+
+        if name is None:
+            raise RuntimeError("Either the name of a shared memory block or a path is required.")
+
+        if shared_memory is None:
+            raise RuntimeError("Shared memory snapshots require multiprocessing.shared_memory (Python 3.8 or later).")
+
+        # Attaching processes must not unlink the block when they exit.
+        # Before Python 3.13 the block cannot be attached untracked; worker
+        # processes started by the creator share its resource tracker, so
+        # the block is still only released by unlink.
+        try:
+            block = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            block = shared_memory.SharedMemory(name=name)
+
+        total_size = struct.unpack_from(HEADER_FORMAT, block.buf, 0)[3]
+
+        return cls(block, block.buf[:total_size], name=name)
+
+    # Release all views on the buffer and detach from it
+    def close(self):
+
+        if self.columns is not None:
+            for column in self.columns.values():
+                column.release()
+            self.columns = None
+
+        if self.buffer is not None:
+            self.buffer.release()
+            self.buffer = None
+
+        if self.storage is not None:
+            self.storage.close()
+
+    # Remove the shared memory block (to be called once, by its creator)
+    def unlink(self):
+        if shared_memory is not None and isinstance(self.storage, shared_memory.SharedMemory):
+            self.storage.unlink()
+
+    # Getter methods
+    def get_name(self):
+        return self.name
+
+    def get_path(self):
+        return self.path
+
+    def get_string(self, index):
+
+        if index == NULL_INDEX:
+            return None
+
+        if index not in self.strings_cache:
+            offsets = self.columns["STRING_OFFSETS"]
+            self.strings_cache[index] = bytes(self.columns["STRING_DATA"][offsets[index]:offsets[index + 1]]).decode("utf-8")
+
+        return self.strings_cache[index]
+
+    def get_file_count(self):
+        return len(self.columns["FILE_URL"])
+
+    def get_file_url(self, file_index):
+        return self.get_string(self.columns["FILE_URL"][file_index])
+
+    def get_tier_by_row(self, row):
+        return ELANSnapshotTier(self, row)
+
+    def get_annotation_by_row(self, row):
+
+        # The containing tier is the last one starting at or before the row
+        tier_row = bisect_right(self.columns["TIER_ANNOTATION_START"], row) - 1
+
+        return ELANSnapshotAnnotation(self, row, ELANSnapshotTier(self, tier_row))
+
+    # Return the tier views of one file or of all files
+    def get_tiers(self, file_index=None):
+
+        if file_index is None:
+            return [ELANSnapshotTier(self, row) for row in range(len(self.columns["TIER_ID"]))]
+
+        start = self.columns["FILE_TIER_START"][file_index]
+        count = self.columns["FILE_TIER_COUNT"][file_index]
+
+        return [ELANSnapshotTier(self, row) for row in range(start, start + count)]
+
+    def get_tier_by_id(self, tier_id, file_index=0):
+
+        # Build the dictionary view on tiers on first use
+        if self.tier_rows_dict is None:
+            self.tier_rows_dict = {}
+            for row in range(len(self.columns["TIER_ID"])):
+                self.tier_rows_dict[(self.columns["TIER_FILE"][row], self.get_string(self.columns["TIER_ID"][row]))] = row
+
+        if (file_index, tier_id) in self.tier_rows_dict:
+            return ELANSnapshotTier(self, self.tier_rows_dict[(file_index, tier_id)])
+        else:
+            return None
+
+    def __len__(self):
+        return self.get_file_count()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
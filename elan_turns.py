@@ -0,0 +1,280 @@
+# Turn-taking analysis of ELAN files
+#
+# The time-aligned annotations of the selected tiers (by default all
+# top-level tiers) are merged by start time with a k-way heap merge of the
+# already sorted tiers. A single sweep over the merged stream keeps track of
+# the participant holding the floor, i.e. the annotation reaching furthest
+# in time so far, and compares every annotation only with it:
+#
+#   gap      silence between annotations of different participants
+#   pause    silence between annotations of the same participant
+#   overlap  an annotation of another participant starts before the
+#            annotation holding the floor has ended
+#
+# Gaps and overlaps in which the next participant ends up holding the floor
+# are floor transfers. The cost is O(n log k) for n annotations on k tiers.
+# Summaries keep duration histograms, so the summaries of several files can
+# be merged into exact corpus distributions.
+
+from functools import partial
+from heapq import merge
+
+from elan import ELANAnnotationStatistics
+from elan_corpus import map_elan_files
+
+# Kinds of turn-taking events
+GAP = "gap"
+PAUSE = "pause"
+OVERLAP = "overlap"
+
+EVENT_KINDS = [GAP, PAUSE, OVERLAP]
+
+
+# Class to model a single gap, pause or overlap between two annotations
+class ELANTurnEvent:
+
+    # Kind of the event (GAP, PAUSE or OVERLAP)
+    kind = None
+
+    # Time interval of the silence or overlap
+    start_time = None
+    end_time = None
+
+    # Participants and annotations before and after the event
+    from_participant = None
+    to_participant = None
+    from_annotation = None
+    to_annotation = None
+
+    # Whether the floor passes to to_participant
+    floor_transfer = False
+
+    # Constructor
+    def __init__(self, kind, start_time, end_time, from_participant, to_participant, from_annotation, to_annotation, floor_transfer=False):
+        self.kind = kind
+        self.start_time = start_time
+        self.end_time = end_time
+        self.from_participant = from_participant
+        self.to_participant = to_participant
+        self.from_annotation = from_annotation
+        self.to_annotation = to_annotation
+        self.floor_transfer = floor_transfer
+
+    # Getter methods
+    def get_kind(self):
+        return self.kind
+
+    def get_start_time(self):
+        return self.start_time
+
+    def get_end_time(self):
+        return self.end_time
+
+    def get_duration(self):
+        return self.end_time - self.start_time
+
+    def get_from_participant(self):
+        return self.from_participant
+
+    def get_to_participant(self):
+        return self.to_participant
+
+    def get_from_annotation(self):
+        return self.from_annotation
+
+    def get_to_annotation(self):
+        return self.to_annotation
+
+    def is_floor_transfer(self):
+        return self.floor_transfer
+
+    def __repr__(self):
+        return "[" + self.kind + ", " + str(self.from_participant) + " -> " + str(self.to_participant) + ", " + str(self.start_time) + "-" + str(self.end_time) + "]"
+
+
+# Class to model the distributions of the turn-taking events of one or more
+# ELAN files
+class ELANTurnTakingSummary:
+
+    # Dictionary from event kinds to duration statistics
+    events = None
+
+    # Dictionary from (from_participant, to_participant) pairs to the
+    # number of floor transfers between them
+    transfers = None
+
+    # Number of files the summary is based on
+    file_count = 0
+
+    # Constructor
+    def __init__(self):
+        self.events = dict((kind, ELANAnnotationStatistics()) for kind in EVENT_KINDS)
+        self.transfers = {}
+        self.file_count = 0
+
+    # Add a single event
+    def add(self, event):
+
+        self.events[event.kind].add(event.end_time - event.start_time, None, True)
+
+        if event.floor_transfer:
+            pair = (event.from_participant, event.to_participant)
+            self.transfers[pair] = self.transfers.get(pair, 0) + 1
+
+    # Add the events and transfers of another summary to this one
+    def merge(self, other):
+
+        for kind, statistics in other.events.items():
+            self.events[kind].merge(statistics)
+
+        for pair, count in other.transfers.items():
+            self.transfers[pair] = self.transfers.get(pair, 0) + count
+
+        self.file_count += other.file_count
+
+    # Getter methods
+    def get_event_statistics(self, kind):
+        return self.events[kind]
+
+    def get_transfers(self):
+        return self.transfers
+
+    def get_transfer_count(self, from_participant, to_participant):
+        return self.transfers.get((from_participant, to_participant), 0)
+
+    def get_file_count(self):
+        return self.file_count
+
+    # Summarise the distributions in a dictionary
+    def to_dict(self, percentiles=(10, 50, 90)):
+
+        summary = {"file_count": self.file_count, "transfers": dict(self.transfers)}
+
+        for kind, statistics in self.events.items():
+            distribution = statistics.to_dict(percentiles)
+            del distribution["aligned_count"]
+            del distribution["empty_count"]
+            del distribution["vocabulary_size"]
+            summary[kind] = distribution
+
+        return summary
+
+
+# Return the participant of a tier, falling back to the tier ID
+def _get_speaker(tier):
+
+    participant = tier.get_participant()
+
+    if participant is None or participant == "":
+        return tier.get_tier_id()
+    else:
+        return participant
+
+
+# Yield the time-aligned annotations of the given tiers (by default all
+# top-level tiers) as (start, end, participant, annotation) tuples ordered
+# by start time
+def iter_merged_annotations(elan_file, tiers=None):
+
+    if tiers is None:
+        tiers = [tier for tier in elan_file.get_tiers() if tier.get_parent_tier_ref() is None]
+
+    streams = []
+    for tier in tiers:
+        tier = elan_file.resolve_tier(tier)
+        speaker = _get_speaker(tier)
+        streams.append([(start, end, speaker, annotation) for start, end, annotation in elan_file.get_time_intervals(tier)])
+
+    return merge(*streams, key=lambda item: (item[0], item[1]))
+
+
+# Yield the gaps, pauses and overlaps between the annotations of the given
+# tiers (by default all top-level tiers) as ELANTurnEvent objects in order
+# of time. Pauses and gaps shorter than min_silence are ignored, as are
+# overlaps shorter than min_overlap.
+def iter_turn_events(elan_file, tiers=None, min_silence=0, min_overlap=0):
+
+    floor_end = None
+    floor_speaker = None
+    floor_annotation = None
+
+    for start, end, speaker, annotation in iter_merged_annotations(elan_file, tiers):
+
+        if floor_end is None:
+            floor_end = end
+            floor_speaker = speaker
+            floor_annotation = annotation
+            continue
+
+        if start >= floor_end:
+
+            # Silence before the annotation (a gap of 0 ms is a transfer
+            # without gap or overlap)
+            silence = start - floor_end
+            if speaker == floor_speaker:
+                if silence > 0 and silence >= min_silence:
+                    yield ELANTurnEvent(PAUSE, floor_end, start, floor_speaker, speaker, floor_annotation, annotation)
+            elif silence >= min_silence:
+                yield ELANTurnEvent(GAP, floor_end, start, floor_speaker, speaker, floor_annotation, annotation, floor_transfer=True)
+
+            floor_end = end
+            floor_speaker = speaker
+            floor_annotation = annotation
+
+        elif speaker != floor_speaker:
+
+            # Overlapping speech of another participant; the floor passes
+            # on if the annotation outlasts the current floor holder
+            overlap_end = min(end, floor_end)
+            floor_transfer = end > floor_end
+
+            if overlap_end - start >= min_overlap:
+                yield ELANTurnEvent(OVERLAP, start, overlap_end, floor_speaker, speaker, floor_annotation, annotation, floor_transfer)
+
+            if floor_transfer:
+                floor_end = end
+                floor_speaker = speaker
+                floor_annotation = annotation
+
+        elif end > floor_end:
+
+            # The same participant continues (e.g. on a second tier)
+            floor_end = end
+            floor_annotation = annotation
+
+
+# Summarise the turn-taking events of an ELAN file
+def summarize_turn_taking(elan_file, tiers=None, min_silence=0, min_overlap=0):
+
+    summary = ELANTurnTakingSummary()
+    summary.file_count = 1
+
+    for event in iter_turn_events(elan_file, tiers, min_silence, min_overlap):
+        summary.add(event)
+
+    return summary
+
+
+# Summarise the turn-taking events of a corpus (a directory or a list of
+# file names) in parallel. Tiers are selected by ID in every file (by
+# default all top-level tiers) and missing tiers are skipped. Returns one
+# ELANTurnTakingSummary for the whole corpus.
+def summarize_corpus_turn_taking(sources, tier_ids=None, min_silence=0, min_overlap=0, processes=None, chunksize=1):
+
+    function = partial(_summarize_selected_tiers, tier_ids=tier_ids, min_silence=min_silence, min_overlap=min_overlap)
+
+    total = ELANTurnTakingSummary()
+    for source, summary in map_elan_files(function, sources, processes, chunksize):
+        total.merge(summary)
+
+    return total
+
+
+# Summarise the tiers of an ELAN file that exist among the given tier IDs
+def _summarize_selected_tiers(elan_file, tier_ids=None, min_silence=0, min_overlap=0):
+
+    tiers = None
+    if tier_ids is not None:
+        tiers = [tier_id for tier_id in tier_ids if elan_file.get_tier_by_id(tier_id) is not None]
+
+    return summarize_turn_taking(elan_file, tiers, min_silence, min_overlap)
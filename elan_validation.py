@@ -0,0 +1,141 @@
+# Validation of ELAN files against their controlled vocabularies
+#
+# Tiers whose linguistic type refers to a controlled vocabulary may only
+# contain values from that vocabulary. The checker resolves the vocabulary
+# of every tier once and checks all annotation values of the tier in a
+# single pass. Violations can optionally come with the closest entry of the
+# vocabulary as a suggestion. Whole corpora are checked in parallel.
+
+from difflib import get_close_matches
+from functools import partial
+
+from elan_corpus import map_elan_files
+
+
+# Class to model a single annotation violating a controlled vocabulary
+class ELANCVViolation:
+
+    # File, tier and annotation
+    file_name = None
+    tier_id = None
+    annotation_id = None
+
+    # Offending value and the time interval of the annotation
+    value = None
+    start_time = None
+    end_time = None
+
+    # Controlled vocabulary and the closest entry (if requested)
+    cv_id = None
+    suggestion = None
+
+    # Constructor
+    def __init__(self, file_name, tier_id, annotation_id, value, cv_id, start_time=None, end_time=None, suggestion=None):
+        self.file_name = file_name
+        self.tier_id = tier_id
+        self.annotation_id = annotation_id
+        self.value = value
+        self.cv_id = cv_id
+        self.start_time = start_time
+        self.end_time = end_time
+        self.suggestion = suggestion
+
+    # Getter methods
+    def get_file_name(self):
+        return self.file_name
+
+    def get_tier_id(self):
+        return self.tier_id
+
+    def get_annotation_id(self):
+        return self.annotation_id
+
+    def get_value(self):
+        return self.value
+
+    def get_cv_id(self):
+        return self.cv_id
+
+    def get_start_time(self):
+        return self.start_time
+
+    def get_end_time(self):
+        return self.end_time
+
+    def get_suggestion(self):
+        return self.suggestion
+
+    def has_suggestion(self):
+        if self.suggestion is not None:
+            return True
+        else:
+            return False
+
+    def __repr__(self):
+        return "[" + str(self.tier_id) + ", " + str(self.annotation_id) + ", " + repr(self.value) + " not in " + str(self.cv_id) + "]"
+
+
+# Check all tiers of an ELAN file against their controlled vocabularies and
+# return a list of ELANCVViolation objects. Their times are the effective
+# times of the annotations (see ELANFile.get_effective_times), so reference
+# annotations and annotations on unaligned time slots get times as well.
+# Empty annotation values are accepted unless allow_empty is False.
+# Controlled vocabularies stored in external files cannot be checked and
+# are skipped.
+def check_controlled_vocabularies(elan_file, suggest=False, allow_empty=True, cutoff=0.6):
+
+    file_name = elan_file.get_url()
+    if not isinstance(file_name, str):
+        file_name = None
+
+    # Computed when the first violation is found
+    effective_times = None
+    violations = []
+
+    for tier in elan_file.get_tiers_to_read():
+
+        # Resolve the controlled vocabulary of the tier once
+        controlled_vocabulary = elan_file.get_controlled_vocabulary_for_tier(tier)
+        if controlled_vocabulary is None or controlled_vocabulary.has_ext_ref():
+            continue
+
+        allowed_values = controlled_vocabulary.get_cv_entries_dict()
+        cv_id = controlled_vocabulary.get_cv_id()
+        suggestions = {}
+
+        for annotation in tier:
+
+            value = annotation.get_annotation_value()
+
+            if value in allowed_values:
+                continue
+
+            if allow_empty and annotation.is_empty():
+                continue
+
+            if effective_times is None:
+                effective_times = elan_file.get_effective_times()
+
+            start_time, end_time = effective_times.get(annotation.get_annotation_id(), (None, None))
+
+            # Look up the closest entry once per distinct value
+            suggestion = None
+            if suggest:
+                if value not in suggestions:
+                    matches = get_close_matches(value or "", list(allowed_values), n=1, cutoff=cutoff)
+                    suggestions[value] = matches[0] if matches else None
+                suggestion = suggestions[value]
+
+            violations.append(ELANCVViolation(file_name, tier.get_tier_id(), annotation.get_annotation_id(), value, cv_id, start_time, end_time, suggestion))
+
+    return violations
+
+
+# Check a corpus (a directory or a list of file names) in parallel and
+# yield (file name, list of violations) pairs
+def check_corpus_controlled_vocabularies(sources, suggest=False, allow_empty=True, cutoff=0.6, processes=None, chunksize=1):
+
+    function = partial(check_controlled_vocabularies, suggest=suggest, allow_empty=allow_empty, cutoff=cutoff)
+
+    for file_name, violations in map_elan_files(function, sources, processes, chunksize):
+        yield file_name, violations
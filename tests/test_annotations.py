@@ -0,0 +1,56 @@
+# Tests of adding annotations to tiers
+
+import os
+
+from elan import ELANFile, ELANAlignableAnnotation
+
+SAMPLE_FILE_NAME = os.path.join(os.path.dirname(__file__), "data", "sample.eaf")
+
+
+def test_bulk_annotations_are_merged_by_time():
+
+    elan_file = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+    elan_file.start_journal()
+    tier = elan_file.get_tier_by_id("B_words")
+
+    late, early = tier.add_annotations([(5000, 6000, "late"), (0, 500, "early")])[::-1]
+    same = tier.add_annotations([(1200, 3000, "same")])[0]
+
+    assert [annotation.get_annotation_id() for annotation in tier.get_annotations()] == \
+        [early.get_annotation_id(), "a3", same.get_annotation_id(), late.get_annotation_id()]
+    assert (late.get_start_time(), late.get_end_time()) == (5000, 6000)
+
+    elan_file.undo()
+    elan_file.undo()
+    assert [annotation.get_annotation_id() for annotation in tier.get_annotations()] == ["a3"]
+
+
+def test_duplicate_ids_are_accepted_by_add_annotation():
+
+    elan_file = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+    tier = elan_file.get_tier_by_id("B_words")
+
+    duplicate = ELANAlignableAnnotation("a3", "again", "ts5", "ts6", elan_file, tier)
+    tier.add_annotation(duplicate)
+
+    assert len(tier.get_annotations()) == 2
+    assert elan_file.get_annotation_by_id("a3") is duplicate
+
+
+def test_undo_of_bulk_annotations_removes_them_by_position():
+
+    elan_file = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+    elan_file.start_journal()
+    tier = elan_file.get_tier_by_id("B_words")
+    tier.add_annotations([(100 * number, 100 * number + 50, str(number)) for number in range(40)])
+
+    annotation_ids = [annotation.get_annotation_id() for annotation in tier.get_annotations()]
+    annotations_dict = tier.annotations_dict
+
+    elan_file.undo()
+    assert [annotation.get_annotation_id() for annotation in tier.get_annotations()] == ["a3"]
+    assert tier.annotations_dict is annotations_dict
+    assert list(annotations_dict) == ["a3"]
+
+    elan_file.redo()
+    assert [annotation.get_annotation_id() for annotation in tier.get_annotations()] == annotation_ids
@@ -0,0 +1,57 @@
+# Tests of reading ELAN files from zip archives
+
+import gzip
+import os
+import zipfile
+
+import pytest
+
+from elan import ELANFile
+
+SAMPLE_FILE_NAME = os.path.join(os.path.dirname(__file__), "data", "sample.eaf")
+
+
+# Per-file function applied inside the worker processes
+def count_tiers(elan_file):
+    return len(elan_file.get_tiers())
+
+
+@pytest.fixture
+def archive_name(tmp_path):
+
+    with open(SAMPLE_FILE_NAME, "rb") as input_file:
+        data = input_file.read()
+
+    archive_name = str(tmp_path / "corpus.zip")
+    with zipfile.ZipFile(archive_name, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("session/sample.eaf", data)
+        archive.writestr("session/sample.eaf.gz", gzip.compress(data))
+        archive.writestr("session/notes.txt", b"not an ELAN file")
+
+    return archive_name
+
+
+def test_read_archive_member(archive_name):
+
+    expected = ELANFile.read_elan_file(SAMPLE_FILE_NAME).to_xml()
+
+    elan_file = ELANFile.read_elan_file(archive_name + "/session/sample.eaf")
+    assert elan_file.to_xml() == expected
+    assert elan_file.get_url() == archive_name + "/session/sample.eaf"
+
+    assert ELANFile.read_elan_file(archive_name + "/session/sample.eaf.gz").to_xml() == expected
+    assert ELANFile.read_elan_file(zipfile.Path(archive_name, "session/sample.eaf")).to_xml() == expected
+
+    with pytest.raises(RuntimeError):
+        ELANFile.read_elan_file(archive_name + "/session/sample.eaf", lazy_tiers=True)
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_read_elan_archive(archive_name, processes):
+
+    results = list(ELANFile.read_elan_archive(archive_name, processes=processes))
+    assert [member for member, elan_file in results] == ["session/sample.eaf", "session/sample.eaf.gz"]
+    assert all(len(elan_file.get_annotations_dict()) == 9 for member, elan_file in results)
+
+    results = list(ELANFile.read_elan_archive(archive_name, members=["session/sample.eaf"], processes=processes, function=count_tiers))
+    assert results == [("session/sample.eaf", 5)]
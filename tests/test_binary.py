@@ -0,0 +1,49 @@
+# Tests of the binary companion format
+
+import os
+
+import pytest
+
+from elan import ELANFile
+from elan_binary import ELANBinaryFile, write_binary_file, read_binary_file
+
+DATA_DIRECTORY = os.path.join(os.path.dirname(__file__), "data")
+
+
+@pytest.mark.parametrize("file_name", ["sample.eaf", "subdivision.eaf"])
+def test_binary_round_trip(file_name, tmp_path):
+
+    elan_file = ELANFile.read_elan_file(os.path.join(DATA_DIRECTORY, file_name))
+    path = str(tmp_path / "file.eafb")
+
+    write_binary_file(elan_file, path)
+
+    assert read_binary_file(path).to_xml() == elan_file.to_xml()
+
+
+def test_load_single_tier(tmp_path):
+
+    elan_file = ELANFile.read_elan_file(os.path.join(DATA_DIRECTORY, "sample.eaf"))
+    path = str(tmp_path / "sample.eafb")
+    write_binary_file(elan_file, path)
+
+    with ELANBinaryFile(path) as binary_file:
+
+        assert binary_file.get_tier_ids() == [tier.get_tier_id() for tier in elan_file.get_tiers()]
+        assert "B_words" in binary_file
+
+        tier = binary_file.load_tier("B_words")
+        assert [(annotation.get_start_time(), annotation.get_end_time(), annotation.get_annotation_value()) for annotation in tier] == \
+            [(1200, 3000, "hi there")]
+        assert sorted(tier.get_ELAN_file().get_time_slots_dict()) == ["ts5", "ts6"]
+        assert tier.get_ELAN_file().get_controlled_vocabulary_by_id("glosses").get_cv_entry_by_value("N").get_description() == "noun"
+        assert not tier.get_ELAN_file().get_linguistic_type_by_id("gloss").is_time_alignable()
+
+        with pytest.raises(KeyError):
+            binary_file.load_tier("missing")
+
+
+def test_reject_other_files():
+
+    with pytest.raises(RuntimeError):
+        ELANBinaryFile(os.path.join(DATA_DIRECTORY, "sample.eaf"))
@@ -0,0 +1,116 @@
+# Tests of copy-on-access clones of ELAN files
+
+import os
+
+import pytest
+
+from elan import ELANFile
+
+SAMPLE_FILE_NAME = os.path.join(os.path.dirname(__file__), "data", "sample.eaf")
+
+
+@pytest.fixture
+def elan_file():
+    return ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+
+
+def test_file_level_methods_see_shared_tiers(elan_file):
+
+    assert elan_file.clone().statistics().get_totals().get_count() == 9
+    assert [tier.get_tier_id() for tier in elan_file.clone().get_tiers_in_hierarchy_order()] == \
+        [tier.get_tier_id() for tier in elan_file.get_tiers_in_hierarchy_order()]
+    assert elan_file.clone().has_tiers()
+    assert elan_file.clone().has_annotations()
+    assert len(elan_file.clone().get_effective_times()) == 9
+
+    columns, codebook, tier_ids = elan_file.clone().get_annotation_columns()
+    assert len(columns["value"]) == 9
+
+    clone = elan_file.clone()
+    assert clone.to_xml() == elan_file.to_xml()
+
+
+def test_to_numpy_on_clone(elan_file):
+
+    pytest.importorskip("numpy")
+
+    data, codebook, tier_ids = elan_file.clone().to_numpy()
+    assert len(data) == 9
+
+
+def test_changes_to_the_source_are_not_seen_by_the_clone(elan_file):
+
+    clone = elan_file.clone()
+    elan_file.get_annotation_by_id("a1").set_annotation_value("changed")
+    elan_file.get_time_slot_by_id("ts1").set_time_value(500)
+    assert clone.get_annotation_by_id("a1").get_annotation_value() == "hello world"
+    assert clone.get_time_slot_by_id("ts1").get_time_value() == 0
+
+    clone = elan_file.clone()
+    elan_file.remove_annotations(["a1"])
+    elan_file.remove_tier("B_words")
+    assert len(clone.get_annotations_dict()) == 9
+    assert clone.get_tier_by_id("B_words") is not None
+
+    clone = elan_file.clone()
+    elan_file.compact()
+    assert sorted(clone.get_annotations_dict()) == ["a2"]
+    assert clone.get_annotation_by_id("a2").get_annotation_value() == "good & bye"
+
+
+def test_changes_to_the_clone_are_not_seen_by_the_source(elan_file):
+
+    clone = elan_file.clone()
+    clone.get_annotation_by_id("a2").set_annotation_value("changed")
+    clone.remove_tier("A_words")
+    assert elan_file.get_annotation_by_id("a2").get_annotation_value() == "good & bye"
+    assert len(elan_file.get_tiers()) == 5
+
+    second_clone = clone.clone()
+    clone.get_annotation_by_id("a3").set_annotation_value("changed")
+    assert second_clone.get_annotation_by_id("a3").get_annotation_value() == "hi there"
+
+
+def test_reading_a_clone_does_not_copy_shared_parts(elan_file):
+
+    clone = elan_file.clone()
+
+    assert clone.to_xml() == elan_file.to_xml()
+    assert clone.statistics().get_totals().get_count() == 9
+    assert clone.get_effective_times() == elan_file.get_effective_times()
+    assert len(clone.get_annotation_columns(["A_words"])[0]["value"]) == 2
+    assert clone.has_annotations()
+    assert clone.get_controlled_vocabulary_for_tier("A_gloss") is not None
+
+    annotation = clone.get_tier_by_id("A_words").get_annotations()[0]
+    assert annotation.get_start_time() == elan_file.get_annotation_by_id(annotation.get_annotation_id()).get_start_time()
+
+    assert clone.shared_time_order
+    assert sorted(clone.shared_tiers) == ["A_gloss", "A_morph", "A_translation", "B_words"]
+
+
+def test_controlled_vocabularies_are_shared_until_handed_out(elan_file):
+
+    clone = elan_file.clone()
+    assert clone.controlled_vocabularies is elan_file.controlled_vocabularies
+
+    controlled_vocabulary = clone.get_controlled_vocabulary_by_id("glosses")
+    assert controlled_vocabulary is not elan_file.get_controlled_vocabulary_by_id("glosses")
+    assert not clone.shared_controlled_vocabularies
+
+    clone = elan_file.clone()
+    elan_file.get_controlled_vocabularies().pop()
+    assert len(clone.get_controlled_vocabularies()) == 1
+
+
+def test_loading_tiers_of_the_source_does_not_copy_shared_parts():
+
+    elan_file = ELANFile.read_elan_file(SAMPLE_FILE_NAME, lazy_tiers=True)
+    elan_file.load_tier("A_words")
+
+    clone = elan_file.clone()
+    assert clone.to_xml() == elan_file.to_xml() == ELANFile.read_elan_file(SAMPLE_FILE_NAME).to_xml()
+
+    assert clone.clone_source is elan_file
+    assert clone.shared_time_order
+    assert sorted(clone.shared_tiers) == ["A_words"]
@@ -0,0 +1,33 @@
+# Tests of the compaction of the time order and IDs
+
+import os
+
+import pytest
+
+from elan import ELANFile
+
+SAMPLE_FILE_NAME = os.path.join(os.path.dirname(__file__), "data", "sample.eaf")
+
+
+def test_compact_renumbers_in_time_order():
+
+    elan_file = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+    elan_file.remove_tier("B_words")
+
+    result = elan_file.compact()
+
+    assert result["removed_time_slots"] == 2
+    assert sorted(elan_file.get_time_slots_dict()) == ["ts1", "ts2", "ts3", "ts4"]
+    assert elan_file.get_annotation_by_id("a2").get_start_time() == 1500
+
+
+def test_compact_rejects_missing_time_slots():
+
+    elan_file = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+    elan_file.get_annotation_by_id("a3").end_time_slot = "ts99"
+    before = elan_file.to_xml()
+
+    with pytest.raises(RuntimeError):
+        elan_file.compact()
+
+    assert elan_file.to_xml() == before
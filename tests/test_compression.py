@@ -0,0 +1,45 @@
+# Tests of reading and writing compressed ELAN files
+
+import io
+import os
+
+import pytest
+
+from elan import ELANFile
+
+SAMPLE_FILE_NAME = os.path.join(os.path.dirname(__file__), "data", "sample.eaf")
+
+
+@pytest.mark.parametrize("extension", [".eaf", ".eaf.gz", ".eaf.bz2", ".eaf.xz"])
+def test_write_and_read_compressed_files(extension, tmp_path):
+
+    elan_file = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+
+    file_name = str(tmp_path / ("sample" + extension))
+    elan_file.write_elan_file(file_name)
+
+    assert ELANFile.read_elan_file(file_name).to_xml() == elan_file.to_xml()
+
+
+def test_write_to_file_objects():
+
+    elan_file = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+
+    output_stream = io.BytesIO()
+    elan_file.write_elan_file(output_stream)
+    assert output_stream.getvalue().decode("utf-8") == elan_file.to_xml()
+
+    with pytest.raises(TypeError):
+        elan_file.write_elan_file(io.StringIO())
+
+
+def test_write_malformed_xml(tmp_path):
+
+    elan_file = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+    elan_file.get_annotation_by_id("a8").set_annotation_value("\x01")
+
+    with pytest.raises(RuntimeError):
+        elan_file.to_xml()
+
+    with pytest.raises(RuntimeError):
+        elan_file.write_elan_file(str(tmp_path / "malformed.eaf"))
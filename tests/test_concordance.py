@@ -0,0 +1,50 @@
+# Tests of keyword-in-context concordances
+
+import os
+
+from elan import ELANFile
+from elan_concordance import iter_concordance, iter_corpus_concordance
+
+DATA_DIRECTORY = os.path.join(os.path.dirname(__file__), "data")
+SAMPLE_FILE_NAME = os.path.join(DATA_DIRECTORY, "sample.eaf")
+SUBDIVISION_FILE_NAME = os.path.join(DATA_DIRECTORY, "subdivision.eaf")
+
+
+def test_context_and_symbolic_dependents():
+
+    elan_file = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+    lines = list(iter_concordance(elan_file, "world"))
+
+    assert [(line.get_tier_id(), line.get_annotation_id()) for line in lines] == [("A_words", "a1"), ("A_morph", "a6")]
+
+    line = lines[0]
+    assert (line.get_left_context(), line.get_keyword(), line.get_right_context()) == ("hello", "world", "good & bye")
+    assert (line.get_start_time(), line.get_end_time()) == (0, 1000)
+    assert line.get_dependents() == {"A_morph": ["hel", "lo", "world"], "A_gloss": ["N", "X"], "A_translation": ["hallo Welt"]}
+
+    line = lines[1]
+    assert (line.get_left_context(), line.get_right_context()) == ("hel lo", "")
+    assert (line.get_start_time(), line.get_end_time()) == (666, 1000)
+    assert line.get_dependent_values("A_gloss") == []
+
+    line = next(iter_concordance(elan_file, "WORLD", tiers=["A_morph"], ignore_case=True, context=1, dependents=False))
+    assert (line.get_left_context(), line.get_dependents()) == ("lo", {})
+
+
+def test_time_aligned_dependents():
+
+    elan_file = ELANFile.read_elan_file(SUBDIVISION_FILE_NAME)
+    lines = list(iter_concordance(elan_file, r"t\w+", tiers=["U"], regex=True))
+
+    assert [line.get_keyword() for line in lines] == ["two", "three"]
+    assert lines[0].get_left_context() == "one"
+    assert lines[0].get_right_context() == "three four"
+    assert lines[0].get_dependents() == {"W": ["one", "two", "three"]}
+
+
+def test_corpus_concordance():
+
+    lines = list(iter_corpus_concordance([SAMPLE_FILE_NAME, SUBDIVISION_FILE_NAME], "t", tier_ids=["B_words", "W"], processes=1))
+
+    assert [(os.path.basename(line.get_file_name()), line.get_annotation_id()) for line in lines] == \
+        [("sample.eaf", "a3"), ("subdivision.eaf", "a3"), ("subdivision.eaf", "a4")]
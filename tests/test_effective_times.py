@@ -0,0 +1,72 @@
+# Tests of the effective time spans of annotations
+
+import os
+
+from elan import ELANFile
+
+DATA_DIRECTORY = os.path.join(os.path.dirname(__file__), "data")
+SAMPLE_FILE_NAME = os.path.join(DATA_DIRECTORY, "sample.eaf")
+SUBDIVISION_FILE_NAME = os.path.join(DATA_DIRECTORY, "subdivision.eaf")
+
+
+def test_symbolic_subdivision_chains():
+
+    elan_file = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+    effective_times = elan_file.get_effective_times()
+
+    assert effective_times == {
+        "a1": (0, 1000),
+        "a2": (1500, 2500),
+        "a3": (1200, 3000),
+        "a4": (0, 333),
+        "a5": (333, 666),
+        "a6": (666, 1000),
+        "a7": (0, 333),
+        "a8": (333, 666),
+        "a9": (0, 1000),
+    }
+    assert elan_file.get_effective_times() is effective_times
+
+
+def test_subdivisions_follow_the_chain_order():
+
+    elan_file = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+    effective_times = elan_file.get_effective_times()
+
+    # Reorder the chain to a4, a6, a5
+    elan_file.get_annotation_by_id("a6").set_previous_annotation_ref("a4")
+    elan_file.get_annotation_by_id("a5").set_previous_annotation_ref("a6")
+
+    changed = elan_file.get_effective_times()
+    assert changed is not effective_times
+    assert changed["a6"] == (333, 666)
+    assert changed["a5"] == (666, 1000)
+    assert changed["a8"] == (666, 1000)
+    assert [annotation.get_annotation_id() for annotation in elan_file.get_child_annotations("a1")] == ["a4", "a6", "a5", "a9"]
+
+
+def test_unaligned_time_slots_are_interpolated():
+
+    elan_file = ELANFile.read_elan_file(SUBDIVISION_FILE_NAME)
+
+    assert elan_file.get_time_slot_values() == {"ts1": 0, "ts2": 300, "ts3": 600, "ts4": 900, "ts5": 1000, "ts6": 2000}
+    assert elan_file.get_effective_times() == {
+        "a1": (0, 900),
+        "a2": (0, 300),
+        "a3": (300, 600),
+        "a4": (600, 900),
+        "a5": (1000, 2000),
+    }
+
+
+def test_missing_times():
+
+    elan_file = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+
+    # Unaligned time slots at the end of the time order have no time
+    elan_file.get_time_slot_by_id("ts6").set_time_value(None)
+    elan_file.get_time_slot_by_id("ts8").set_time_value(None)
+
+    effective_times = elan_file.get_effective_times()
+    assert effective_times["a3"] == (1200, None)
+    assert effective_times["a1"] == (0, 1000)
@@ -0,0 +1,72 @@
+# Tests of the batched table export of corpus annotations
+
+import os
+
+import pytest
+
+import elan_export
+from elan import ELANFile
+
+DATA_DIRECTORY = os.path.join(os.path.dirname(__file__), "data")
+SAMPLE_FILE_NAME = os.path.join(DATA_DIRECTORY, "sample.eaf")
+SUBDIVISION_FILE_NAME = os.path.join(DATA_DIRECTORY, "subdivision.eaf")
+
+
+def test_annotation_rows():
+
+    rows = list(elan_export.iter_annotation_rows(ELANFile.read_elan_file(SAMPLE_FILE_NAME)))
+
+    assert len(rows) == 9
+    assert rows[0] == (SAMPLE_FILE_NAME, "a1", "A_words", "A", "utterance", 0, 1000, "hello world", None)
+    assert rows[3] == (SAMPLE_FILE_NAME, "a4", "A_morph", "A", "morph", None, None, "hel", "a1")
+
+
+@pytest.mark.parametrize("batch_size", [1, 4, 9, 10, 100])
+def test_batch_boundaries(batch_size):
+
+    sources = [SAMPLE_FILE_NAME, ELANFile.read_elan_file(SUBDIVISION_FILE_NAME), SAMPLE_FILE_NAME]
+    expected = [row for source in sources for row in elan_export.iter_annotation_rows(next(elan_export.iter_elan_files([source])))]
+
+    batches = list(elan_export.iter_record_batches(sources, batch_size))
+
+    assert all(len(batch["annotation_id"]) == batch_size for batch in batches[:-1])
+    assert 0 < len(batches[-1]["annotation_id"]) <= batch_size
+
+    rows = [row for batch in batches for row in zip(*[batch[column] for column in elan_export.ANNOTATION_COLUMNS])]
+    assert rows == expected
+
+
+def test_invalid_batch_size():
+
+    with pytest.raises(RuntimeError):
+        list(elan_export.iter_record_batches([SAMPLE_FILE_NAME], 0))
+
+
+def test_dataframes():
+
+    pytest.importorskip("pandas")
+
+    dataframes = list(elan_export.iter_dataframes([SAMPLE_FILE_NAME], batch_size=5))
+
+    assert [len(dataframe) for dataframe in dataframes] == [5, 4]
+    assert list(dataframes[0].columns) == elan_export.ANNOTATION_COLUMNS
+    assert str(dataframes[0]["start"].dtype) == "Int64"
+
+
+def test_arrow_ipc_and_parquet(tmp_path):
+
+    pyarrow = pytest.importorskip("pyarrow")
+    import pyarrow.ipc
+
+    path = str(tmp_path / "annotations.arrow")
+    assert elan_export.write_arrow_ipc([SAMPLE_FILE_NAME], path, batch_size=4) == 9
+
+    with pyarrow.OSFile(path, "rb") as source:
+        table = pyarrow.ipc.open_file(source).read_all()
+    assert table.column("annotation_id").to_pylist() == ["a" + str(number) for number in range(1, 10)]
+
+    parquet = pytest.importorskip("pyarrow.parquet")
+
+    path = str(tmp_path / "annotations.parquet")
+    assert elan_export.write_parquet([SAMPLE_FILE_NAME], path, batch_size=4) == 9
+    assert parquet.ParquetFile(path).metadata.num_row_groups == 3
@@ -0,0 +1,80 @@
+# Tests of map-reduce n-gram counting
+
+import os
+import random
+from collections import Counter
+
+import pytest
+
+from elan import ELANFile, ELANTier
+from elan_frequency import count_ngrams, count_corpus_ngrams, tokenize
+
+DATA_DIRECTORY = os.path.join(os.path.dirname(__file__), "data")
+SAMPLE_FILE_NAME = os.path.join(DATA_DIRECTORY, "sample.eaf")
+
+WORDS = ["the", "cat", "sat", "on", "a", "mat", "dog", "ran", "far", "away", "and", "back"]
+
+
+# Write a directory of ELAN files with random sentences
+@pytest.fixture
+def corpus_directory(tmp_path):
+
+    generator = random.Random(2)
+
+    for number in range(6):
+        elan_file = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+        tier = ELANTier("S", "utterance", elan_file, participant="S")
+        elan_file.add_tier(tier)
+        tier.add_annotations([(position * 1000, position * 1000 + 900, " ".join(generator.choice(WORDS) for word in range(8)))
+                              for position in range(20)])
+        elan_file.write_elan_file(str(tmp_path / ("file" + str(number) + ".eaf")))
+
+    return str(tmp_path)
+
+
+def test_tokenize():
+    assert tokenize("Don't stop-over, OK?", lowercase=True) == ["don't", "stop-over", "ok"]
+    assert tokenize(None) == []
+
+
+def test_count_ngrams():
+
+    elan_file = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+
+    counter, token_count = count_ngrams(elan_file, n=2, tier_pattern="_words$")
+    assert counter == Counter({("hello", "world"): 1, ("good", "bye"): 1, ("hi", "there"): 1})
+    assert token_count == 6
+
+    counter, token_count = count_ngrams(elan_file, n=2, linguistic_type="morph", across_annotations=True)
+    assert counter == Counter({("hel", "lo"): 1, ("lo", "world"): 1})
+
+
+@pytest.mark.parametrize("max_entries", [None, 5, 50])
+def test_spilled_counts_equal_in_memory_counts(corpus_directory, tmp_path, max_entries):
+
+    expected = Counter()
+    for file_name in sorted(os.listdir(corpus_directory)):
+        expected.update(count_ngrams(ELANFile.read_elan_file(os.path.join(corpus_directory, file_name)), n=2, tier_pattern="^S$")[0])
+
+    reports = []
+    spill_directory = tmp_path / "runs"
+    spill_directory.mkdir()
+
+    with count_corpus_ngrams(corpus_directory, n=2, tier_pattern="^S$", processes=2, max_entries=max_entries,
+                             spill_directory=str(spill_directory), progress=reports.append) as frequency_counter:
+
+        if max_entries is not None:
+            assert frequency_counter.get_report()["runs"] > 0
+
+        assert frequency_counter.to_counter() == expected
+        assert list(frequency_counter.items()) == sorted(expected.items())
+        assert [count for ngram, count in frequency_counter.most_common(5)] == [count for ngram, count in expected.most_common(5)]
+
+        tsv_file_name = str(tmp_path / "counts.tsv")
+        frequency_counter.write_tsv(tsv_file_name)
+        with open(tsv_file_name, encoding="utf-8") as tsv_file:
+            assert len(tsv_file.readlines()) == len(expected)
+
+    assert os.listdir(str(spill_directory)) == []
+    assert [report["files"] for report in reports] == list(range(1, 7))
+    assert reports[-1]["tokens"] == 6 * 20 * 8
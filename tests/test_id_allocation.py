@@ -0,0 +1,93 @@
+# Tests of the allocation of annotation, time slot and tier IDs
+
+import os
+import pickle
+import threading
+import zipfile
+
+from elan import ELANFile, ELANTier
+from elan_corpus import map_elan_files
+
+SAMPLE_FILE_NAME = os.path.join(os.path.dirname(__file__), "data", "sample.eaf")
+
+
+# Count the annotations of an ELAN file (run in worker processes)
+def count_annotations(elan_file):
+    return len(elan_file.get_annotations_dict())
+
+
+def test_allocation_honours_last_used_annotation_id():
+
+    elan_file = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+
+    assert elan_file.allocate_annotation_ids(3) == ["a10", "a11", "a12"]
+    assert elan_file.get_property("lastUsedAnnotationId") == "12"
+    assert elan_file.get_time_order().allocate_time_slot_ids(2) == ["ts9", "ts10"]
+
+
+def test_lazy_file_without_last_used_annotation_id(tmp_path):
+
+    with open(SAMPLE_FILE_NAME, "r", encoding="utf-8") as input_file:
+        lines = [line for line in input_file if "lastUsedAnnotationId" not in line]
+
+    file_name = str(tmp_path / "sample.eaf")
+    with open(file_name, "w", encoding="utf-8") as output_file:
+        output_file.writelines(lines)
+
+    elan_file = ELANFile.read_elan_file(file_name, lazy_tiers=True)
+    assert elan_file.allocate_annotation_ids(3) == ["a10", "a11", "a12"]
+
+    elan_file.load_all_tiers()
+    assert len(elan_file.get_annotations_dict()) == 9
+
+
+def test_allocation_from_several_threads():
+
+    elan_file = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+    IDs = []
+
+    def allocate():
+        for i in range(200):
+            IDs.extend(elan_file.allocate_annotation_ids(3))
+            IDs.append(elan_file.allocate_tier_id("A_words"))
+
+    threads = [threading.Thread(target=allocate) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(IDs) == len(set(IDs))
+    assert elan_file.get_property("lastUsedAnnotationId") == str(9 + 4 * 200 * 3)
+
+
+def test_tier_id_reservation_is_released():
+
+    elan_file = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+
+    assert elan_file.allocate_tier_id("A_words") == "A_words-2"
+    assert elan_file.allocate_tier_id("A_words") == "A_words-3"
+
+    tier_id = elan_file.allocate_tier_id("C_words")
+    elan_file.add_tier(ELANTier(tier_id, "utterance", elan_file))
+    elan_file.remove_tier(tier_id)
+    assert elan_file.allocate_tier_id("C_words") == "C_words"
+
+
+def test_pickling_through_a_pool(tmp_path):
+
+    elan_file = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+    copy = pickle.loads(pickle.dumps(elan_file))
+    assert copy.allocate_annotation_ids(1) == ["a10"]
+
+    archive_name = str(tmp_path / "corpus.zip")
+    with zipfile.ZipFile(archive_name, "w") as archive:
+        archive.write(SAMPLE_FILE_NAME, "one.eaf")
+        archive.write(SAMPLE_FILE_NAME, "two.eaf")
+
+    results = list(ELANFile.read_elan_archive(archive_name, processes=2))
+    assert [member for member, elan_file in results] == ["one.eaf", "two.eaf"]
+    assert results[0][1].allocate_annotation_ids(1) == ["a10"]
+
+    results = list(map_elan_files(count_annotations, [elan_file, elan_file], processes=2))
+    assert [count for source, count in results] == [9, 9]
@@ -0,0 +1,120 @@
+# Tests of copying tiers between ELAN files
+
+import os
+
+import pytest
+
+from elan import ELANFile, ELANControlledVocabulary, ELANControlledVocabularyEntry
+
+DATA_DIRECTORY = os.path.join(os.path.dirname(__file__), "data")
+SAMPLE_FILE_NAME = os.path.join(DATA_DIRECTORY, "sample.eaf")
+SUBDIVISION_FILE_NAME = os.path.join(DATA_DIRECTORY, "subdivision.eaf")
+
+
+# Return the values and effective times of the annotations of a tier
+def describe_tier(elan_file, tier_id):
+    effective_times = elan_file.get_effective_times()
+    return [(annotation.get_annotation_value(), effective_times[annotation.get_annotation_id()]) for annotation in elan_file.get_tier_by_id(tier_id)]
+
+
+def test_import_with_ancestors():
+
+    source = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+    target = ELANFile.read_elan_file(SUBDIVISION_FILE_NAME)
+
+    assert target.import_tiers(source, ["A_gloss"]) == {"A_words": "A_words", "A_morph": "A_morph", "A_gloss": "A_gloss"}
+
+    for tier_id in ["A_words", "A_morph", "A_gloss"]:
+        assert describe_tier(target, tier_id) == describe_tier(source, tier_id)
+
+    assert target.get_tier_by_id("A_gloss").get_parent_tier_ref() == "A_morph"
+    assert target.get_controlled_vocabulary_for_tier("A_gloss").get_cv_entry_by_value("V") is not None
+    assert target.get_constraint_by_stereotype("Symbolic_Subdivision") is not None
+
+    # New IDs do not clash with those of the target
+    annotation_ids = [annotation.get_annotation_id() for tier in target.get_tiers() for annotation in tier]
+    assert len(annotation_ids) == len(set(annotation_ids)) == 5 + 7
+
+    assert ELANFile.read_elan_file(SAMPLE_FILE_NAME).import_tiers(source, []) == {}
+    target.to_xml()
+
+
+def test_import_unaligned_time_slots():
+
+    source = ELANFile.read_elan_file(SUBDIVISION_FILE_NAME)
+
+    # Unaligned time slots are placed between the time-aligned ones around
+    # them, so the target must not have time slots within their span
+    target = ELANFile.read_elan_file(SAMPLE_FILE_NAME).copy_header()
+
+    assert target.import_tiers(source, ["W"]) == {"U": "U", "W": "W"}
+    assert describe_tier(target, "W") == describe_tier(source, "W")
+    assert describe_tier(target, "U") == describe_tier(source, "U")
+
+
+def test_rename_conflicting_tiers():
+
+    source = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+    target = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+
+    assert target.import_tiers(source, ["A_translation"]) == {"A_words": "A_words-2", "A_translation": "A_translation-2"}
+    assert target.get_tier_by_id("A_translation-2").get_parent_tier_ref() == "A_words-2"
+    assert target.get_tier_by_id("A_translation-2").get_linguistic_type() == "translation"
+    assert describe_tier(target, "A_translation-2") == describe_tier(source, "A_translation")
+    assert len(target.get_tiers()) == 7
+
+
+def test_skip_conflicting_tiers():
+
+    source = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+    target = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+
+    assert target.import_tiers(source, ["A_gloss", "B_words"], conflict="skip") == {}
+    assert [tier.get_tier_id() for tier in target.get_tiers()] == [tier.get_tier_id() for tier in source.get_tiers()]
+    assert len(target.get_annotations_dict()) == 9
+
+
+def test_overwrite_conflicting_tiers():
+
+    source = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+    source.get_annotation_by_id("a3").set_annotation_value("changed")
+
+    target = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+
+    assert target.import_tiers(source, ["B_words", "A_words"], conflict="overwrite") == {"A_words": "A_words", "B_words": "B_words"}
+    assert describe_tier(target, "B_words") == [("changed", (1200, 3000))]
+
+    # Dependent tiers of overwritten tiers are removed with them
+    assert sorted(tier.get_tier_id() for tier in target.get_tiers()) == ["A_words", "B_words"]
+
+
+def test_conflicting_controlled_vocabularies():
+
+    source = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+    target = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+
+    controlled_vocabulary = ELANControlledVocabulary("glosses", "Other labels")
+    controlled_vocabulary.add_cv_entry(ELANControlledVocabularyEntry("ADJ", controlled_vocabulary))
+    target.set_controlled_vocabularies([controlled_vocabulary])
+    target.set_controlled_vocabularies_dict({"glosses": controlled_vocabulary})
+
+    tier_id_map = target.import_tiers(source, ["A_gloss"])
+    imported = target.get_controlled_vocabulary_for_tier(tier_id_map["A_gloss"])
+
+    assert imported.get_cv_id() != "glosses"
+    assert sorted(entry.get_value() for entry in imported) == ["N", "V"]
+    assert target.get_controlled_vocabulary_by_id("glosses") is controlled_vocabulary
+
+
+def test_invalid_imports():
+
+    elan_file = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+
+    with pytest.raises(RuntimeError):
+        elan_file.import_tiers(elan_file, ["A_words"])
+
+    with pytest.raises(RuntimeError):
+        elan_file.import_tiers(ELANFile.read_elan_file(SAMPLE_FILE_NAME), ["A_words"], conflict="merge")
+
+    with pytest.raises(KeyError):
+        elan_file.import_tiers(ELANFile.read_elan_file(SAMPLE_FILE_NAME), ["missing"])
@@ -0,0 +1,60 @@
+# Tests of the export of annotation timings and values as arrays
+
+import os
+
+import pytest
+
+from elan import ELANFile
+
+SAMPLE_FILE_NAME = os.path.join(os.path.dirname(__file__), "data", "sample.eaf")
+
+
+@pytest.fixture
+def elan_file():
+    return ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+
+
+def test_annotation_columns(elan_file):
+
+    columns, codebook, tier_ids = elan_file.get_annotation_columns(["A_words", "B_words", "A_gloss"])
+
+    assert tier_ids == ["A_words", "B_words", "A_gloss"]
+    assert list(columns["start"]) == [0, 1500, 1200, 0, 0]
+    assert list(columns["end"]) == [1000, 2500, 3000, 0, 0]
+    assert list(columns["tier"]) == [0, 0, 1, 2, 2]
+    assert list(columns["aligned"]) == [1, 1, 1, 0, 0]
+    assert [codebook[code] for code in columns["value"]] == ["hello world", "good & bye", "hi there", "N", "X"]
+
+
+def test_shared_codebook(elan_file):
+
+    codebook = ["X", "N"]
+    columns, codebook, tier_ids = elan_file.get_annotation_columns(["A_gloss"], codebook)
+
+    assert list(columns["value"]) == [1, 0]
+    assert codebook == ["X", "N"]
+
+    columns, codebook, tier_ids = elan_file.get_annotation_columns(["B_words"], codebook)
+    assert codebook == ["X", "N", "hi there"]
+
+
+def test_to_numpy(elan_file):
+
+    numpy = pytest.importorskip("numpy")
+
+    data, codebook, tier_ids = elan_file.to_numpy()
+
+    assert tier_ids == [tier.get_tier_id() for tier in elan_file.get_tiers()]
+    assert data.dtype.names == ("start", "end", "duration", "tier", "value", "aligned")
+    assert len(data) == 9
+    assert data["duration"][:3].tolist() == [1000, 1000, 1800]
+    assert data["aligned"].tolist() == [True] * 3 + [False] * 6
+    assert numpy.all(data["tier"][1:] >= data["tier"][:-1])
+    assert [codebook[code] for code in data["value"]] == [annotation.get_annotation_value() for tier in elan_file.get_tiers() for annotation in tier]
+
+    data, codebook = elan_file.get_tier_by_id("B_words").to_numpy()
+    assert data["start"].tolist() == [1200]
+    assert codebook == ["hi there"]
+
+    data, codebook, tier_ids = elan_file.to_numpy([])
+    assert len(data) == 0
@@ -0,0 +1,119 @@
+# Tests of multi-tier structured queries
+
+import os
+import random
+
+import pytest
+
+from elan import ELANFile, ELANTier
+from elan_query import ELANQuery, describe_query_matches, run_corpus_query
+
+DATA_DIRECTORY = os.path.join(os.path.dirname(__file__), "data")
+SAMPLE_FILE_NAME = os.path.join(DATA_DIRECTORY, "sample.eaf")
+SUBDIVISION_FILE_NAME = os.path.join(DATA_DIRECTORY, "subdivision.eaf")
+
+
+# Relations between two (start, end) spans as documented in elan_query
+def holds(relation, a, b, distance):
+
+    if relation == "overlaps":
+        return a[0] < b[1] and b[0] < a[1]
+    elif relation == "within":
+        return b[0] <= a[0] and a[1] <= b[1]
+    elif relation == "contains":
+        return a[0] <= b[0] and b[1] <= a[1]
+    elif relation == "before":
+        return a[1] <= b[0] and (distance is None or b[0] - a[1] <= distance)
+    else:
+        return b[1] <= a[0] and (distance is None or a[0] - b[1] <= distance)
+
+
+# Return the (a, b) annotation ID pairs of all matches of a query
+def get_pairs(elan_file, query):
+    return sorted((match["a"].get_annotation_id(), match["b"].get_annotation_id()) for match in ELANQuery(query).run(elan_file))
+
+
+@pytest.fixture
+def elan_file():
+
+    elan_file = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+    generator = random.Random(1)
+
+    for tier_id in ["X", "Y"]:
+        tier = ELANTier(tier_id, "utterance", elan_file, participant=tier_id)
+        elan_file.add_tier(tier)
+
+        intervals = []
+        for number in range(50):
+            start = generator.randrange(0, 300)
+            intervals.append((start, start + generator.randrange(1, 40), "v" + str(number % 5)))
+        tier.add_annotations(intervals)
+
+    return elan_file
+
+
+@pytest.mark.parametrize("relation", ["overlaps", "within", "contains", "before", "after"])
+@pytest.mark.parametrize("distance", [None, 10])
+def test_temporal_relations_match_brute_force(elan_file, relation, distance):
+
+    if distance is not None and relation not in ["before", "after"]:
+        return
+
+    text = "a: tier=X\nb: tier=Y\na " + relation + " b"
+    if distance is not None:
+        text += " " + str(distance)
+
+    times = elan_file.get_effective_times()
+    expected = sorted((a.get_annotation_id(), b.get_annotation_id())
+                      for a in elan_file.get_tier_by_id("X") for b in elan_file.get_tier_by_id("Y")
+                      if holds(relation, times[a.get_annotation_id()], times[b.get_annotation_id()], distance))
+
+    assert get_pairs(elan_file, text) == expected
+    assert len(expected) > 0
+
+
+def test_value_constraints(elan_file):
+
+    assert get_pairs(elan_file, 'a: tier=X value="v1"; b: participant=/^Y$/ value=v2; a overlaps b') == \
+        [pair for pair in get_pairs(elan_file, "a: tier=X; b: tier=Y; a overlaps b")
+         if elan_file.get_annotation_by_id(pair[0]).get_annotation_value() == "v1"
+         and elan_file.get_annotation_by_id(pair[1]).get_annotation_value() == "v2"]
+
+
+def test_hierarchy_relations():
+
+    elan_file = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+
+    assert get_pairs(elan_file, "a: type=morph; b: tier=A_words; a child_of b") == [("a4", "a1"), ("a5", "a1"), ("a6", "a1")]
+    assert get_pairs(elan_file, "a: tier=A_words; b: tier=A_gloss value=/N|X/; a parent_of b") == []
+    assert get_pairs(elan_file, "a: tier=A_morph; b: tier=A_gloss; a parent_of b") == [("a4", "a7"), ("a5", "a8")]
+
+    # Morphs take part in temporal relations through their effective times
+    assert get_pairs(elan_file, "a: tier=A_morph; b: tier=B_words; a before b 600") == [("a5", "a3"), ("a6", "a3")]
+
+    # Time-aligned annotations on dependent tiers
+    elan_file = ELANFile.read_elan_file(SUBDIVISION_FILE_NAME)
+    assert get_pairs(elan_file, "a: tier=U; b: tier=W; a parent_of b") == [("a1", "a2"), ("a1", "a3"), ("a1", "a4")]
+
+
+def test_explain():
+
+    elan_file = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+    query = ELANQuery('w: tier=A_words\nm: tier=A_morph value="lo"\nm child_of w')
+
+    assert query.explain(elan_file) == "\n".join([
+        "m: value (estimated 1 candidates)",
+        "w: parent via m child_of w (estimated 2 candidates)",
+    ])
+
+    results = describe_query_matches(elan_file, query)
+    assert results == [{"m": ("A_morph", "a5", "lo", 333, 666), "w": ("A_words", "a1", "hello world", 0, 1000)}]
+
+    assert list(run_corpus_query(query, [SAMPLE_FILE_NAME, SUBDIVISION_FILE_NAME], processes=1)) == [(SAMPLE_FILE_NAME, results)]
+
+
+def test_malformed_queries():
+
+    for text in ["", "a: tier", "a: tier=X; a near b", "a: tier=X; b: tier=Y; a before b soon", "a: colour=red"]:
+        with pytest.raises(RuntimeError):
+            ELANQuery(text)
@@ -0,0 +1,57 @@
+# Tests of the removal of annotations and tiers
+
+import os
+
+from elan import ELANFile
+
+SAMPLE_FILE_NAME = os.path.join(os.path.dirname(__file__), "data", "sample.eaf")
+
+# Utterance tier with a Time_Subdivision tier below it, whose inner time
+# slots are unaligned (the usual layout of ELAN files)
+SUBDIVISION_FILE_NAME = os.path.join(os.path.dirname(__file__), "data", "subdivision.eaf")
+
+
+def test_cascade_removes_subdivisions_with_unaligned_time_slots():
+
+    elan_file = ELANFile.read_elan_file(SUBDIVISION_FILE_NAME)
+
+    assert sorted(elan_file.remove_annotations(["a1"])) == ["a1", "a2", "a3", "a4"]
+    assert sorted(elan_file.get_annotations_dict()) == ["a5"]
+    assert sorted(elan_file.get_time_slots_dict()) == ["ts5", "ts6"]
+    assert elan_file.get_tier_by_id("W").get_annotations() == []
+
+
+def test_subdivisions_block_removal_without_cascade():
+
+    elan_file = ELANFile.read_elan_file(SUBDIVISION_FILE_NAME)
+
+    try:
+        elan_file.remove_annotations(["a1"], cascade=False)
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("Removal of an annotation with dependents did not fail.")
+
+
+def test_shared_time_slots_are_kept():
+
+    elan_file = ELANFile.read_elan_file(SUBDIVISION_FILE_NAME)
+
+    assert elan_file.remove_annotations(["a2"]) == ["a2"]
+    assert "ts1" in elan_file.get_time_slots_dict()
+    assert "ts2" in elan_file.get_time_slots_dict()
+
+    assert elan_file.remove_annotations(["a3"]) == ["a3"]
+    assert "ts2" not in elan_file.get_time_slots_dict()
+    assert "ts3" in elan_file.get_time_slots_dict()
+
+
+def test_removal_of_reference_annotations_and_tiers():
+
+    elan_file = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+
+    assert sorted(elan_file.remove_annotations(["a4"])) == ["a4", "a7"]
+    assert elan_file.get_annotation_by_id("a5").get_previous_annotation_ref() is None
+
+    assert elan_file.remove_tier("A_words") == ["A_words", "A_morph", "A_translation", "A_gloss"]
+    assert sorted(elan_file.get_time_slots_dict()) == ["ts5", "ts6", "ts7", "ts8"]
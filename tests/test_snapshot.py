@@ -0,0 +1,95 @@
+# Tests of columnar snapshots of ELAN files
+
+import os
+
+import pytest
+
+import elan_snapshot
+from elan import ELANFile, ELANAlignableAnnotation
+from elan_snapshot import ELANSnapshot
+
+DATA_DIRECTORY = os.path.join(os.path.dirname(__file__), "data")
+SAMPLE_FILE_NAME = os.path.join(DATA_DIRECTORY, "sample.eaf")
+SUBDIVISION_FILE_NAME = os.path.join(DATA_DIRECTORY, "subdivision.eaf")
+
+
+@pytest.fixture
+def elan_files():
+    return [ELANFile.read_elan_file(SAMPLE_FILE_NAME), ELANFile.read_elan_file(SUBDIVISION_FILE_NAME)]
+
+
+# Compare the tiers and annotations of a snapshot with the ELAN files it was
+# exported from
+def check_snapshot(snapshot, elan_files):
+
+    assert snapshot.get_file_count() == len(elan_files)
+
+    for file_index, elan_file in enumerate(elan_files):
+
+        assert snapshot.get_file_url(file_index) == elan_file.get_url()
+
+        tiers = snapshot.get_tiers(file_index)
+        assert [tier.get_tier_id() for tier in tiers] == [tier.get_tier_id() for tier in elan_file.get_tiers()]
+
+        for snapshot_tier, tier in zip(tiers, elan_file.get_tiers()):
+
+            assert snapshot_tier.get_file_index() == file_index
+            assert snapshot_tier.get_participant() == tier.get_participant()
+            assert snapshot_tier.get_linguistic_type() == tier.get_linguistic_type()
+            assert snapshot_tier.get_parent_tier_ref() == tier.get_parent_tier_ref()
+
+            for snapshot_annotation, annotation in zip(snapshot_tier, tier):
+
+                assert snapshot_annotation.get_annotation_id() == annotation.get_annotation_id()
+                assert snapshot_annotation.get_annotation_value() == annotation.get_annotation_value()
+
+                if isinstance(annotation, ELANAlignableAnnotation):
+                    assert snapshot_annotation.get_annotation_ref() is None
+                    assert snapshot_annotation.get_start_time() == annotation.get_start_time()
+                    assert snapshot_annotation.get_end_time() == annotation.get_end_time()
+                else:
+                    assert snapshot_annotation.get_annotation_ref() == annotation.get_annotation_ref()
+                    assert snapshot_annotation.get_previous_annotation_ref() == annotation.get_previous_annotation_ref()
+
+            assert len(snapshot_tier) == len(tier)
+
+
+def test_export_and_attach_file_snapshot(elan_files, tmp_path):
+
+    path = str(tmp_path / "corpus.snapshot")
+
+    with ELANSnapshot.export(elan_files, path=path) as snapshot:
+        check_snapshot(snapshot, elan_files)
+
+    with ELANSnapshot.attach(path=path) as snapshot:
+        check_snapshot(snapshot, elan_files)
+
+        morph = snapshot.get_tier_by_id("A_morph")
+        assert morph.get_parent_tier().get_tier_id() == "A_words"
+        assert [annotation.get_parent_annotation().get_annotation_id() for annotation in morph] == ["a1", "a1", "a1"]
+        assert snapshot.get_annotation_by_row(2).get_tier().get_tier_id() == "B_words"
+        assert list(snapshot.get_tier_by_id("A_words").get_start_times()) == [0, 1500]
+        assert snapshot.get_tier_by_id("A_words", file_index=1) is None
+
+
+def test_export_and_attach_shared_memory_snapshot(elan_files):
+
+    if elan_snapshot.shared_memory is None:
+        pytest.skip("Shared memory requires Python 3.8 or later.")
+
+    snapshot = ELANSnapshot.export(elan_files)
+    try:
+        with ELANSnapshot.attach(name=snapshot.get_name()) as attached:
+            check_snapshot(attached, elan_files)
+    finally:
+        snapshot.close()
+        snapshot.unlink()
+
+
+def test_attach_rejects_other_buffers(tmp_path):
+
+    path = tmp_path / "other.snapshot"
+    path.write_bytes(b"\0" * 64)
+
+    with pytest.raises(RuntimeError):
+        ELANSnapshot.attach(path=str(path))
@@ -0,0 +1,25 @@
+# Tests of splitting ELAN files into pieces by time
+
+import os
+
+from elan import ELANFile, ELANLinguisticType, ELANTier
+
+SUBDIVISION_FILE_NAME = os.path.join(os.path.dirname(__file__), "data", "subdivision.eaf")
+
+
+def test_kept_annotations_follow_parents_on_unaligned_time_slots():
+
+    elan_file = ELANFile.read_elan_file(SUBDIVISION_FILE_NAME)
+
+    # A phone tier below the words, whose annotation "two" (a3) lies
+    # between the unaligned time slots ts2 and ts3 (300-600 ms)
+    elan_file.add_linguistic_type(ELANLinguisticType("phones", elan_file, "true", "Included_In"))
+    tier = ELANTier("P", "phones", elan_file, parent_tier_ref="W")
+    elan_file.add_tier(tier)
+    phone = tier.add_annotations([(450, 550, "t")])[0]
+
+    first, second = elan_file.split_by_time(boundaries=[400], policy="keep")
+
+    assert phone.get_annotation_id() in first.get_annotations_dict()
+    assert phone.get_annotation_id() not in second.get_annotations_dict()
+    assert "a3" in first.get_annotations_dict()
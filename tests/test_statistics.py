@@ -0,0 +1,35 @@
+# Tests of the cached annotation statistics
+
+import os
+
+from elan import ELANFile
+
+SAMPLE_FILE_NAME = os.path.join(os.path.dirname(__file__), "data", "sample.eaf")
+
+
+def test_statistics_are_cached_until_the_file_changes():
+
+    elan_file = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+
+    statistics = elan_file.statistics()
+    assert elan_file.statistics() is statistics
+    assert statistics.get_totals().get_count() == 9
+    assert statistics.get_tier_statistics("A_words").get_total_duration() == 2000
+    assert statistics.get_participant_statistics("B").get_count() == 1
+
+    elan_file.get_annotation_by_id("a3").set_annotation_value("")
+
+    changed = elan_file.statistics()
+    assert changed is not statistics
+    assert changed.get_tier_statistics("B_words").get_empty_count() == 1
+    assert statistics.get_tier_statistics("B_words").get_empty_count() == 0
+
+
+def test_statistics_of_lazily_read_files():
+
+    eager = ELANFile.read_elan_file(SAMPLE_FILE_NAME).statistics()
+    lazy = ELANFile.read_elan_file(SAMPLE_FILE_NAME, lazy_tiers=True).statistics()
+
+    assert sorted(lazy.get_tiers()) == sorted(eager.get_tiers())
+    assert len(lazy.get_tiers()) == 5
+    assert lazy.to_dict() == eager.to_dict()
@@ -0,0 +1,69 @@
+# Tests of the sweep-line temporal join between tiers
+
+import os
+import random
+
+import pytest
+
+from elan import ELANFile, ELANTier
+
+SAMPLE_FILE_NAME = os.path.join(os.path.dirname(__file__), "data", "sample.eaf")
+
+
+# Relations between two (start, end) intervals as defined by temporal_join
+def holds(predicate, a, b, gap):
+
+    if predicate == "overlaps":
+        return a[0] < b[1] + (gap or 0) and b[0] < a[1] + (gap or 0)
+    elif predicate == "contains":
+        return a[0] - (gap or 0) <= b[0] and b[1] <= a[1] + (gap or 0)
+    elif predicate == "during":
+        return b[0] - (gap or 0) <= a[0] and a[1] <= b[1] + (gap or 0)
+    elif predicate == "meets":
+        return abs(b[0] - a[1]) <= (gap or 0)
+    else:
+        return a[1] <= b[0] and (gap is None or b[0] <= a[1] + gap)
+
+
+@pytest.fixture
+def elan_file():
+
+    elan_file = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+    generator = random.Random(0)
+
+    for tier_id in ["X", "Y"]:
+        tier = ELANTier(tier_id, "utterance", elan_file)
+        elan_file.add_tier(tier)
+
+        intervals = []
+        for number in range(60):
+            start = generator.randrange(0, 200)
+            intervals.append((start, start + generator.randrange(1, 30), tier_id + str(number)))
+        tier.add_annotations(intervals)
+
+    return elan_file
+
+
+@pytest.mark.parametrize("predicate", ["overlaps", "contains", "during", "meets", "before"])
+@pytest.mark.parametrize("max_gap", [None, 0, 3])
+def test_temporal_join_matches_brute_force(elan_file, predicate, max_gap):
+
+    intervals_x = elan_file.get_time_intervals("X")
+    intervals_y = elan_file.get_time_intervals("Y")
+
+    expected = sorted((x[2].get_annotation_value(), y[2].get_annotation_value())
+                      for x in intervals_x for y in intervals_y if holds(predicate, x, y, max_gap))
+
+    joined = sorted((a.get_annotation_value(), b.get_annotation_value())
+                    for a, b in elan_file.temporal_join("X", "Y", predicate, max_gap))
+
+    assert joined == expected
+    assert len(expected) > 0
+
+
+def test_temporal_join_on_sample(elan_file):
+
+    assert [(a.get_annotation_id(), b.get_annotation_id()) for a, b in elan_file.temporal_join("A_words", "B_words")] == [("a2", "a3")]
+
+    with pytest.raises(RuntimeError):
+        list(elan_file.temporal_join("A_words", "B_words", "near"))
@@ -0,0 +1,44 @@
+# Tests of the byte offsets of tiers and the lazy loading of tiers
+
+import os
+
+from elan import ELANFile
+
+SAMPLE_FILE_NAME = os.path.join(os.path.dirname(__file__), "data", "sample.eaf")
+
+
+def read_sample_text():
+    with open(SAMPLE_FILE_NAME, "r", encoding="utf-8") as input_file:
+        return input_file.read()
+
+
+def test_commented_out_tiers_are_not_indexed(tmp_path):
+
+    text = read_sample_text().replace("    <TIER LINGUISTIC_TYPE_REF=\"utterance\" PARTICIPANT=\"B\"",
+                                      "    <!-- <TIER TIER_ID=\"old\"> -->\\n    <TIER LINGUISTIC_TYPE_REF=\"utterance\" PARTICIPANT=\"B\"", 1)
+    assert "<!-- <TIER" in text
+
+    file_name = str(tmp_path / "comment.eaf")
+    with open(file_name, "w", encoding="utf-8") as output_file:
+        output_file.write(text)
+
+    elan_file = ELANFile.read_elan_file(file_name, lazy_tiers=True)
+
+    assert [tier_id for tier_id, start, end in elan_file.get_tier_index()] == ["A_words", "B_words", "A_morph", "A_gloss", "A_translation"]
+    assert elan_file.load_tier("B_words").get_annotations()[0].get_annotation_value() == "hi there"
+
+    elan_file.load_all_tiers()
+    assert elan_file.to_xml() == ELANFile.read_elan_file(file_name).to_xml()
+
+
+def test_tiers_of_files_in_other_encodings(tmp_path):
+
+    text = read_sample_text().replace("encoding=\"UTF-8\"", "encoding=\"ISO-8859-1\"").replace("hallo Welt", "grüß die Welt")
+
+    file_name = str(tmp_path / "latin1.eaf")
+    with open(file_name, "w", encoding="iso-8859-1") as output_file:
+        output_file.write(text)
+
+    elan_file = ELANFile.read_elan_file(file_name, lazy_tiers=True)
+
+    assert elan_file.load_tier("A_translation").get_annotations()[0].get_annotation_value() == "grüß die Welt"
@@ -0,0 +1,69 @@
+# Tests of bulk changes of time values
+
+import os
+
+from elan import ELANFile
+
+SAMPLE_FILE_NAME = os.path.join(os.path.dirname(__file__), "data", "sample.eaf")
+SUBDIVISION_FILE_NAME = os.path.join(os.path.dirname(__file__), "data", "subdivision.eaf")
+
+
+def get_times(elan_file, annotation_id):
+    annotation = elan_file.get_annotation_by_id(annotation_id)
+    return annotation.get_start_time(), annotation.get_end_time()
+
+
+def test_tier_shift_splits_shared_time_slots():
+
+    elan_file = ELANFile.read_elan_file(SUBDIVISION_FILE_NAME)
+    elan_file.start_journal()
+    elan_file.get_time_slot_references()
+
+    assert elan_file.shift_times(50, tiers=["W"]) == []
+    assert get_times(elan_file, "a1") == (0, 900)
+    assert get_times(elan_file, "a2")[0] == 50
+    assert get_times(elan_file, "a4")[1] == 950
+
+    # The reference counts kept up to date match freshly counted ones
+    references = dict(elan_file.get_time_slot_references())
+    elan_file.time_slot_references = None
+    assert elan_file.get_time_slot_references() == references
+
+    elan_file.undo()
+    assert sorted(elan_file.get_time_slots_dict()) == ["ts1", "ts2", "ts3", "ts4", "ts5", "ts6"]
+    assert elan_file.get_annotation_by_id("a2").get_start_time_slot() == "ts1"
+
+
+def test_rejected_shift_changes_nothing():
+
+    elan_file = ELANFile.read_elan_file(SUBDIVISION_FILE_NAME)
+
+    try:
+        elan_file.shift_times(-100, tiers=["W"], negative="error")
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("Shift to negative time values did not fail.")
+
+    assert sorted(elan_file.get_time_slots_dict()) == ["ts1", "ts2", "ts3", "ts4", "ts5", "ts6"]
+    assert elan_file.get_annotation_by_id("a2").get_start_time_slot() == "ts1"
+    assert get_times(elan_file, "a2")[0] == 0
+
+
+def test_range_shift_rejects_inverted_annotations():
+
+    elan_file = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+
+    try:
+        elan_file.shift_times(2000, range=(1000, 1600))
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("Shift moving a start past its end did not fail.")
+
+    assert get_times(elan_file, "a2") == (1500, 2500)
+
+    elan_file.shift_times(500, range=(1000, 1600))
+    assert get_times(elan_file, "a1") == (0, 1500)
+    assert get_times(elan_file, "a2") == (2000, 2500)
+    assert get_times(elan_file, "a3") == (1700, 3000)
@@ -0,0 +1,80 @@
+# Tests of the time order and its blocked list of time slots
+
+import os
+import pickle
+
+import pytest
+
+from elan import ELANFile, ELANTimeSlot, ELANTimeSlotList
+
+SAMPLE_FILE_NAME = os.path.join(os.path.dirname(__file__), "data", "sample.eaf")
+
+
+def get_time_slot_ids(time_order):
+    return [time_slot.get_id() for time_slot in time_order]
+
+
+def test_unsorted_time_order_is_sorted_when_read():
+
+    elan_file = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+    time_order = elan_file.get_time_order()
+
+    # ts5 (1200) comes after ts4 (2500) in the file; ts7 is unaligned
+    assert get_time_slot_ids(time_order) == ["ts1", "ts2", "ts5", "ts3", "ts4", "ts6", "ts7", "ts8"]
+
+    time_order.new_time_slot(1300)
+    assert get_time_slot_ids(time_order)[3:5] == ["ts9", "ts3"]
+
+
+def test_insertion_after_appending_out_of_order():
+
+    time_slots = ELANTimeSlotList()
+    for time_value in [0, 2000, 1000, None, 3000]:
+        time_slots.append(ELANTimeSlot("ts" + str(len(time_slots) + 1), time_value))
+
+    time_slots.insert(ELANTimeSlot("ts6", 1500))
+
+    assert [time_slot.get_id() for time_slot in time_slots] == ["ts1", "ts3", "ts4", "ts6", "ts2", "ts5"]
+
+
+def test_insertion_after_unaligned_time_slots():
+
+    time_slots = ELANTimeSlotList()
+    for number in range(3 * ELANTimeSlotList.BLOCK_SIZE):
+        if number % 3 == 0:
+            time_slots.append(ELANTimeSlot("ts" + str(number), number))
+        else:
+            time_slots.append(ELANTimeSlot("ts" + str(number)))
+
+    unaligned = time_slots[1000]
+    assert unaligned.get_time_value() is None
+    assert time_slots.get_previous(unaligned) is time_slots[999]
+
+    time_slots.insert_after(unaligned, ELANTimeSlot("new"))
+    assert time_slots[1001].get_id() == "new"
+
+    # A time-aligned time slot passes its key on to the unaligned ones after it
+    time_slots.insert_after(time_slots[996], ELANTimeSlot("aligned", 997))
+    time_slots.insert(ELANTimeSlot("earlier", 996))
+    assert [time_slot.get_id() for time_slot in time_slots[996:1002]] == ["ts996", "earlier", "aligned", "ts997", "ts998", "ts999"]
+
+    # Time slots are found again after pickling
+    time_slots = pickle.loads(pickle.dumps(time_slots))
+    assert time_slots.get_previous(time_slots[1000]) is time_slots[999]
+
+
+def test_insertion_after_rejects_time_slots_out_of_time_order():
+
+    elan_file = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+    time_order = elan_file.get_time_order()
+    first = elan_file.get_time_slot_by_id("ts1")
+
+    with pytest.raises(RuntimeError):
+        time_order.insert_time_slot(ELANTimeSlot("tsX", 99999), after=first)
+
+    assert "tsX" not in time_order.get_time_slots_dict()
+    assert time_order.get_time_slots().get_previous(elan_file.get_time_slot_by_id("ts2")) is first
+
+    time_order.insert_time_slot(ELANTimeSlot("tsY", 500), after=first)
+    time_order.new_time_slot(1100)
+    assert get_time_slot_ids(time_order)[:5] == ["ts1", "tsY", "ts2", "ts9", "ts5"]
@@ -0,0 +1,58 @@
+# Tests of the turn-taking analysis
+
+import os
+
+import pytest
+
+from elan import ELANFile, ELANTier
+from elan_turns import GAP, PAUSE, OVERLAP, iter_turn_events, summarize_turn_taking, summarize_corpus_turn_taking
+
+SAMPLE_FILE_NAME = os.path.join(os.path.dirname(__file__), "data", "sample.eaf")
+
+
+@pytest.fixture
+def elan_file():
+
+    elan_file = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+
+    # A: 0-1000, 1500-2500; B: 1200-3000, 3500-4000; C: 3800-5000
+    for tier_id, participant, annotations in [("B_more", "B", [(3500, 4000, "again")]), ("C_words", "C", [(3800, 5000, "late")])]:
+        tier = ELANTier(tier_id, "utterance", elan_file, participant=participant)
+        elan_file.add_tier(tier)
+        tier.add_annotations(annotations)
+
+    return elan_file
+
+
+def describe(event):
+    return (event.get_kind(), event.get_from_participant(), event.get_to_participant(), event.get_start_time(), event.get_end_time(), event.is_floor_transfer())
+
+
+def test_turn_events(elan_file):
+
+    assert [describe(event) for event in iter_turn_events(elan_file)] == [
+        (GAP, "A", "B", 1000, 1200, True),
+        (OVERLAP, "B", "A", 1500, 2500, False),
+        (PAUSE, "B", "B", 3000, 3500, False),
+        (OVERLAP, "B", "C", 3800, 4000, True),
+    ]
+
+    events = list(iter_turn_events(elan_file, min_silence=300, min_overlap=300))
+    assert [describe(event)[0] for event in events] == [OVERLAP, PAUSE]
+
+    events = list(iter_turn_events(elan_file, tiers=["A_words", "C_words"]))
+    assert [describe(event) for event in events] == [(PAUSE, "A", "A", 1000, 1500, False), (GAP, "A", "C", 2500, 3800, True)]
+
+
+def test_summary(elan_file):
+
+    summary = summarize_turn_taking(elan_file)
+
+    assert summary.get_event_statistics(GAP).get_count() == 1
+    assert summary.get_event_statistics(OVERLAP).get_total_duration() == 1200
+    assert summary.get_transfers() == {("A", "B"): 1, ("B", "C"): 1}
+
+    total = summarize_corpus_turn_taking([SAMPLE_FILE_NAME, SAMPLE_FILE_NAME], processes=1)
+    assert total.get_file_count() == 2
+    assert total.get_transfer_count("A", "B") == 2
+    assert total.to_dict()[OVERLAP]["count"] == 2
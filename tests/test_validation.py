@@ -0,0 +1,32 @@
+# Tests of the validation against controlled vocabularies
+
+import os
+
+from elan import ELANFile
+from elan_validation import check_controlled_vocabularies, check_corpus_controlled_vocabularies
+
+SAMPLE_FILE_NAME = os.path.join(os.path.dirname(__file__), "data", "sample.eaf")
+
+
+def test_violations_on_reference_tiers_have_times():
+
+    elan_file = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+
+    violations = check_controlled_vocabularies(elan_file)
+
+    # a8 glosses the second of three morphs of a1 (0-1000 ms)
+    assert [violation.get_annotation_id() for violation in violations] == ["a8"]
+    assert (violations[0].get_start_time(), violations[0].get_end_time()) == (333, 666)
+
+
+def test_cutoff_is_passed_to_the_workers(tmp_path):
+
+    elan_file = ELANFile.read_elan_file(SAMPLE_FILE_NAME)
+    elan_file.get_annotation_by_id("a8").set_annotation_value("NN")
+
+    file_name = str(tmp_path / "glosses.eaf")
+    elan_file.write_elan_file(file_name)
+
+    for cutoff, suggestion in [(0.9, None), (0.5, "N")]:
+        [(source, violations)] = check_corpus_controlled_vocabularies([file_name], suggest=True, cutoff=cutoff, processes=2)
+        assert violations[0].get_suggestion() == suggestion